@@ -1,6 +1,25 @@
 from .user import *
 from .auth import *
+from .user_cache import *
+from .user_import import *
+from .token_denylist import *
+from .login_throttle import *
 from .initialize import *
 from .position import *
+from .position_feed import *
+from .position_deadline import *
 from .application import *
+from .funnel import *
+from .decision_latency import *
+from .analytics import *
+from .columnar_export import *
+from .volume import *
 from .company import *
+from .company_deletion import *
+from .recommendation import *
+from .similarity import *
+from .typeahead import *
+from .trending import *
+from .catalog_snapshot import *
+from .position_facets import *
+from .position_events import *
@@ -0,0 +1,341 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from App.models import Application, Position, Student
+from App.database import db
+from .position_deadline import utcnow
+
+__all__ = [
+    'ANALYTICS_GROUPS',
+    'ApplicationColumnStore',
+    'build_analytics_store',
+    'query_applications',
+]
+
+# Columns of the store and their dtypes; dictionary-encoded ones hold
+# int32 codes into the manifest's dictionaries, -1 for null
+COLUMNS = {
+    'application_id': np.int64,
+    'position_id': np.int32,
+    'company_id': np.int32,
+    'student_id': np.int32,
+    'status': np.int32,
+    'degree': np.int32,
+    'gender': np.int32,
+    'gpa': np.float32,
+    'created_at': 'datetime64[s]',
+    'updated_at': 'datetime64[s]',
+}
+ENCODED = ('status', 'degree', 'gender')
+# cohort is the application's intake month
+ANALYTICS_GROUPS = ('company_id', 'position_id', 'status', 'degree', 'gender', 'cohort')
+GPA_QUANTILES = (0.25, 0.5, 0.75)
+BUILD_BATCH_SIZE = 5000
+
+
+class ApplicationColumnStore:
+    """
+    Applications joined with their student's and position's attributes,
+    one memory-mapped .npy file per column, sorted by application id.
+
+    A build writes a new generation directory and then swaps the manifest
+    naming it, so readers map a complete generation and never see a build
+    in progress.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.dictionaries = manifest['dictionaries']
+        generation = os.path.join(directory, manifest['generation'])
+        self.columns = {
+            name: np.load(os.path.join(generation, f'{name}.npy'), mmap_mode='r')
+            for name in COLUMNS
+        }
+
+    @staticmethod
+    def read_manifest(directory):
+        try:
+            with open(os.path.join(directory, 'manifest.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def open(cls, directory):
+        manifest = cls.read_manifest(directory)
+        return cls(directory, manifest) if manifest else None
+
+    def __len__(self):
+        return len(self.columns['application_id'])
+
+    def encode(self, column, values):
+        """Codes of the given values of a dictionary-encoded column (unknown ones dropped)."""
+        codes = {value: code for code, value in enumerate(self.dictionaries[column])}
+        return [codes[value] for value in values if value in codes]
+
+    def decode(self, column, code):
+        return self.dictionaries[column][code] if code >= 0 else None
+
+
+def _store_dir():
+    return current_app.config.get('ANALYTICS_DIR') or os.path.join(current_app.instance_path, 'analytics')
+
+
+def _write_manifest(directory, manifest):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(directory, 'manifest.json'))
+
+
+def _encode(values, dictionary, codes):
+    encoded = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            encoded[i] = -1
+            continue
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(dictionary)
+            dictionary.append(value)
+        encoded[i] = code
+    return encoded
+
+
+def _chunk_columns(rows, dictionaries, codes):
+    application_id, status, created_at, updated_at, position_id, company_id, student_id, gpa, degree, gender = zip(*rows)
+    return {
+        'application_id': np.array(application_id, dtype=np.int64),
+        'position_id': np.array(position_id, dtype=np.int32),
+        'company_id': np.array(company_id, dtype=np.int32),
+        'student_id': np.array(student_id, dtype=np.int32),
+        'status': _encode([s.value for s in status], dictionaries['status'], codes['status']),
+        'degree': _encode(degree, dictionaries['degree'], codes['degree']),
+        'gender': _encode(gender, dictionaries['gender'], codes['gender']),
+        'gpa': np.array([np.nan if g is None else g for g in gpa], dtype=np.float32),
+        'created_at': np.array(created_at, dtype='datetime64[s]'),
+        'updated_at': np.array(updated_at, dtype='datetime64[s]'),
+    }
+
+
+def _merge(old, new):
+    """Overwrite rows of old whose application id reappears in new and append the rest."""
+    old_ids, new_ids = old['application_id'], new['application_id']
+    at = np.minimum(np.searchsorted(old_ids, new_ids), max(len(old_ids) - 1, 0))
+    found = (at < len(old_ids)) & (old_ids[at] == new_ids) if len(old_ids) else np.zeros(len(new_ids), bool)
+    merged = {}
+    for name in COLUMNS:
+        column = np.array(old[name])
+        column[at[found]] = new[name][found]
+        merged[name] = np.concatenate([column, new[name][~found]])
+    return merged
+
+
+def _sort_by_id(columns):
+    ids = columns['application_id']
+    if len(ids) > 1 and not np.all(ids[:-1] < ids[1:]):
+        order = np.argsort(ids, kind='stable')
+        columns = {name: column[order] for name, column in columns.items()}
+    return columns
+
+
+def build_analytics_store(full=False, batch_size=BUILD_BATCH_SIZE):
+    """
+    Stream applications with their student and position attributes into
+    the column store. Incremental by default: only applications updated
+    since the last build's watermark are read, and merged into a copy of
+    the previous generation. Student edits and deleted applications are
+    only picked up by a full build. Returns a summary dict.
+    """
+    directory = _store_dir()
+    os.makedirs(directory, exist_ok=True)
+    previous = None if full else ApplicationColumnStore.open(directory)
+    dictionaries = {name: list(previous.dictionaries[name]) if previous else [] for name in ENCODED}
+    codes = {name: {value: code for code, value in enumerate(values)} for name, values in dictionaries.items()}
+
+    # The student table alone: its user row has nothing to analyze. Rows
+    # come in index order and are sorted by id once merged
+    student = Student.__table__
+    query = (
+        select(
+            Application.id, Application.status, Application.created_at, Application.updated_at,
+            Application.position_id, Position.company_id, Application.student_id,
+            student.c.gpa, student.c.degree, student.c.gender
+        )
+        .join(Position, Position.id == Application.position_id)
+        .join(student, student.c.id == Application.student_id)
+    )
+    watermark = previous.manifest['watermark'] if previous else None
+    if watermark:
+        # Rows updated in the watermark's second may postdate the last build;
+        # re-reading a second's worth is harmless since merging is idempotent
+        query = query.where(Application.updated_at >= datetime.fromisoformat(watermark) - timedelta(seconds=1))
+
+    chunks = {name: [] for name in COLUMNS}
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        for name, column in _chunk_columns(rows, dictionaries, codes).items():
+            chunks[name].append(column)
+    changed = {
+        name: np.concatenate(parts) if parts else np.zeros(0, dtype=COLUMNS[name])
+        for name, parts in chunks.items()
+    }
+    columns = _sort_by_id(_merge(previous.columns, changed) if previous else changed)
+
+    generation = uuid.uuid4().hex
+    os.makedirs(os.path.join(directory, generation))
+    for name, column in columns.items():
+        np.save(os.path.join(directory, generation, f'{name}.npy'), column)
+    updated = columns['updated_at']
+    valid = updated[~np.isnat(updated)]
+    _write_manifest(directory, {
+        'generation': generation,
+        'rows': int(len(columns['application_id'])),
+        'watermark': str(valid.max()) if len(valid) else watermark,
+        'built_at': utcnow().isoformat(),
+        'dictionaries': dictionaries,
+    })
+    # Mapped files stay readable after unlinking, so older generations can go
+    for name in os.listdir(directory):
+        if name != generation and os.path.isdir(os.path.join(directory, name)):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return {'rows': int(len(columns['application_id'])), 'changed': int(len(changed['application_id'])), 'full': previous is None}
+
+
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    """The current generation, mapped once per worker and remapped after each build."""
+    directory = _store_dir()
+    try:
+        mtime = os.stat(os.path.join(directory, 'manifest.json')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _store_lock:
+        cached = current_app.extensions.get('analytics_store')
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, ApplicationColumnStore.open(directory))
+            current_app.extensions['analytics_store'] = cached
+        return cached[1]
+
+
+def _group_key(store, column):
+    if column == 'cohort':
+        return store.columns['created_at'].astype('datetime64[M]').astype(np.int64)
+    return np.asarray(store.columns[column], dtype=np.int64)
+
+
+def _group_value(store, column, key):
+    if column == 'cohort':
+        return str(np.datetime64(int(key), 'M'))
+    if column in ENCODED:
+        return store.decode(column, int(key))
+    return int(key)
+
+
+def _factorize(values):
+    """(distinct sorted values, index of each value among them), without sorting when the range is small."""
+    if not len(values):
+        return values[:0], np.zeros(0, dtype=np.int64)
+    low, high = int(values.min()), int(values.max())
+    if high - low > 2 * len(values):
+        distinct, codes = np.unique(values, return_inverse=True)
+        return distinct, codes.reshape(-1)
+    present = np.bincount(values - low, minlength=high - low + 1) > 0
+    lookup = np.cumsum(present) - 1
+    return np.flatnonzero(present) + low, lookup[values - low]
+
+
+def query_applications(group_by=(), filters=None, start=None, end=None):
+    """
+    Count, acceptance rate and GPA distribution of applications per
+    combination of the group_by columns, from the column store. filters
+    maps a column to the values to keep; start and end bound created_at.
+    Returns None if the store hasn't been built.
+    """
+    store = _get_store()
+    if store is None:
+        return None
+    for column in list(group_by) + list(filters or {}):
+        if column not in ANALYTICS_GROUPS:
+            raise ValueError(f"Unknown column '{column}'. Use: {', '.join(ANALYTICS_GROUPS)}")
+
+    mask = np.ones(len(store), dtype=bool)
+    for column, values in (filters or {}).items():
+        if column in ENCODED:
+            keys = store.encode(column, values)
+        elif column == 'cohort':
+            keys = np.array(values, dtype='datetime64[M]').astype(np.int64)
+        else:
+            keys = [int(value) for value in values]
+        mask &= np.isin(_group_key(store, column), keys)
+    created_at = store.columns['created_at']
+    if start is not None:
+        mask &= created_at >= np.datetime64(start, 's')
+    if end is not None:
+        mask &= created_at <= np.datetime64(end, 's')
+
+    # Number each column's distinct values, then combine the numbers into
+    # one int64 key per row (mixed radix) so grouping is a 1-D unique
+    combined = np.zeros(int(mask.sum()), dtype=np.int64)
+    uniques = []
+    for column in group_by:
+        values, codes = _factorize(_group_key(store, column)[mask])
+        combined = combined * len(values) + codes
+        uniques.append(values)
+    keys, inverse = _factorize(combined)
+    groups = np.zeros((len(keys), len(group_by)), dtype=np.int64)
+    for i in reversed(range(len(group_by))):
+        keys, digit = np.divmod(keys, len(uniques[i]))
+        groups[:, i] = uniques[i][digit]
+    size = len(groups)
+
+    counts = np.bincount(inverse, minlength=size)
+    accepted_codes = store.encode('status', ['accepted'])
+    accepted = np.bincount(inverse, weights=np.isin(store.columns['status'][mask], accepted_codes), minlength=size)
+
+    gpa = store.columns['gpa'][mask]
+    graded = ~np.isnan(gpa)
+    gpa, graded_groups = gpa[graded], inverse[graded]
+    gpa_counts = np.bincount(graded_groups, minlength=size)
+    gpa_sums = np.bincount(graded_groups, weights=gpa, minlength=size)
+    # Sorting group * span + gpa lays each group's GPAs out contiguously in
+    # order; one float sort is several times faster than a lexsort
+    sorted_gpa = gpa[:0].astype(np.float64)
+    if len(gpa):
+        low = float(gpa.min())
+        span = float(gpa.max()) - low + 1
+        offsets = np.repeat(np.arange(size, dtype=np.float64) * span, gpa_counts)
+        sorted_gpa = np.sort(graded_groups * span + (gpa - low)) - offsets + low
+    starts = np.cumsum(gpa_counts) - gpa_counts
+    last = max(len(sorted_gpa) - 1, 0)
+    quantiles = {
+        q: sorted_gpa[np.minimum(starts + np.floor(q * np.maximum(gpa_counts - 1, 0)).astype(np.int64), last)]
+        if len(sorted_gpa) else None
+        for q in GPA_QUANTILES
+    }
+
+    results = []
+    for g in range(size):
+        row = {column: _group_value(store, column, key) for column, key in zip(group_by, groups[g])}
+        has_gpa = gpa_counts[g] > 0
+        row.update({
+            'count': int(counts[g]),
+            'accepted': int(accepted[g]),
+            'acceptance_rate': round(float(accepted[g] / counts[g]), 4) if counts[g] else None,
+            'gpa_mean': round(float(gpa_sums[g] / gpa_counts[g]), 3) if has_gpa else None,
+            **{f'gpa_p{round(q * 100)}': round(float(quantiles[q][g]), 3) if has_gpa else None for q in GPA_QUANTILES},
+        })
+        results.append(row)
+    return {'rows': results, 'built_at': store.manifest['built_at']}
@@ -1,5 +1,12 @@
 from App.models import Application, Position, Staff, Student
+from App.models.position import PositionStatus
 from App.database import db
+from .recommendation import mark_position_recommendations_stale, mark_student_recommendations_stale
+from .position_events import positions_changed
+from .trending import record_position_application
+from .funnel import record_application_created, record_application_transition
+from .volume import record_application_volume
+from .decision_latency import record_decision_latency
 
 __all__ = [
     'create_application',
@@ -45,7 +52,11 @@ def create_application(student_id, position_id, updated_by=None):
 
     application = Application(student_id=student_id, position_id=position_id, updated_by=updated_by)
     db.session.add(application)
+    record_application_created(application, position.company_id)
+    record_application_volume(application)
+    mark_student_recommendations_stale(student_id)
     db.session.commit()
+    record_position_application(position_id)
     return application
 
 def shortlist_application(application_id):
@@ -55,7 +66,11 @@ def shortlist_application(application_id):
         return None
     if 'shortlist' not in application.get_available_actions():
         return {'error': 'Cannot shortlist application in current state', 'application': application}
+    old_status = application.status
     application.shortlist()
+    record_application_transition(application, old_status)
+    record_decision_latency(application, old_status)
+    mark_position_recommendations_stale([application.position_id])
     db.session.commit()
     return application
 
@@ -69,11 +84,20 @@ def accept_application(application_id):
         return None
     if 'accept' not in application.get_available_actions():
         return {'error': 'Cannot accept application in current state', 'application': application}
+    old_status = application.status
     application.accept()
-    position = db.session.get(Position, application.position_id)
+    record_application_transition(application, old_status)
+    record_decision_latency(application, old_status)
+    position_id = application.position_id
+    position = db.session.get(Position, position_id)
     if position and position.number_of_positions > 0:
         position.number_of_positions -= 1
+        # Filling the last seat closes the listing in the same transaction
+        if position.number_of_positions == 0:
+            position.status = PositionStatus.CLOSED
+    mark_position_recommendations_stale([position_id])
     db.session.commit()
+    positions_changed([position_id])
     return application
 
 def reject_application(application_id):
@@ -83,7 +107,11 @@ def reject_application(application_id):
         return None
     if 'reject' not in application.get_available_actions():
         return {'error': 'Cannot reject application in current state', 'application': application}
+    old_status = application.status
     application.reject()
+    record_application_transition(application, old_status)
+    record_decision_latency(application, old_status)
+    mark_position_recommendations_stale([application.position_id])
     db.session.commit()
     return application
 
@@ -117,7 +145,11 @@ def withdraw_application(application_id):
         return None
     if 'withdraw' not in application.get_available_actions():
         return {'error': 'Cannot withdraw application in current state', 'application': application}
+    old_status = application.status
     application.withdraw()
+    record_application_transition(application, old_status)
+    record_decision_latency(application, old_status)
+    mark_position_recommendations_stale([application.position_id])
     db.session.commit()
     return application
 
@@ -1,24 +1,65 @@
 from functools import wraps
-from flask import jsonify
-from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request, current_user
+from typing import NamedTuple, Optional
+from flask import g, jsonify
+from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt, get_current_user, verify_jwt_in_request, current_user
+from werkzeug.local import LocalProxy
 
-from App.models import User
 from App.database import db
+from App.passwords import password_needs_rehash
+from .user import get_user_by_username
+from .user_cache import get_cached_user
+from .token_denylist import is_token_revoked
 
 def login(username, password):
-  user = User.query.filter_by(username=username).first()
+  user = get_user_by_username(username)
   if user and user.check_password(password):
-    return create_access_token(identity=str(user.id))
+    # Upgrade hashes made with an older PASSWORD_HASH_METHOD while we have the password
+    if password_needs_rehash(user.password):
+      user.set_password(password)
+      db.session.commit()
+    return issue_token(user)
   return None
 
 
+def issue_token(user):
+  """
+  Access token for a user whose credentials were just established, e.g. at
+  signup. It carries the user's role and company_id as claims, which hold
+  until the token expires.
+  """
+  claims = {'role': user.role}
+  company_id = getattr(user, 'company_id', None)
+  if company_id is not None:
+    claims['company_id'] = company_id
+  return create_access_token(identity=str(user.id), additional_claims=claims)
+
+
+class TokenIdentity(NamedTuple):
+  id: int
+  role: str
+  company_id: Optional[int]
+
+
+def get_token_identity():
+  """
+  Who the request's token was issued to, from its claims, for role and
+  company checks. Tokens issued without the claims fall back to the user.
+  """
+  claims = get_jwt()
+  if 'role' not in claims:
+    return TokenIdentity(current_user.id, current_user.role, getattr(current_user, 'company_id', None))
+  return TokenIdentity(int(claims['sub']), claims['role'], claims.get('company_id'))
+
+current_identity = LocalProxy(get_token_identity)
+
+
 def require_role(*roles):
     """Decorator to require specific user role(s) for access."""
     def decorator(fn):
         @wraps(fn)
         @jwt_required()
         def wrapper(*args, **kwargs):
-            if current_user.role not in roles:
+            if current_identity.role not in roles:
                 return jsonify({"message": "Unauthorized user"}), 403
             return fn(*args, **kwargs)
         return wrapper
@@ -42,23 +83,41 @@ def setup_jwt(app):
       user_id = int(identity)
     except (TypeError, ValueError):
       return None
-    return db.session.get(User, user_id)
+    return get_cached_user(user_id)
+
+  # Logged-out tokens, checked in memory (see token_denylist)
+  @jwt.token_in_blocklist_loader
+  def token_revoked_callback(_jwt_header, jwt_data):
+    return is_token_revoked(jwt_data)
 
   return jwt
 
 
-# Context processor to make 'is_authenticated' available to all templates
+def _template_user():
+  """The signed-in user for templates, or None; resolved once per request."""
+  if '_template_user' not in g:
+    user = None
+    try:
+      if verify_jwt_in_request(optional=True) is not None:
+        user = get_current_user()
+    except Exception:
+      # Expired, malformed or revoked tokens render as signed out
+      pass
+    g._template_user = user
+  return g._template_user
+
+_template_current_user = LocalProxy(_template_user)
+_template_is_authenticated = LocalProxy(lambda: _template_user() is not None)
+
+
+# Context processor to make 'is_authenticated' available to all templates.
+# Both are proxies, so renders that never touch them never look at the token
 def add_auth_context(app):
   @app.context_processor
   def inject_user():
-      try:
-          verify_jwt_in_request()
-          identity = get_jwt_identity()
-          user_id = int(identity) if identity is not None else None
-          current_user = db.session.get(User, user_id) if user_id is not None else None
-          is_authenticated = current_user is not None
-      except Exception as e:
-          print(e)
-          is_authenticated = False
-          current_user = None
-      return dict(is_authenticated=is_authenticated, current_user=current_user)
\ No newline at end of file
+      return dict(is_authenticated=_template_is_authenticated, current_user=_template_current_user)
+
+  # g outlives the request when an app context was already pushed (CLI, tests)
+  @app.teardown_request
+  def forget_template_user(_error=None):
+      g.pop('_template_user', None)
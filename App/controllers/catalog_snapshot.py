@@ -0,0 +1,241 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, as under the single-process dev server
+    fcntl = None
+
+from flask import current_app
+from sqlalchemy import select
+
+from App.models import Company, Position
+from App.database import db
+
+__all__ = [
+    'build_catalog_snapshot',
+    'refresh_catalog_snapshot',
+]
+
+# Older versions kept besides the current one, for clients mid-fetch
+KEEP_VERSIONS = 1
+# Seconds writes are collected before the snapshots they touch are
+# rendered, once, in the background
+CATALOG_SNAPSHOT_DELAY = 2
+
+SEQUENCE_PATTERN = re.compile(rb'^\{"sequence":(\d+),')
+
+
+def _snapshot_dir():
+    return current_app.config.get('CATALOG_SNAPSHOT_DIR') or os.path.join(current_app.static_folder, 'catalog')
+
+
+def _enabled():
+    return current_app.config.get('CATALOG_SNAPSHOT_ENABLED', not current_app.testing)
+
+
+def _write_atomic(path, data):
+    """Write to a temporary file in the same directory, then rename over path."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _sequence():
+    """
+    Orders renders: taken before reading, so a render with a higher
+    sequence saw every write committed before a lower one was taken.
+    """
+    return time.time_ns()
+
+
+def _published_sequence(path):
+    try:
+        with open(path + '.json', 'rb') as f:
+            match = SEQUENCE_PATTERN.match(f.read(64))
+    except FileNotFoundError:
+        return -1
+    return int(match.group(1)) if match else -1
+
+
+@contextmanager
+def _exclusive(path):
+    """Hold path's lock file, so workers publish one at a time."""
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _publish(path, positions, sequence):
+    """
+    Publish {"sequence", "positions"} as <path>.<version>.json, where
+    version is a hash of the positions, and as the stable <path>.json,
+    each with a pre-gzipped .json.gz twin. Returns the versioned file
+    name, or None if a render with a higher sequence was published first.
+    """
+    content = json.dumps(positions, separators=(',', ':'), sort_keys=True)
+    # The sequence leads, so checking it reads only the start of the file
+    body = f'{{"sequence":{sequence},"positions":{content}}}'.encode('utf-8')
+    compressed = gzip.compress(body, mtime=0)
+    version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+    versioned = f"{path}.{version}.json"
+    with _exclusive(path):
+        if _published_sequence(path) > sequence:
+            return None
+        if not os.path.exists(versioned):
+            _write_atomic(versioned + '.gz', compressed)
+            _write_atomic(versioned, body)
+        _write_atomic(path + '.json.gz', compressed)
+        _write_atomic(path + '.json', body)
+
+        older = sorted(
+            (name for name in glob.glob(glob.escape(path) + '.*.json') if name != versioned),
+            key=os.path.getmtime, reverse=True
+        )
+        for name in older[KEEP_VERSIONS:]:
+            for stale in (name, name + '.gz'):
+                if os.path.exists(stale):
+                    os.unlink(stale)
+    return os.path.basename(versioned)
+
+
+def _remove(path):
+    for name in glob.glob(glob.escape(path) + '.json') + glob.glob(glob.escape(path) + '.*.json'):
+        for stale in (name, name + '.gz'):
+            if os.path.exists(stale):
+                os.unlink(stale)
+    if os.path.exists(path + '.lock'):
+        os.unlink(path + '.lock')
+
+
+def _company_positions(company_ids):
+    positions = {company_id: [] for company_id in company_ids}
+    for position in db.session.scalars(
+        select(Position).where(Position.company_id.in_(company_ids)).order_by(Position.id)
+    ):
+        positions[position.company_id].append(position.get_json())
+    return positions
+
+
+def _publish_catalog(directory, sequence):
+    from .position import get_open_positions_json
+    return _publish(os.path.join(directory, 'positions'), get_open_positions_json(), sequence)
+
+
+def _publish_companies(directory, company_ids, sequence):
+    companies_dir = os.path.join(directory, 'companies')
+    os.makedirs(companies_dir, exist_ok=True)
+    for company_id, positions in _company_positions(company_ids).items():
+        _publish(os.path.join(companies_dir, str(company_id)), positions, sequence)
+    return len(company_ids)
+
+
+def build_catalog_snapshot():
+    """
+    Render the open-positions catalog and every company's position list
+    into static JSON files, and drop files of companies that no longer
+    exist. Returns the number of snapshots written.
+    """
+    sequence = _sequence()
+    directory = _snapshot_dir()
+    os.makedirs(os.path.join(directory, 'companies'), exist_ok=True)
+    _publish_catalog(directory, sequence)
+    company_ids = set(db.session.scalars(select(Company.id)))
+    for name in glob.glob(os.path.join(directory, 'companies', '*.json')):
+        company_id = os.path.basename(name).split('.')[0]
+        if not company_id.isdigit() or int(company_id) not in company_ids:
+            _remove(os.path.join(directory, 'companies', company_id))
+    return 1 + _publish_companies(directory, company_ids, sequence)
+
+
+class _PendingSnapshots:
+    """Companies whose lists (and whether everything) a worker has yet to re-render."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.company_ids = set()
+        self.rebuild = False
+        self.scheduled = False
+
+    def take(self):
+        with self.lock:
+            company_ids, rebuild = self.company_ids, self.rebuild
+            self.company_ids, self.rebuild, self.scheduled = set(), False, False
+        return company_ids, rebuild
+
+
+def _get_pending():
+    pending = current_app.extensions.get('catalog_snapshot')
+    if pending is None:
+        pending = current_app.extensions['catalog_snapshot'] = _PendingSnapshots()
+    return pending
+
+
+def _render(company_ids, rebuild):
+    if rebuild:
+        build_catalog_snapshot()
+        return
+    sequence = _sequence()
+    directory = _snapshot_dir()
+    _publish_catalog(directory, sequence)
+    _publish_companies(directory, company_ids, sequence)
+
+
+def _render_later(pending, delay):
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                _render(*pending.take())
+            except Exception:
+                app.logger.exception('Rendering the catalog snapshot failed')
+            finally:
+                db.session.remove()
+
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.name = 'catalog-snapshot'
+    timer.start()
+
+
+def refresh_catalog_snapshot(position_ids):
+    """
+    Re-render the catalog and the lists of the companies owning the given
+    positions after writes to them were committed. If some positions are
+    gone (purged, or deleted with their company), every snapshot is rebuilt.
+    Rendering waits CATALOG_SNAPSHOT_DELAY seconds in the background, so
+    a burst of writes is rendered once.
+    """
+    if not _enabled():
+        return
+    position_ids = set(position_ids)
+    rows = db.session.execute(
+        select(Position.id, Position.company_id)
+        .where(Position.id.in_(position_ids))
+        .execution_options(include_deleted=True)
+    ).all()
+    pending = _get_pending()
+    with pending.lock:
+        pending.rebuild |= len(rows) < len(position_ids)
+        pending.company_ids |= {company_id for _, company_id in rows}
+        scheduled, pending.scheduled = pending.scheduled, True
+    delay = current_app.config.get('CATALOG_SNAPSHOT_DELAY', CATALOG_SNAPSHOT_DELAY)
+    if not delay:
+        _render(*pending.take())
+    elif not scheduled:
+        _render_later(pending, delay)
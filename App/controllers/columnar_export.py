@@ -0,0 +1,223 @@
+import enum
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from App.models import Application, Company, ExportTombstone, Position, Student
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+
+__all__ = [
+    'EXPORT_TABLES',
+    'export_columnar',
+    'record_export_deletions',
+]
+
+ROW_GROUP_SIZE = 50000
+# Deletions are kept this long for deltas to pick up; a table last
+# exported before that is exported in full instead
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Exported columns per table. Students are their profile columns only,
+# without the user row (username, password hash)
+EXPORT_TABLES = {
+    'application': (Application.__table__, (
+        'id', 'student_id', 'position_id', 'updated_by', 'status', 'created_at', 'updated_at',
+    )),
+    'position': (Position.__table__, (
+        'id', 'title', 'number_of_positions', 'description', 'status', 'company_id', 'created_by',
+        'external_id', 'deadline', 'deleted_at', 'updated_at',
+    )),
+    'company': (Company.__table__, ('id', 'name', 'description', 'updated_at')),
+    'student': (Student.__table__, ('id', 'email', 'dob', 'gender', 'degree', 'phone', 'gpa', 'resume', 'updated_at')),
+}
+
+
+def _pyarrow():
+    """pyarrow, imported on first export only so web workers never load it."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Columnar exports need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _export_dir():
+    return current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'export')
+
+
+def _arrow_type(pa, column):
+    python_type = column.type.python_type
+    if issubclass(python_type, enum.Enum):
+        return pa.string()
+    return {
+        int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_(),
+        datetime: pa.timestamp('us'), date: pa.date32(),
+    }[python_type]
+
+
+def _values(values):
+    return [value.value if isinstance(value, enum.Enum) else value for value in values]
+
+
+def _read_watermarks(directory):
+    try:
+        with open(os.path.join(directory, 'watermarks.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_watermarks(directory, watermarks):
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(directory, 'watermarks.json'))
+
+
+def record_export_deletions(name, ids):
+    """
+    Record that rows of an exported table were hard-deleted, for the next
+    delta export. Call with the ids of every batch deleted, including rows
+    the database removes by cascade. Committed with the caller's transaction.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    now = utcnow()
+    stmt = dialect_insert(ExportTombstone).values([
+        {'table_name': name, 'row_id': row_id, 'deleted_at': now} for row_id in ids
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['table_name', 'row_id'],
+        set_={'deleted_at': stmt.excluded.deleted_at},
+    ))
+
+
+def _export_deletions(pa, name, table_dir, stamp, since):
+    """
+    Write the ids of the table's rows deleted since `since` to
+    <stamp>-deleted.parquet. Returns (rows written, latest deleted_at).
+    """
+    rows = db.session.execute(
+        select(ExportTombstone.row_id, ExportTombstone.deleted_at)
+        .where(ExportTombstone.table_name == name, ExportTombstone.deleted_at >= since)
+        .order_by(ExportTombstone.deleted_at)
+    ).all()
+    if not rows:
+        return 0, None
+    ids, deleted_at = zip(*rows)
+    batch = pa.record_batch(
+        [pa.array(ids, type=pa.int64()), pa.array(deleted_at, type=pa.timestamp('us'))],
+        names=['id', 'deleted_at']
+    )
+    fd, tmp = tempfile.mkstemp(dir=table_dir, prefix='.tmp-')
+    os.close(fd)
+    try:
+        pa.parquet.write_table(pa.Table.from_batches([batch]), tmp, compression='zstd')
+        os.replace(tmp, os.path.join(table_dir, f"{stamp}-deleted.parquet"))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(rows), deleted_at[-1]
+
+
+def _export_table(pa, name, directory, since, row_group_size):
+    """
+    Stream one table into a Parquet file, one row group per fetched chunk.
+    Returns (rows written, highest updated_at seen, the file's time stamp).
+    """
+    table, column_names = EXPORT_TABLES[name]
+    columns = [table.c[column] for column in column_names]
+    schema = pa.schema([(column.name, _arrow_type(pa, column)) for column in columns])
+    if since is None:
+        query = select(*columns).order_by(table.c.id)
+    else:
+        # Served by the table's updated_at index, in index order
+        query = select(*columns).where(table.c.updated_at >= since)
+
+    table_dir = os.path.join(directory, name)
+    os.makedirs(table_dir, exist_ok=True)
+    kind = 'delta' if since is not None else 'full'
+    stamp = f"{utcnow():%Y%m%dT%H%M%S%f}"
+    path = os.path.join(table_dir, f"{stamp}-{kind}.parquet")
+    fd, tmp = tempfile.mkstemp(dir=table_dir, prefix='.tmp-')
+    os.close(fd)
+    rows, watermark = 0, None
+    updated_at = column_names.index('updated_at')
+    try:
+        with pa.parquet.ParquetWriter(tmp, schema, compression='zstd') as writer:
+            # Soft-deleted positions are exported too, with their deleted_at
+            result = db.session.execute(query.execution_options(yield_per=row_group_size, include_deleted=True))
+            for chunk in result.partitions():
+                values = list(zip(*chunk))
+                writer.write_batch(pa.record_batch(
+                    [pa.array(_values(column), type=field.type) for column, field in zip(values, schema)],
+                    schema=schema
+                ))
+                rows += len(chunk)
+                latest = max((value for value in values[updated_at] if value is not None), default=None)
+                if latest is not None and (watermark is None or latest > watermark):
+                    watermark = latest
+        if rows or since is None:
+            os.replace(tmp, path)
+        else:
+            os.unlink(tmp)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    if since is None:
+        # A full export supersedes everything written before it
+        for stale in os.listdir(table_dir):
+            if stale.endswith('.parquet') and os.path.join(table_dir, stale) != path:
+                os.unlink(os.path.join(table_dir, stale))
+    return rows, watermark, stamp
+
+
+def export_columnar(directory=None, tables=None, full=False, row_group_size=ROW_GROUP_SIZE):
+    """
+    Write Parquet snapshots of the given tables (all of EXPORT_TABLES by
+    default) under directory/<table>/. The first export of a table, or any
+    with full=True, writes every row to a -full file and removes older
+    files; later ones write only rows updated since the last export's
+    watermark to a -delta file, to be applied by id, and the ids of rows
+    hard-deleted since to a -deleted file, to be applied first. Tables
+    last exported more than TOMBSTONE_RETENTION ago are exported in full.
+    Memory is bounded by one row group. Returns {table: rows written}.
+    """
+    pa = _pyarrow()
+    directory = directory or _export_dir()
+    os.makedirs(directory, exist_ok=True)
+    watermarks = _read_watermarks(directory)
+    started_at = utcnow()
+    written = {}
+    for name in tables or EXPORT_TABLES:
+        if name not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table '{name}'. Use: {', '.join(EXPORT_TABLES)}")
+        since = None
+        exported_at = watermarks.get(f'{name}:exported_at')
+        if not full and watermarks.get(name) and exported_at and \
+                datetime.fromisoformat(exported_at) > started_at - TOMBSTONE_RETENTION:
+            # Rows updated in the watermark's second may postdate the last
+            # export; re-exporting them is harmless when deltas apply by id
+            since = datetime.fromisoformat(watermarks[name]) - timedelta(seconds=1)
+        rows, watermark, stamp = _export_table(pa, name, directory, since, row_group_size)
+        if watermark is not None:
+            watermarks[name] = watermark.isoformat()
+        if since is not None:
+            # The same second of overlap, for deletions committed late
+            deleted_since = datetime.fromisoformat(exported_at) - timedelta(seconds=1)
+            _export_deletions(pa, name, os.path.join(directory, name), stamp, deleted_since)
+        # Deletions recorded from here on go in the next delta
+        watermarks[f'{name}:exported_at'] = started_at.isoformat()
+        written[name] = rows
+        _write_watermarks(directory, watermarks)
+    db.session.execute(delete(ExportTombstone).where(ExportTombstone.deleted_at < started_at - TOMBSTONE_RETENTION))
+    db.session.commit()
+    return written
@@ -1,27 +1,49 @@
-from App.models import Company
+from sqlalchemy.orm import selectinload
+
+from App.models import Company, COMPANY_EXPANSIONS, DeletionStatus
 from App.database import db
+from .typeahead import refresh_typeahead_companies
+from .company_deletion import run_company_deletion
 
 def create_company(name, description):
     try:
         new_company = Company(name=name, description=description)
         db.session.add(new_company)
         db.session.commit()
+        refresh_typeahead_companies([new_company.id])
         return new_company
     except Exception as e:
         db.session.rollback()
         return None
 
-def get_company(id):
-    return db.session.get(Company, id)
+def parse_company_expand(value):
+    """
+    Parse a comma-separated expand= parameter into a sorted tuple of
+    collection names. Raises ValueError for unknown names.
+    """
+    names = {name.strip() for name in (value or '').split(',') if name.strip()}
+    unknown = names - set(COMPANY_EXPANSIONS)
+    if unknown:
+        raise ValueError(f"Unknown expansion: {', '.join(sorted(unknown))}")
+    return tuple(sorted(names))
+
+def _expand_options(expand):
+    # One extra query per expanded collection, however many companies
+    return [selectinload(getattr(Company, name)) for name in expand]
+
+def get_company(id, expand=()):
+    if not expand:
+        return db.session.get(Company, id)
+    return db.session.get(Company, id, options=_expand_options(expand), populate_existing=True)
 
-def get_all_companies():
-    return db.session.scalars(db.select(Company)).all()
+def get_all_companies(expand=()):
+    return db.session.scalars(db.select(Company).options(*_expand_options(expand))).all()
 
-def get_all_companies_json():
-    companies = get_all_companies()
+def get_all_companies_json(expand=()):
+    companies = get_all_companies(expand)
     if not companies:
         return []
-    return [company.get_json() for company in companies]
+    return [company.get_json(expand) for company in companies]
 
 def update_company(id, name=None, description=None):
     company = get_company(id)
@@ -31,13 +53,16 @@ def update_company(id, name=None, description=None):
         if description is not None:
             company.description = description
         db.session.commit()
+        refresh_typeahead_companies([id])
         return company
     return None
 
 def delete_company(id):
-    company = get_company(id)
-    if company:
-        db.session.delete(company)
-        db.session.commit()
-        return True
-    return False
+    """
+    Delete a company and everything under it before returning. The API
+    runs the same job in the background with start_company_deletion.
+    """
+    if not get_company(id):
+        return False
+    job = run_company_deletion(id)
+    return job is not None and job.status == DeletionStatus.DONE
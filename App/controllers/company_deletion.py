@@ -0,0 +1,207 @@
+import threading
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, or_, select
+
+from App.models import (
+    Application, ApplicationFunnel, ApplicationVolume, Company, CompanyDeletion, DecisionLatency, DeletionStatus,
+    Employer, Position, PositionActivity, PositionRecommendation, Staff, User
+)
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+from .recommendation import mark_position_recommendations_stale
+from .typeahead import refresh_typeahead_companies
+from .position_events import positions_changed
+from .user_cache import invalidate_cached_users
+from .columnar_export import record_export_deletions
+
+__all__ = [
+    'request_company_deletion',
+    'run_company_deletion',
+    'start_company_deletion',
+    'get_company_deletion',
+]
+
+DELETION_BATCH_SIZE = 500
+# Seconds without a committed batch after which a job's worker is
+# presumed dead, and a new request resumes the job
+DELETION_STALE_AFTER = 300
+
+
+def get_company_deletion(company_id):
+    return db.session.get(CompanyDeletion, company_id)
+
+
+def _claim_company_deletion(company_id):
+    """
+    Claim the company's deletion job for the caller with one upsert: a new
+    job, or one that is done, failed, or pending or running without a
+    heartbeat for COMPANY_DELETION_STALE_AFTER seconds (its worker died),
+    is reset to pending with a fresh heartbeat. Returns (job, claimed);
+    the job is None if the company doesn't exist, and claimed is False
+    when another worker holds it.
+    """
+    if not db.session.get(Company, company_id):
+        job = get_company_deletion(company_id)
+        if job and job.status in (DeletionStatus.PENDING, DeletionStatus.RUNNING):
+            return job, False
+        return None, False
+    now = utcnow()
+    stale = now - timedelta(seconds=current_app.config.get('COMPANY_DELETION_STALE_AFTER', DELETION_STALE_AFTER))
+    values = {
+        'status': DeletionStatus.PENDING,
+        'stage': None,
+        'error': None,
+        'finished_at': None,
+        'heartbeat_at': now,
+        # What is left, when resuming
+        'positions_total': db.session.scalar(
+            select(func.count()).select_from(Position).where(Position.company_id == company_id)
+            .execution_options(include_deleted=True)
+        ),
+        'positions_deleted': 0,
+        'applications_deleted': 0,
+        'users_deleted': 0,
+    }
+    stmt = dialect_insert(CompanyDeletion).values(company_id=company_id, **values)
+    jobs = CompanyDeletion.__table__
+    claimed = db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['company_id'],
+        set_={**{name: stmt.excluded[name] for name in values}, 'updated_at': func.now()},
+        where=or_(
+            jobs.c.status.in_([DeletionStatus.DONE, DeletionStatus.FAILED]),
+            jobs.c.heartbeat_at.is_(None),
+            jobs.c.heartbeat_at < stale,
+        ),
+    )).rowcount == 1
+    db.session.commit()
+    return db.session.get(CompanyDeletion, company_id, populate_existing=True), claimed
+
+
+def request_company_deletion(company_id):
+    """
+    Record a pending deletion job for the company, or return the one
+    already under way. Returns None if the company doesn't exist.
+    """
+    job, _ = _claim_company_deletion(company_id)
+    return job
+
+
+def _commit(job):
+    # Every batch is a heartbeat: a job without one for long has lost its worker
+    job.heartbeat_at = utcnow()
+    db.session.commit()
+
+
+def _ids(query, batch_size):
+    return db.session.scalars(query.limit(batch_size).execution_options(include_deleted=True)).all()
+
+
+def _delete_applications(job, batch_size):
+    company_positions = select(Position.id).where(Position.company_id == job.company_id)
+    while ids := _ids(select(Application.id).where(Application.position_id.in_(company_positions)), batch_size):
+        record_export_deletions('application', ids)
+        db.session.execute(delete(Application).where(Application.id.in_(ids)))
+        job.applications_deleted += len(ids)
+        _commit(job)
+
+
+def _delete_positions(job, batch_size):
+    deleted = []
+    while ids := _ids(select(Position.id).where(Position.company_id == job.company_id), batch_size):
+        mark_position_recommendations_stale(ids)
+        db.session.execute(delete(PositionRecommendation).where(PositionRecommendation.position_id.in_(ids)))
+        db.session.execute(delete(PositionActivity).where(PositionActivity.position_id.in_(ids)))
+        db.session.execute(delete(ApplicationFunnel).where(ApplicationFunnel.position_id.in_(ids)))
+        db.session.execute(delete(ApplicationVolume).where(ApplicationVolume.position_id.in_(ids)))
+        db.session.execute(delete(DecisionLatency).where(DecisionLatency.position_id.in_(ids)))
+        record_export_deletions('position', ids)
+        db.session.execute(delete(Position).where(Position.id.in_(ids)))
+        job.positions_deleted += len(ids)
+        _commit(job)
+        deleted += ids
+    return deleted
+
+
+def _delete_users(job, model, batch_size):
+    # Joined inheritance: the subclass row first, then the user row
+    while ids := _ids(select(model.id).where(model.company_id == job.company_id), batch_size):
+        db.session.execute(delete(model.__table__).where(model.__table__.c.id.in_(ids)))
+        db.session.execute(delete(User.__table__).where(User.__table__.c.id.in_(ids)))
+        job.users_deleted += len(ids)
+        _commit(job)
+        # Bulk deletes bypass the ORM events that keep the user cache current
+        invalidate_cached_users(*ids)
+
+
+def run_company_deletion(company_id, batch_size=DELETION_BATCH_SIZE):
+    """
+    Delete a company bottom-up with set-based DELETEs, committing each
+    batch with the job's progress: applications, then positions (with
+    their recommendations, activity, funnel, volume and latency rollups),
+    then staff and employers, then the company. Safe to rerun after a
+    failure or a dead worker; a job another worker holds is returned as
+    it is. Returns the job.
+    """
+    job, claimed = _claim_company_deletion(company_id)
+    if not claimed:
+        return job
+    return _run_claimed(job, batch_size)
+
+
+def _run_claimed(job, batch_size=DELETION_BATCH_SIZE):
+    company_id = job.company_id
+    job.status = DeletionStatus.RUNNING
+    _commit(job)
+    try:
+        job.stage = 'applications'
+        _delete_applications(job, batch_size)
+        job.stage = 'positions'
+        position_ids = _delete_positions(job, batch_size)
+        job.stage = 'users'
+        _delete_users(job, Staff, batch_size)
+        _delete_users(job, Employer, batch_size)
+        job.stage = 'company'
+        record_export_deletions('company', [company_id])
+        db.session.execute(delete(Company).where(Company.id == company_id))
+        job.status = DeletionStatus.DONE
+        job.finished_at = utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job.status = DeletionStatus.FAILED
+        job.error = str(e)
+        db.session.commit()
+        return job
+    refresh_typeahead_companies([company_id])
+    positions_changed(position_ids)
+    return job
+
+
+def start_company_deletion(company_id):
+    """
+    Queue the company's deletion and run it on a background thread (a
+    greenlet under gevent workers), or inline when COMPANY_DELETION_IN_BACKGROUND
+    is off. Concurrent requests get the job the first one claimed. Returns
+    the job, or None if the company doesn't exist.
+    """
+    job, claimed = _claim_company_deletion(company_id)
+    if not claimed:
+        return job
+    if not current_app.config.get('COMPANY_DELETION_IN_BACKGROUND', True):
+        return _run_claimed(job)
+
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                _run_claimed(get_company_deletion(company_id))
+            except Exception:
+                app.logger.exception('Deleting company %s failed', company_id)
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name=f'company-deletion-{company_id}', daemon=True).start()
+    return job
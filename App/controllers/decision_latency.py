@@ -0,0 +1,197 @@
+import math
+import struct
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from App.models import DecisionLatency, Position
+from App.models.application_state import ApplicationStatus
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+
+__all__ = [
+    'LATENCY_QUANTILES',
+    'LatencySketch',
+    'record_decision_latency',
+    'get_decision_latency',
+]
+
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class LatencySketch:
+    """
+    DDSketch of non-negative durations in seconds: every quantile is
+    within relative_accuracy of the true value, in memory logarithmic in
+    the range of values.
+
+    A value x is counted in bin ceil(log_gamma(x)), with gamma chosen so
+    that a bin spans the accuracy; values under one second count as zero.
+    Merging two sketches adds their bins, so sketches kept per worker, day
+    or position combine into exactly the sketch of all their values.
+    """
+
+    VERSION = 1
+    _HEADER = struct.Struct('<Bdd')
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        value = max(value, 0.0)
+        if value < 1:
+            self.zero_count += weight
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += weight
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        for index, weight in other.bins.items():
+            self.bins[index] += weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """The q-quantile (0 <= q <= 1), or None if the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bin (gamma^(i-1), gamma^i] in relative terms
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_bytes(self):
+        """Header, then varints: zero count, bin count, (index delta, weight) per bin."""
+        out = bytearray(self._HEADER.pack(self.VERSION, self.min, self.max))
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for index in sorted(self.bins):
+            delta = index - previous
+            _write_varint(out, delta << 1 if delta >= 0 else (-delta << 1) - 1)
+            _write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data, relative_accuracy=0.01):
+        sketch = cls(relative_accuracy)
+        version, sketch.min, sketch.max = cls._HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f"Unknown sketch version {version}")
+        offset = cls._HEADER.size
+        sketch.zero_count, offset = _read_varint(data, offset)
+        bins, offset = _read_varint(data, offset)
+        index = 0
+        for _ in range(bins):
+            delta, offset = _read_varint(data, offset)
+            index += delta >> 1 if not delta & 1 else -((delta + 1) >> 1)
+            sketch.bins[index], offset = _read_varint(data, offset)
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+def record_decision_latency(application, old_status):
+    """
+    Add the time since the application was made to the sketch of its new
+    status for today. Committed with the caller's transaction; the row is
+    locked until then so concurrent workers merge into it in turn.
+    """
+    if application.status == old_status or application.created_at is None:
+        return
+    now = utcnow()
+    company_id = db.session.get(Position, application.position_id).company_id
+    key = {'company_id': company_id, 'day': now.date(), 'position_id': application.position_id, 'status': application.status}
+    # Make sure the row exists, then lock it for the read-merge-write
+    db.session.execute(
+        dialect_insert(DecisionLatency).values(sketch=LatencySketch().to_bytes(), **key)
+        .on_conflict_do_nothing(index_elements=list(key))
+    )
+    row = db.session.get(
+        DecisionLatency, tuple(key.values()), with_for_update=True, populate_existing=True
+    )
+    sketch = LatencySketch.from_bytes(row.sketch)
+    sketch.add((now - application.created_at).total_seconds())
+    row.sketch = sketch.to_bytes()
+
+
+def _percentiles(sketch):
+    return {
+        'count': sketch.count,
+        **{f"p{round(q * 100)}": None if (value := sketch.quantile(q)) is None else round(value, 1)
+           for q in LATENCY_QUANTILES},
+    }
+
+
+def get_decision_latency(company_id, start=None, end=None, position_id=None):
+    """
+    Percentiles of seconds from application to each status a company's
+    applications moved into, overall and per position, by merging the
+    sketches of the decision days in [start, end] (one index range read).
+    """
+    # Served by the (company_id, day, ...) primary key
+    query = select(
+        DecisionLatency.position_id, DecisionLatency.status, DecisionLatency.sketch
+    ).where(DecisionLatency.company_id == company_id)
+    if start is not None:
+        query = query.where(DecisionLatency.day >= start)
+    if end is not None:
+        query = query.where(DecisionLatency.day <= end)
+    if position_id is not None:
+        query = query.where(DecisionLatency.position_id == position_id)
+
+    totals = defaultdict(LatencySketch)
+    positions = defaultdict(lambda: defaultdict(LatencySketch))
+    for row_position_id, status, data in db.session.execute(query):
+        sketch = LatencySketch.from_bytes(data)
+        totals[status].merge(sketch)
+        positions[row_position_id][status].merge(sketch)
+
+    def by_status(sketches):
+        return {status.value: _percentiles(sketches[status]) for status in ApplicationStatus if status in sketches}
+
+    return {
+        'company_id': company_id,
+        'quantiles': list(LATENCY_QUANTILES),
+        'totals': by_status(totals),
+        'positions': {str(pid): by_status(sketches) for pid, sketches in sorted(positions.items())},
+    }
@@ -0,0 +1,169 @@
+from collections import Counter, defaultdict
+
+from sqlalchemy import delete, insert, select
+
+from App.models import Application, ApplicationFunnel, Position
+from App.models.application_state import ApplicationStatus
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+
+__all__ = [
+    'FUNNEL_CYCLES',
+    'record_application_created',
+    'record_application_transition',
+    'get_company_funnel',
+    'rebuild_funnel_rollups',
+]
+
+FUNNEL_CYCLES = ('day', 'week', 'month')
+REBUILD_BATCH_SIZE = 1000
+
+
+def _bump(rows):
+    """Add entered/current deltas to the rollup rows, creating missing ones."""
+    stmt = dialect_insert(ApplicationFunnel)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['company_id', 'day', 'position_id', 'status'],
+            set_={
+                'entered': ApplicationFunnel.entered + stmt.excluded.entered,
+                'current': ApplicationFunnel.current + stmt.excluded.current,
+            }
+        ),
+        rows
+    )
+
+
+def record_application_created(application, company_id):
+    """
+    Count a new application in its intake day's rollup. Committed with
+    the caller's transaction; stamps created_at so it matches the day.
+    """
+    if application.created_at is None:
+        application.created_at = utcnow()
+    _bump([{
+        'company_id': company_id,
+        'day': application.created_at.date(),
+        'position_id': application.position_id,
+        'status': ApplicationStatus.PENDING,
+        'entered': 1,
+        'current': 1,
+    }])
+
+
+def record_application_transition(application, old_status):
+    """Move an application between statuses in the rollup. Committed with the caller's transaction."""
+    if application.status == old_status:
+        return
+    company_id = db.session.scalar(select(Position.company_id).where(Position.id == application.position_id))
+    key = {
+        'company_id': company_id,
+        'day': (application.created_at or utcnow()).date(),
+        'position_id': application.position_id,
+    }
+    _bump([
+        dict(key, status=application.status, entered=1, current=1),
+        dict(key, status=old_status, entered=0, current=-1),
+    ])
+
+
+def _cycle(day, cycle):
+    if cycle == 'day':
+        return day.isoformat()
+    if cycle == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{day.year}-{day.month:02d}"
+
+
+def _rate(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _summary(entered, current):
+    applied = entered[ApplicationStatus.PENDING]
+    shortlisted = entered[ApplicationStatus.SHORTLISTED]
+    accepted = entered[ApplicationStatus.ACCEPTED]
+    withdrawn = entered[ApplicationStatus.WITHDRAWN]
+    return {
+        'applied': applied,
+        'shortlisted': shortlisted,
+        'accepted': accepted,
+        'rejected': entered[ApplicationStatus.REJECTED],
+        'withdrawn': withdrawn,
+        'shortlist_rate': _rate(shortlisted, applied),
+        'acceptance_rate': _rate(accepted, shortlisted),
+        'withdrawal_rate': _rate(withdrawn, applied),
+        'current': {status.value: current[status] for status in ApplicationStatus},
+    }
+
+
+def get_company_funnel(company_id, start=None, end=None, cycle='month'):
+    """
+    Conversion funnel of a company's applications, per intake cycle and
+    per position, from the rollups (one index range read). start and end
+    are inclusive intake dates.
+    """
+    # Served by the (company_id, day, ...) primary key
+    query = select(
+        ApplicationFunnel.day, ApplicationFunnel.position_id, ApplicationFunnel.status,
+        ApplicationFunnel.entered, ApplicationFunnel.current
+    ).where(ApplicationFunnel.company_id == company_id)
+    if start is not None:
+        query = query.where(ApplicationFunnel.day >= start)
+    if end is not None:
+        query = query.where(ApplicationFunnel.day <= end)
+
+    totals = defaultdict(lambda: (Counter(), Counter()))
+    positions = defaultdict(lambda: defaultdict(lambda: (Counter(), Counter())))
+    for day, position_id, status, entered, current in db.session.execute(query.order_by(ApplicationFunnel.day)):
+        key = _cycle(day, cycle)
+        for counters in (totals[key], positions[key][position_id]):
+            counters[0][status] += entered
+            counters[1][status] += current
+
+    return {
+        'company_id': company_id,
+        'cycle': cycle,
+        'cycles': [{
+            'cycle': key,
+            'totals': _summary(*counters),
+            'positions': {
+                str(position_id): _summary(*position_counters)
+                for position_id, position_counters in sorted(positions[key].items())
+            },
+        } for key, counters in totals.items()],
+    }
+
+
+def rebuild_funnel_rollups(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute every rollup row from the application table, e.g. after a
+    restore. Past transitions aren't stored, so each application counts as
+    having entered pending and its current status (accepted ones also
+    shortlisted, the only way to acceptance). Returns the rows written.
+    """
+    entered, current = Counter(), Counter()
+    rows = db.session.execute(
+        select(Position.company_id, Application.position_id, Application.created_at, Application.status)
+        .join(Position, Position.id == Application.position_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for company_id, position_id, created_at, status in rows:
+        key = (company_id, (created_at or utcnow()).date(), position_id)
+        entered[key + (ApplicationStatus.PENDING,)] += 1
+        if status == ApplicationStatus.ACCEPTED:
+            entered[key + (ApplicationStatus.SHORTLISTED,)] += 1
+        if status != ApplicationStatus.PENDING:
+            entered[key + (status,)] += 1
+        current[key + (status,)] += 1
+
+    db.session.execute(delete(ApplicationFunnel))
+    rollups = [{
+        'company_id': company_id, 'day': day, 'position_id': position_id, 'status': status,
+        'entered': count, 'current': current[(company_id, day, position_id, status)],
+    } for (company_id, day, position_id, status), count in entered.items()]
+    for start in range(0, len(rollups), batch_size):
+        db.session.execute(insert(ApplicationFunnel), rollups[start:start + batch_size])
+    db.session.commit()
+    return len(rollups)
@@ -3,12 +3,12 @@ from .user import create_user
 from .application import create_application
 from .position import open_position
 from .company import create_company
-from App.database import db
+from App.database import db, create_db
 
 
 def initialize():
     db.drop_all()
-    db.create_all()
+    create_db()
     # Create a company first
     company = create_company('Default Company', 'The default company for testing')
 
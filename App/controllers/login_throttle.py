@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+__all__ = [
+    'LoginThrottle',
+    'check_login_throttle',
+]
+
+# Burst size and refill rate (tokens per second) of each bucket
+USERNAME_BURST, USERNAME_RATE = 5, 1 / 30
+IP_BURST, IP_RATE = 30, 1.0
+# Buckets untouched for this long are full again, so their rows can go
+PRUNE_EVERY = 1000
+# Seconds to wait for other workers' transactions on the file. SQLite
+# sleeps through it, stalling every request of a gevent worker, so it is
+# kept short; a transaction here takes well under a millisecond
+LOCK_TIMEOUT = 0.05
+# Seconds an attempt refused because the file stayed locked is told to wait
+BUSY_RETRY = 1
+
+
+class LoginThrottle:
+    """
+    Token buckets per username and per client IP, shared by every worker
+    on the host through a SQLite file.
+
+    Each login attempt takes a token from both of its buckets, inside one
+    IMMEDIATE transaction so workers update a bucket in turn. A bucket
+    refills continuously up to its burst size; an attempt finding either
+    bucket empty is refused with the seconds until it refills. Refusals
+    are also remembered in the worker until then, so repeated attempts are
+    turned away from a dict lookup without touching the file. If the file
+    stays locked past lock_timeout, the attempt is refused for BUSY_RETRY
+    seconds: under that much contention, letting attempts through
+    unthrottled is what the buckets are there to prevent.
+    """
+
+    def __init__(self, path, username_burst=USERNAME_BURST, username_rate=USERNAME_RATE,
+                 ip_burst=IP_BURST, ip_rate=IP_RATE, lock_timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self.limits = {'u': (username_burst, username_rate), 'ip': (ip_burst, ip_rate)}
+        self._blocked = {}  # bucket key -> time it has a token again
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._calls = 0
+
+    def _connect(self):
+        # One connection per process; a forked worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=self.lock_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Losing a few buckets' state in a crash is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+                " WITHOUT ROWID"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _buckets(self, username, ip):
+        buckets = [(f'u:{username}',) + self.limits['u']]
+        if ip:
+            buckets.append((f'ip:{ip}',) + self.limits['ip'])
+        return buckets
+
+    def acquire(self, username, ip, now=None):
+        """Take a token for a login attempt. Returns 0 if allowed, else seconds to wait."""
+        now = time.time() if now is None else now
+        buckets = self._buckets(username, ip)
+        wait = max(self._blocked.get(key, 0) - now for key, _, _ in buckets)
+        if wait > 0:
+            return wait
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                return BUSY_RETRY
+            try:
+                keys = [key for key, _, _ in buckets]
+                stored = {
+                    key: (tokens, updated) for key, tokens, updated in conn.execute(
+                        f"SELECT key, tokens, updated FROM bucket WHERE key IN ({','.join('?' * len(keys))})", keys
+                    )
+                }
+                levels, waits = {}, {}
+                for key, burst, rate in buckets:
+                    tokens, updated = stored.get(key, (burst, now))
+                    levels[key] = min(burst, tokens + max(now - updated, 0) * rate)
+                    if levels[key] < 1:
+                        waits[key] = (1 - levels[key]) / rate
+                if not waits:
+                    conn.executemany(
+                        "INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                        [(key, level - 1, now) for key, level in levels.items()]
+                    )
+                self._calls += 1
+                if self._calls % PRUNE_EVERY == 0:
+                    self._prune(conn, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        if not waits:
+            return 0
+        for key, seconds in waits.items():
+            self._blocked[key] = now + seconds
+        if len(self._blocked) > 10000:
+            self._blocked = {key: until for key, until in self._blocked.items() if until > now}
+        return max(waits.values())
+
+    def _prune(self, conn, now):
+        # A bucket idle for burst / rate seconds is full, the same as no row
+        for prefix, (burst, rate) in self.limits.items():
+            conn.execute(
+                "DELETE FROM bucket WHERE key >= ? AND key < ? AND updated < ?",
+                (f'{prefix}:', f'{prefix};', now - burst / rate)
+            )
+
+
+def _get_throttle():
+    throttle = current_app.extensions.get('login_throttle')
+    if throttle is None:
+        config = current_app.config
+        path = config.get('LOGIN_THROTTLE_PATH') or os.path.join(current_app.instance_path, 'login_throttle.sqlite')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        throttle = LoginThrottle(
+            path,
+            username_burst=config.get('LOGIN_THROTTLE_USERNAME_BURST', USERNAME_BURST),
+            username_rate=config.get('LOGIN_THROTTLE_USERNAME_RATE', USERNAME_RATE),
+            ip_burst=config.get('LOGIN_THROTTLE_IP_BURST', IP_BURST),
+            ip_rate=config.get('LOGIN_THROTTLE_IP_RATE', IP_RATE),
+            lock_timeout=config.get('LOGIN_THROTTLE_LOCK_TIMEOUT', LOCK_TIMEOUT),
+        )
+        current_app.extensions['login_throttle'] = throttle
+    return throttle
+
+
+def check_login_throttle(username, ip):
+    """
+    Seconds the client must wait before this login attempt (0 to go
+    ahead), taking a token otherwise. Call before login() so refused
+    attempts never query or hash. Off under testing unless
+    LOGIN_THROTTLE_ENABLED is set.
+    """
+    if not current_app.config.get('LOGIN_THROTTLE_ENABLED', not current_app.testing):
+        return 0
+    return _get_throttle().acquire(username, ip)
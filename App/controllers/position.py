@@ -1,8 +1,18 @@
 from App.models import Position, Employer, Application
 from App.models.position import PositionStatus
 from App.database import db
-
-def open_position(user_id, title, number_of_positions=1, description=None):
+from sqlalchemy import delete, select
+from .position_deadline import utcnow, accepting_applications
+from .recommendation import mark_position_recommendations_stale, mark_student_recommendations_stale
+from .position_events import positions_changed
+from .trending import record_position_application
+from .funnel import record_application_created
+from .volume import record_application_volume
+from .columnar_export import record_export_deletions
+
+PURGE_BATCH_SIZE = 500
+
+def open_position(user_id, title, number_of_positions=1, description=None, deadline=None):
     employer = db.session.get(Employer, user_id)
     if not employer:
         return None
@@ -12,15 +22,20 @@ def open_position(user_id, title, number_of_positions=1, description=None):
         company_id=employer.company_id,
         created_by=employer.id,
         number=number_of_positions,
-        description=description
+        description=description,
+        deadline=deadline
     )
     db.session.add(new_position)
     try:
+        db.session.flush()
+        position_id = new_position.id
+        mark_position_recommendations_stale([position_id])
         db.session.commit()
-        return new_position
     except Exception as e:
         db.session.rollback()
         return None
+    positions_changed([position_id])
+    return new_position
 
 
 def get_positions_by_employer(user_id):
@@ -43,11 +58,13 @@ def update_position_status(position_id, status):
         return None
     try:
         position.status = PositionStatus(status) if isinstance(status, str) else status
+        mark_position_recommendations_stale([position.id])
         db.session.commit()
-        return position
     except Exception:
         db.session.rollback()
         return None
+    positions_changed([position_id])
+    return position
 
 def update_position_count(position_id, number_of_positions):
     position = db.session.get(Position, position_id)
@@ -56,25 +73,71 @@ def update_position_count(position_id, number_of_positions):
     try:
         position.number_of_positions = number_of_positions
         db.session.commit()
-        return position
     except Exception:
         db.session.rollback()
         return None
+    positions_changed([position_id])
+    return position
 
 def delete_position(position_id):
+    """
+    Soft-delete a position: it disappears from every query at once, and
+    purge_deleted_positions removes the row and its applications later.
+    """
     position = db.session.get(Position, position_id)
     if not position:
         return False
     try:
-        db.session.delete(position)
+        position.deleted_at = utcnow()
+        # Frees the feed key, so a later sync can recreate the position
+        position.external_id = None
+        mark_position_recommendations_stale([position_id])
         db.session.commit()
-        return True
     except Exception:
         db.session.rollback()
         return False
+    db.session.expunge(position)
+    positions_changed([position_id])
+    return True
+
+def purge_deleted_positions(batch_size=PURGE_BATCH_SIZE):
+    """
+    Remove soft-deleted positions, one batch per transaction. Their
+    applications, recommendations and activity go with them through
+    ON DELETE CASCADE, without loading anything into the session; the
+    ids removed are recorded for columnar export deltas.
+    Returns the number of positions purged.
+    """
+    purged = 0
+    while True:
+        # Served by ix_position_deleted_at
+        ids = db.session.scalars(
+            select(Position.id)
+            .where(Position.deleted_at.isnot(None))
+            .limit(batch_size)
+            .execution_options(include_deleted=True)
+        ).all()
+        if not ids:
+            return purged
+        # Exports learn of the rows going, the cascaded applications included
+        record_export_deletions('application', db.session.scalars(
+            select(Application.id)
+            .where(Application.position_id.in_(ids))
+            .execution_options(include_deleted=True)
+        ).all())
+        record_export_deletions('position', ids)
+        db.session.execute(
+            delete(Position)
+            .where(Position.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            return purged
 
 def get_open_positions():
-    return db.session.query(Position).filter_by(status=PositionStatus.OPEN).all()
+    return db.session.query(Position).filter(accepting_applications()).all()
 
 def get_open_positions_json():
     positions = get_open_positions()
@@ -90,7 +153,7 @@ def get_position_json(position_id):
         return position.get_json()
     return None
 
-def update_position(position_id, title=None, number_of_positions=None, description=None):
+def update_position(position_id, title=None, number_of_positions=None, description=None, deadline=None):
     position = db.session.get(Position, position_id)
     if not position:
         return None
@@ -101,13 +164,18 @@ def update_position(position_id, title=None, number_of_positions=None, descripti
         position.number_of_positions = number_of_positions
     if description is not None:
         position.description = description
+    if deadline is not None:
+        position.deadline = deadline
 
     try:
+        if deadline is not None:
+            mark_position_recommendations_stale([position.id])
         db.session.commit()
-        return position
     except Exception:
         db.session.rollback()
         return None
+    positions_changed([position_id])
+    return position
     
 def apply_for_position(student_id, position_id):
     position = db.session.get(Position, position_id)
@@ -117,6 +185,9 @@ def apply_for_position(student_id, position_id):
     if position.status != PositionStatus.OPEN:
         return {"error": "Position is not open"}
 
+    if position.deadline is not None and position.deadline <= utcnow():
+        return {"error": "Position deadline has passed"}
+
     existing = db.session.query(Application).filter_by(
         student_id=student_id,
         position_id=position_id
@@ -132,11 +203,15 @@ def apply_for_position(student_id, position_id):
 
     try:
         db.session.add(application)
+        record_application_created(application, position.company_id)
+        record_application_volume(application)
+        mark_student_recommendations_stale(student_id)
         db.session.commit()
-        return application
     except Exception:
         db.session.rollback()
         return None
+    record_position_application(position_id)
+    return application
 
 def get_positions_by_company(company_id):
     return db.session.query(Position).filter_by(company_id=company_id).all()
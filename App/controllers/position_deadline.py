@@ -0,0 +1,118 @@
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+
+from App.models import Position
+from App.models.position import PositionStatus
+from App.database import db
+
+__all__ = [
+    'utcnow',
+    'parse_deadline',
+    'accepting_applications',
+    'close_expired_positions',
+    'get_next_deadline',
+    'DeadlineSweeper',
+]
+
+SWEEP_BATCH_SIZE = 500
+
+
+def utcnow():
+    """Current time as a naive UTC datetime, matching the DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_deadline(value):
+    """Parse an ISO 8601 deadline into naive UTC. Raises ValueError if invalid."""
+    deadline = datetime.fromisoformat(value)
+    if deadline.tzinfo is not None:
+        deadline = deadline.astimezone(timezone.utc).replace(tzinfo=None)
+    return deadline
+
+
+def accepting_applications():
+    """Filter for open positions whose deadline, if any, has not passed yet."""
+    # Expired positions stay OPEN until the deadline sweeper closes them,
+    # so listings filter them here as well to hide them immediately.
+    return and_(
+        Position.status == PositionStatus.OPEN,
+        or_(Position.deadline.is_(None), Position.deadline > utcnow())
+    )
+
+
+def close_expired_positions(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Close open positions whose deadline has passed, one batch per transaction."""
+    from .recommendation import mark_position_recommendations_stale
+    from .position_events import positions_changed
+
+    now = now or utcnow()
+    closed = 0
+    while True:
+        # Served by ix_position_status_deadline
+        ids = db.session.scalars(
+            select(Position.id)
+            .where(Position.status == PositionStatus.OPEN, Position.deadline <= now)
+            .order_by(Position.deadline)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(
+            update(Position)
+            .where(Position.id.in_(ids), Position.status == PositionStatus.OPEN)
+            .values(status=PositionStatus.CLOSED)
+            .execution_options(synchronize_session=False)
+        )
+        mark_position_recommendations_stale(ids)
+        db.session.commit()
+        positions_changed(ids)
+        closed += len(ids)
+        if len(ids) < batch_size:
+            break
+    return closed
+
+
+def get_next_deadline(now=None):
+    """Earliest upcoming deadline among open positions, or None."""
+    return db.session.scalar(
+        select(func.min(Position.deadline)).where(
+            Position.status == PositionStatus.OPEN,
+            Position.deadline > (now or utcnow())
+        )
+    )
+
+
+class DeadlineSweeper:
+    """
+    Closes expired positions, then sleeps until the next deadline is due
+    instead of polling. Sleeps are capped at max_sleep so deadlines added
+    by other processes in the meantime are picked up.
+    """
+
+    def __init__(self, max_sleep=300, batch_size=SWEEP_BATCH_SIZE):
+        self.max_sleep = max_sleep
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+
+    def sweep(self):
+        """Run one sweep. Returns (positions closed, seconds until the next one is due)."""
+        closed = close_expired_positions(batch_size=self.batch_size)
+        next_deadline = get_next_deadline()
+        # Don't hold a connection while sleeping
+        db.session.remove()
+        if next_deadline is None:
+            return closed, self.max_sleep
+        delay = (next_deadline - utcnow()).total_seconds()
+        return closed, min(self.max_sleep, max(delay, 0))
+
+    def run(self, on_sweep=None):
+        while not self._stop.is_set():
+            closed, delay = self.sweep()
+            if on_sweep:
+                on_sweep(closed, delay)
+            self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
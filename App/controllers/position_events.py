@@ -0,0 +1,39 @@
+from flask import current_app
+
+from App.database import db
+from .similarity import build_similarity_index, refresh_similar_positions
+from .typeahead import build_typeahead_index, refresh_typeahead_positions
+from .catalog_snapshot import refresh_catalog_snapshot
+from .position_facets import build_position_facets, refresh_position_facets
+
+__all__ = ['positions_changed', 'warm_position_indexes']
+
+
+def positions_changed(position_ids):
+    """
+    Patch this worker's in-memory position indexes and re-render the
+    static catalog after writes to the given positions have been committed.
+    The writes stand either way, so a failing hook is logged, not raised;
+    what it missed is picked up by the next rebuild.
+    """
+    position_ids = list(position_ids)
+    if not position_ids:
+        return
+    for refresh in (
+        refresh_similar_positions,
+        refresh_typeahead_positions,
+        refresh_position_facets,
+        refresh_catalog_snapshot,
+    ):
+        try:
+            refresh(position_ids)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Refreshing positions %s failed', position_ids)
+
+
+def warm_position_indexes():
+    """Build the in-memory position indexes up front, e.g. at worker start."""
+    build_similarity_index()
+    build_typeahead_index()
+    build_position_facets()
@@ -0,0 +1,282 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import select
+
+from App.models import Position
+from App.models.position import PositionStatus
+from App.database import db
+from .position_deadline import utcnow
+
+__all__ = [
+    'FACETS',
+    'PositionFacetIndex',
+    'openings_band',
+    'build_position_facets',
+    'browse_positions',
+    'refresh_position_facets',
+]
+
+FACETS = ('company', 'openings', 'status')
+# (lowest, highest, label) of each openings band; None means unbounded
+OPENINGS_BANDS = ((0, 0, '0'), (1, 1, '1'), (2, 5, '2-5'), (6, 10, '6-10'), (11, None, '11+'))
+
+
+def openings_band(number):
+    number = number or 0
+    for low, high, label in OPENINGS_BANDS:
+        if number >= low and (high is None or number <= high):
+            return label
+    return OPENINGS_BANDS[0][2]
+
+
+def _facet_values(position, now):
+    accepting = position.status == PositionStatus.OPEN and (position.deadline is None or position.deadline > now)
+    return {
+        'company': str(position.company_id),
+        'openings': openings_band(position.number_of_positions),
+        'status': 'open' if accepting else 'closed',
+    }
+
+
+class PositionFacetIndex:
+    """
+    Bitmaps of positions per facet value, for filtering and counting any
+    combination of facets in memory.
+
+    Each position owns a bit (its slot); a bitmap is a Python int with the
+    bits of the positions having that value, so filters are ANDs of ORs and
+    counts are popcounts. Slots are assigned in id order and never reused
+    until the next build, so iterating bits yields positions by id. Writes
+    move a position's bits in place; the index is rebuilt, in the
+    background, once older than max_age. Open positions with a deadline are kept in a heap, and move to
+    closed as each search passes their deadline, whether or not the
+    deadline sweeper has closed them yet.
+    """
+
+    def __init__(self, max_age=900):
+        self.max_age = max_age
+        self.built_at = None
+        self.pending = None  # position ids written while a new index is being built
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.slots = {}  # position id -> slot
+        self.positions = []  # slot -> position JSON, None once removed
+        self.values = []  # slot -> facet values
+        self.bitmaps = {facet: defaultdict(int) for facet in FACETS}
+        self.live = 0
+        self.deadlines = []  # slot -> deadline while open, None otherwise
+        self.expiring = []  # heap of (deadline, slot), with entries outdated by writes
+
+    def build(self, positions):
+        """Rebuild from (id, JSON, facet values[, deadline]) rows in id order."""
+        with self._lock:
+            self._reset()
+            for row in positions:
+                self.upsert(*row)
+            self.built_at = time.monotonic()
+
+    def upsert(self, position_id, position_json, values, deadline=None):
+        with self._lock:
+            slot = self.slots.get(position_id)
+            if slot is None:
+                slot = len(self.positions)
+                self.slots[position_id] = slot
+                self.positions.append(None)
+                self.values.append(None)
+                self.deadlines.append(None)
+            else:
+                self._clear(slot)
+            bit = 1 << slot
+            for facet in FACETS:
+                self.bitmaps[facet][values[facet]] |= bit
+            self.positions[slot] = position_json
+            self.values[slot] = values
+            self.live |= bit
+            if deadline is not None and values['status'] == 'open':
+                self.deadlines[slot] = deadline
+                heapq.heappush(self.expiring, (deadline, slot))
+
+    def remove(self, position_id):
+        with self._lock:
+            slot = self.slots.pop(position_id, None)
+            if slot is not None:
+                self._clear(slot)
+                self.positions[slot] = None
+                self.values[slot] = None
+
+    def _clear(self, slot):
+        bit = 1 << slot
+        for facet, value in (self.values[slot] or {}).items():
+            self.bitmaps[facet][value] &= ~bit
+            if not self.bitmaps[facet][value]:
+                del self.bitmaps[facet][value]
+        self.live &= ~bit
+        self.deadlines[slot] = None
+
+    def _expire(self, now):
+        """Move open positions whose deadline has passed to closed."""
+        while self.expiring and self.expiring[0][0] <= now:
+            deadline, slot = heapq.heappop(self.expiring)
+            if self.deadlines[slot] != deadline:
+                continue  # rewritten or removed since
+            bit = 1 << slot
+            status = self.bitmaps['status']
+            status['open'] &= ~bit
+            if not status['open']:
+                del status['open']
+            status['closed'] |= bit
+            self.values[slot] = {**self.values[slot], 'status': 'closed'}
+            self.deadlines[slot] = None
+
+    def search(self, filters=None, limit=20, offset=0, now=None):
+        """
+        Positions matching every filtered facet (any of its values) and the
+        count of each facet value among positions matching the other facets,
+        as of now (naive UTC). Returns (total, positions, counts).
+        """
+        filters = {facet: set(values) for facet, values in (filters or {}).items() if values}
+        with self._lock:
+            self._expire(now or utcnow())
+            masks = {}
+            for facet, values in filters.items():
+                mask = 0
+                for value in values:
+                    mask |= self.bitmaps[facet].get(value, 0)
+                masks[facet] = mask
+
+            matches = self.live
+            for mask in masks.values():
+                matches &= mask
+
+            counts = {}
+            for facet in FACETS:
+                others = self.live
+                for other, mask in masks.items():
+                    if other != facet:
+                        others &= mask
+                counts[facet] = {
+                    value: count for value, bitmap in self.bitmaps[facet].items()
+                    if (count := (bitmap & others).bit_count())
+                }
+            return matches.bit_count(), self._page(matches, limit, offset), counts
+
+    def _page(self, bits, limit, offset):
+        if offset:
+            if offset >= bits.bit_count():
+                return []
+            # The lowest slot with offset matches below it, bisected by
+            # popcounts rather than dropping bits one at a time
+            start, end = 0, bits.bit_length()
+            while start < end:
+                middle = (start + end) // 2
+                if (bits & ((1 << middle) - 1)).bit_count() < offset:
+                    start = middle + 1
+                else:
+                    end = middle
+            bits = bits >> start << start
+        page = []
+        while bits and len(page) < limit:
+            low = bits & -bits
+            page.append(self.positions[low.bit_length() - 1])
+            bits ^= low
+        return page
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.max_age
+
+
+def _new_index():
+    return PositionFacetIndex(max_age=current_app.config.get('FACET_INDEX_MAX_AGE', 900))
+
+
+def _get_index():
+    """The app's index, created on first use in each worker process."""
+    index = current_app.extensions.get('position_facets')
+    if index is None:
+        index = _new_index()
+        current_app.extensions['position_facets'] = index
+    return index
+
+
+def _positions(position_ids=None):
+    query = select(Position).order_by(Position.id)
+    if position_ids is not None:
+        query = query.where(Position.id.in_(position_ids))
+    now = utcnow()
+    return [
+        (position.id, position.get_json(), _facet_values(position, now), position.deadline)
+        for position in db.session.scalars(query)
+    ]
+
+
+def build_position_facets():
+    """
+    Build a new index of the positions and swap it in for the app's. The
+    old one keeps serving searches meanwhile; positions written during
+    the build are patched into the new one once it is in place.
+    """
+    old = _get_index()
+    with old._lock:
+        if old.pending is None:
+            old.pending = set()
+    index = _new_index()
+    index.build(_positions())
+    current_app.extensions['position_facets'] = index
+    with old._lock:
+        pending, old.pending = old.pending, None
+    refresh_position_facets(pending)
+    return index
+
+
+def _rebuild_in_background(index):
+    with index._lock:
+        if index.pending is not None:
+            return  # already rebuilding
+        index.pending = set()
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                build_position_facets()
+            except Exception:
+                index.pending = None
+                app.logger.exception('Rebuilding the position facets failed')
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='facets-rebuild', daemon=True).start()
+
+
+def browse_positions(filters=None, limit=20, offset=0):
+    """Filter positions by facets from memory. Returns a dict with total, positions and facet counts."""
+    index = _get_index()
+    if index.built_at is None:
+        index = build_position_facets()
+    elif index.is_stale():
+        # Served from the stale index until the new one is built
+        _rebuild_in_background(index)
+    total, positions, counts = index.search(filters, limit=limit, offset=offset)
+    return {'total': total, 'positions': positions, 'facets': counts}
+
+
+def refresh_position_facets(position_ids):
+    """Move the given positions' bits after writes to them were committed."""
+    index = _get_index()
+    position_ids = set(position_ids)
+    with index._lock:
+        if index.pending is not None:
+            index.pending |= position_ids
+    if index.built_at is None or not position_ids:
+        return
+    rows = _positions(position_ids)
+    for row in rows:
+        index.upsert(*row)
+    for position_id in position_ids - {row[0] for row in rows}:
+        index.remove(position_id)
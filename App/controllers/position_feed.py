@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import io
+import json
+
+from sqlalchemy import func, insert, select, update
+
+from App.models import Application, Position, Employer
+from App.models.application_state import ApplicationStatus
+from App.models.position import PositionStatus
+from App.database import db
+from .recommendation import mark_position_recommendations_stale
+from .position_events import positions_changed
+from .position_deadline import utcnow
+
+__all__ = [
+    'parse_position_feed',
+    'sync_positions',
+]
+
+# Keeps IN lists and executemany batches well under database parameter limits
+SYNC_BATCH_SIZE = 500
+
+
+def _batches(items, size=SYNC_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_position_feed(data, format='json'):
+    """
+    Parse an employer feed into a list of row dicts.
+    JSON feeds are a list of objects (or {"positions": [...]});
+    CSV feeds have a header row with external_id, title, number, description.
+    """
+    if format == 'csv':
+        if isinstance(data, bytes):
+            data = data.decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(data)))
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    if isinstance(data, dict):
+        data = data.get('positions', [])
+    return list(data)
+
+
+def _normalize_row(row):
+    external_id = str(row.get('external_id') or '').strip()
+    title = str(row.get('title') or '').strip()
+    if not external_id or not title:
+        raise ValueError('Each row requires external_id and title')
+    number = row.get('number')
+    number = int(number) if number not in (None, '') else 1
+    description = row.get('description') or None
+    return {
+        'external_id': external_id,
+        'title': title,
+        'number_of_positions': number,
+        'description': description,
+    }
+
+
+def _content_hash(row):
+    content = json.dumps([row['title'], row['number_of_positions'], row['description']], separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _accepted_counts(position_ids):
+    """Accepted applications per position, for the seats already taken."""
+    counts = {}
+    for batch in _batches(position_ids):
+        counts.update(db.session.execute(
+            select(Application.position_id, func.count())
+            .where(Application.position_id.in_(batch), Application.status == ApplicationStatus.ACCEPTED)
+            .group_by(Application.position_id)
+        ).all())
+    return counts
+
+
+def sync_positions(user_id, rows):
+    """
+    Sync an employer's feed-managed positions with the given rows.
+
+    New external IDs are inserted, rows whose content hash changed are
+    updated, and feed positions missing from the rows are closed. Rows
+    whose content is unchanged are left alone, so positions closed since
+    by a filled last seat or a passed deadline stay closed. An updated
+    row's seats are the feed's number less the accepted applications,
+    and it is reopened only if seats remain and its deadline hasn't
+    passed. All writes are batched and committed together; an unchanged
+    feed issues no writes at all.
+    Returns a summary dict, or {'error': ...} on failure.
+    """
+    employer = db.session.get(Employer, user_id)
+    if not employer:
+        return {'error': 'Employer not found'}
+
+    feed = {}
+    try:
+        for row in rows:
+            normalized = _normalize_row(row)
+            normalized['content_hash'] = _content_hash(normalized)
+            feed[normalized['external_id']] = normalized
+    except (ValueError, TypeError, AttributeError) as e:
+        return {'error': f'Invalid feed row: {e}'}
+
+    existing = {
+        external_id: (position_id, content_hash, status, deadline)
+        for position_id, external_id, content_hash, status, deadline in db.session.execute(
+            select(Position.id, Position.external_id, Position.content_hash, Position.status, Position.deadline).where(
+                Position.created_by == employer.id,
+                Position.external_id.isnot(None)
+            )
+        )
+    }
+
+    inserts, updates, unchanged = [], [], 0
+    for external_id, row in feed.items():
+        current = existing.get(external_id)
+        if current is None:
+            inserts.append(dict(
+                row,
+                company_id=employer.company_id,
+                created_by=employer.id,
+                status=PositionStatus.OPEN,
+            ))
+        elif current[1] != row['content_hash']:
+            updates.append(dict(row, id=current[0]))
+        else:
+            unchanged += 1
+    closes = [
+        position_id for external_id, (position_id, _, status, _) in existing.items()
+        if external_id not in feed and status == PositionStatus.OPEN
+    ]
+
+    if updates:
+        accepted = _accepted_counts([row['id'] for row in updates])
+        deadlines = {position_id: deadline for position_id, _, _, deadline in existing.values()}
+        now = utcnow()
+        for row in updates:
+            row['number_of_positions'] = max(row['number_of_positions'] - accepted.get(row['id'], 0), 0)
+            deadline = deadlines[row['id']]
+            expired = deadline is not None and deadline <= now
+            row['status'] = PositionStatus.OPEN if row['number_of_positions'] and not expired else PositionStatus.CLOSED
+
+    summary = {'created': len(inserts), 'updated': len(updates), 'closed': len(closes), 'unchanged': unchanged}
+    if not (inserts or updates or closes):
+        return summary
+
+    try:
+        changed_ids = []
+        for batch in _batches(inserts):
+            changed_ids += db.session.scalars(insert(Position).returning(Position.id), batch).all()
+        for batch in _batches(updates):
+            db.session.execute(update(Position), batch)
+            changed_ids += [row['id'] for row in batch]
+        for batch in _batches(closes):
+            # Without a hash, the row reads as changed if it reappears, and reopens
+            db.session.execute(
+                update(Position)
+                .where(Position.id.in_(batch))
+                .values(status=PositionStatus.CLOSED, content_hash=None)
+                .execution_options(synchronize_session=False)
+            )
+        mark_position_recommendations_stale(changed_ids + closes)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {'error': f'Failed to sync positions: {e}'}
+    positions_changed(changed_ids + closes)
+    return summary
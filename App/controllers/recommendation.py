@@ -0,0 +1,258 @@
+import heapq
+from collections import Counter, defaultdict
+
+from sqlalchemy import DateTime, delete, func, insert, literal, or_, select
+
+from App.models import (
+    Application,
+    Position,
+    PositionRecommendation,
+    RecommendationPositionRefresh,
+    RecommendationRefresh,
+    Student,
+)
+from App.models.application_state import ApplicationStatus
+from App.database import db, dialect_insert
+from .position_deadline import accepting_applications, utcnow
+
+__all__ = [
+    'RECOMMENDATION_TOP_K',
+    'get_recommendations',
+    'refresh_recommendations',
+    'refresh_stale_recommendations',
+    'mark_student_recommendations_stale',
+    'mark_students_recommendations_stale',
+    'mark_position_recommendations_stale',
+]
+
+RECOMMENDATION_TOP_K = 20
+REFRESH_BATCH_SIZE = 200
+
+# Applicants whose outcome signals what a position is looking for
+SIGNAL_STATUSES = (ApplicationStatus.SHORTLISTED, ApplicationStatus.ACCEPTED)
+
+DEGREE_WEIGHT = 0.7
+GPA_WEIGHT = 0.3
+# GPA fit for positions without any signal yet
+NEUTRAL_GPA_FIT = 0.5
+
+
+class _PositionProfile:
+    """Degrees and mean GPA of a position's shortlisted and accepted applicants."""
+
+    def __init__(self):
+        self.degrees = Counter()
+        self.gpa_total = 0.0
+        self.gpa_count = 0
+
+    @property
+    def signals(self):
+        return sum(self.degrees.values())
+
+    def score(self, degree, gpa):
+        signals = self.signals
+        degree_share = self.degrees[degree] / signals if signals and degree else 0.0
+        if self.gpa_count and gpa is not None:
+            mean_gpa = self.gpa_total / self.gpa_count
+            gpa_fit = 1.0 - min(abs(gpa - mean_gpa) / 4.0, 1.0)
+        else:
+            gpa_fit = NEUTRAL_GPA_FIT
+        return DEGREE_WEIGHT * degree_share + GPA_WEIGHT * gpa_fit
+
+    def best_score(self):
+        """Upper bound of score() over every possible student."""
+        signals = self.signals
+        best_share = max(self.degrees.values()) / signals if signals else 0.0
+        return DEGREE_WEIGHT * best_share + GPA_WEIGHT * (1.0 if self.gpa_count else NEUTRAL_GPA_FIT)
+
+
+def _open_position_profiles(position_ids=None):
+    """Profiles of open, unexpired positions (optionally only the given ones)."""
+    open_filter = [accepting_applications()]
+    if position_ids is not None:
+        open_filter.append(Position.id.in_(position_ids))
+
+    profiles = {position_id: _PositionProfile() for position_id in db.session.scalars(select(Position.id).where(*open_filter))}
+    rows = db.session.execute(
+        select(Application.position_id, Student.degree, func.count(), func.sum(Student.gpa), func.count(Student.gpa))
+        .join(Student, Student.id == Application.student_id)
+        .join(Position, Position.id == Application.position_id)
+        .where(Application.status.in_(SIGNAL_STATUSES), *open_filter)
+        .group_by(Application.position_id, Student.degree)
+    )
+    for position_id, degree, count, gpa_total, gpa_count in rows:
+        profile = profiles[position_id]
+        profile.degrees[degree] += count
+        profile.gpa_total += gpa_total or 0.0
+        profile.gpa_count += gpa_count
+    return profiles
+
+
+def refresh_recommendations(student_ids=None, top_k=RECOMMENDATION_TOP_K):
+    """
+    Recompute the top-K recommendations of the given students (all students
+    if None) and commit. Returns the number of students refreshed.
+    """
+    # Queue rows newer than this were added after the data below was read
+    started_at = utcnow()
+    profiles = _open_position_profiles()
+    query = select(Student.id, Student.degree, Student.gpa)
+    if student_ids is not None:
+        query = query.where(Student.id.in_(student_ids))
+    students = db.session.execute(query).all()
+    # Claimed queue rows go even for students that are gone, or the queue never drains
+    drained = delete(RecommendationRefresh).where(RecommendationRefresh.queued_at <= started_at)
+    if student_ids is not None:
+        drained = drained.where(RecommendationRefresh.student_id.in_(student_ids))
+    if not students:
+        db.session.execute(drained)
+        db.session.commit()
+        return 0
+
+    # Students already applied to a position don't need it recommended
+    applied = defaultdict(set)
+    applied_query = select(Application.student_id, Application.position_id)
+    if student_ids is not None:
+        applied_query = applied_query.where(Application.student_id.in_(student_ids))
+    for student_id, position_id in db.session.execute(applied_query):
+        applied[student_id].add(position_id)
+
+    rows = []
+    for student_id, degree, gpa in students:
+        candidates = (
+            (profile.score(degree, gpa), position_id)
+            for position_id, profile in profiles.items()
+            if position_id not in applied[student_id]
+        )
+        for rank, (score, position_id) in enumerate(heapq.nlargest(top_k, candidates), start=1):
+            rows.append({'student_id': student_id, 'rank': rank, 'position_id': position_id, 'score': score})
+
+    ids = [student_id for student_id, _, _ in students]
+    db.session.execute(delete(PositionRecommendation).where(PositionRecommendation.student_id.in_(ids)))
+    db.session.execute(drained)
+    if rows:
+        db.session.execute(insert(PositionRecommendation), rows)
+    db.session.commit()
+    return len(students)
+
+
+def refresh_stale_recommendations(batch_size=REFRESH_BATCH_SIZE):
+    """
+    Queue the students affected by the queued positions, then drain the
+    student queue in batches. Students queued again meanwhile are left for
+    the next run. Returns the number of students refreshed.
+    """
+    started_at = utcnow()
+    _queue_students_of_stale_positions(started_at, batch_size)
+    refreshed = 0
+    while True:
+        student_ids = db.session.scalars(
+            select(RecommendationRefresh.student_id)
+            .where(RecommendationRefresh.queued_at <= started_at)
+            .limit(batch_size)
+        ).all()
+        if not student_ids:
+            return refreshed
+        refreshed += refresh_recommendations(student_ids)
+
+
+def _queue_students_of_stale_positions(started_at, batch_size):
+    """
+    Queue the students whose top-K the queued positions may change:
+    students who hold one of them, and students whose list is short or
+    whose lowest score one of them could now beat. Done once per batch of
+    positions, however many changes queued them.
+    """
+    while True:
+        position_ids = db.session.scalars(
+            select(RecommendationPositionRefresh.position_id)
+            .where(RecommendationPositionRefresh.queued_at <= started_at)
+            .limit(batch_size)
+        ).all()
+        if not position_ids:
+            return
+
+        # Queued as of the start, so this run refreshes them too.
+        # Closed positions, and positions whose profile changed, must leave or move
+        _enqueue(
+            select(PositionRecommendation.student_id)
+            .where(PositionRecommendation.position_id.in_(position_ids))
+            .distinct(),
+            started_at
+        )
+        profiles = _open_position_profiles(position_ids)
+        if profiles:
+            best_score = max(profile.best_score() for profile in profiles.values())
+            _enqueue(
+                select(Student.id)
+                .outerjoin(PositionRecommendation, PositionRecommendation.student_id == Student.id)
+                .group_by(Student.id)
+                .having(or_(
+                    func.count(PositionRecommendation.rank) < RECOMMENDATION_TOP_K,
+                    func.min(PositionRecommendation.score) < best_score
+                )),
+                started_at
+            )
+        db.session.execute(
+            delete(RecommendationPositionRefresh)
+            .where(RecommendationPositionRefresh.position_id.in_(position_ids))
+            .where(RecommendationPositionRefresh.queued_at <= started_at)
+        )
+        db.session.commit()
+
+
+def _enqueue(student_ids_select, queued_at=None):
+    # Queueing a student again moves queued_at forward, past any refresh in progress
+    stmt = dialect_insert(RecommendationRefresh).from_select(
+        ['student_id', 'queued_at'],
+        student_ids_select.add_columns(literal(queued_at or utcnow(), DateTime)),
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['student_id'],
+        set_={'queued_at': stmt.excluded.queued_at},
+        where=RecommendationRefresh.queued_at < stmt.excluded.queued_at,
+    ))
+
+
+def mark_student_recommendations_stale(student_id):
+    """Queue a student for a refresh. Committed with the caller's transaction."""
+    _enqueue(select(literal(student_id)))
+
+
+def mark_students_recommendations_stale(student_ids):
+    """Queue several students at once, e.g. after a bulk import. Committed with the caller's transaction."""
+    _enqueue(select(Student.id).where(Student.id.in_(list(student_ids))))
+
+
+def mark_position_recommendations_stale(position_ids):
+    """
+    Queue positions that opened, closed or had an application outcome
+    change; refresh_stale_recommendations works out which students that
+    affects. Committed with the caller's transaction.
+    """
+    position_ids = sorted(set(position_ids))
+    now = utcnow()
+    for start in range(0, len(position_ids), REFRESH_BATCH_SIZE):
+        stmt = dialect_insert(RecommendationPositionRefresh).values([
+            {'position_id': position_id, 'queued_at': now}
+            for position_id in position_ids[start:start + REFRESH_BATCH_SIZE]
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['position_id'],
+            set_={'queued_at': stmt.excluded.queued_at},
+        ))
+
+
+def get_recommendations(student_id, limit=RECOMMENDATION_TOP_K):
+    """
+    A student's precomputed recommendations as (position, score) pairs,
+    best first, of positions still accepting applications: one past its
+    deadline drops out before the sweeper closes it.
+    """
+    return db.session.execute(
+        select(Position, PositionRecommendation.score)
+        .join(Position, Position.id == PositionRecommendation.position_id)
+        .where(PositionRecommendation.student_id == student_id, accepting_applications())
+        .order_by(PositionRecommendation.rank)
+        .limit(limit)
+    ).all()
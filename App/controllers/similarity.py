@@ -0,0 +1,372 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+
+from App.models import Position
+from App.database import db
+from .position_deadline import accepting_applications
+
+__all__ = [
+    'PositionSimilarityIndex',
+    'build_similarity_index',
+    'get_similar_positions',
+    'refresh_similar_positions',
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Title terms count this many times as much as description terms
+TITLE_WEIGHT = 2
+MAX_NEIGHBORS = 10
+# Rows per block when computing all neighbor lists at build time
+BUILD_BLOCK_SIZE = 256
+# Posting entries expanded at once for a block's rare terms
+BUILD_BLOCK_POSTINGS = 1 << 22
+# Terms found in more than 1/BUILD_DENSE_FRACTION of the positions are
+# multiplied as a dense matrix; their postings would dominate the build
+BUILD_DENSE_FRACTION = 16
+
+
+def _term_counts(title, description):
+    terms = TOKEN_PATTERN.findall((title or '').lower()) * TITLE_WEIGHT
+    terms += TOKEN_PATTERN.findall((description or '').lower())
+    return Counter(terms)
+
+
+class PositionSimilarityIndex:
+    """
+    TF-IDF vectors of open positions' title and description, with each
+    position's nearest neighbors by cosine similarity precomputed.
+
+    Vectors are L2-normalized sparse rows kept in CSR arrays; neighbor
+    lists are fixed-width id/score arrays, so a lookup is an array slice.
+    Positions are patched in place on writes (IDF weights stay those of
+    the last full build; unseen terms get the rarest-term weight) and the
+    whole index is rebuilt, in the background, once it is older than
+    max_age seconds, which also picks up writes made by other workers.
+    """
+
+    def __init__(self, max_neighbors=MAX_NEIGHBORS, max_age=900):
+        self.max_neighbors = max_neighbors
+        self.max_age = max_age
+        self.built_at = None
+        self.pending = None  # ids written while a new index is being built
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.titles = []
+        self.rows = {}  # position id -> row
+        self.vectors = []  # row -> (term indices, weights)
+        self.neighbor_ids = np.zeros((0, self.max_neighbors), dtype=np.int64)
+        self.neighbor_scores = np.zeros((0, self.max_neighbors), dtype=np.float32)
+        self._csr = None
+
+    # Building
+
+    def build(self, positions):
+        """Rebuild from scratch from (id, title, description) rows."""
+        with self._lock:
+            self._reset()
+            counts = [(position_id, title, _term_counts(title, description)) for position_id, title, description in positions]
+            document_frequency = Counter(term for _, _, terms in counts for term in terms)
+            total = len(counts)
+            self.vocabulary = {term: i for i, term in enumerate(document_frequency)}
+            self.idf = np.array(
+                [math.log((1 + total) / (1 + df)) + 1 for df in document_frequency.values()],
+                dtype=np.float32
+            )
+            self.vectors = [self._vectorize(terms) for _, _, terms in counts]
+            self.ids = np.array([position_id for position_id, _, _ in counts], dtype=np.int64)
+            self.titles = [title for _, title, _ in counts]
+            self.rows = {position_id: row for row, (position_id, _, _) in enumerate(counts)}
+            self.neighbor_ids = np.full((total, self.max_neighbors), -1, dtype=np.int64)
+            self.neighbor_scores = np.zeros((total, self.max_neighbors), dtype=np.float32)
+
+            self._build_neighbors()
+            self.built_at = time.monotonic()
+
+    def _vectorize(self, terms):
+        rare = math.log(1 + len(self.ids) + 1) + 1
+        for term in terms:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+                self.idf = np.append(self.idf, np.float32(rare))
+        indices = np.fromiter((self.vocabulary[term] for term in terms), dtype=np.int32, count=len(terms))
+        weights = np.fromiter(terms.values(), dtype=np.float32, count=len(terms)) * self.idf[indices]
+        norm = np.linalg.norm(weights)
+        return indices, (weights / norm if norm else weights)
+
+    def _append(self, position_id, title, vector):
+        self.rows[position_id] = len(self.ids)
+        self.ids = np.append(self.ids, position_id)
+        self.titles.append(title)
+        self.vectors.append(vector)
+        self.neighbor_ids = np.vstack([self.neighbor_ids, np.full((1, self.max_neighbors), -1, dtype=np.int64)])
+        self.neighbor_scores = np.vstack([self.neighbor_scores, np.zeros((1, self.max_neighbors), dtype=np.float32)])
+        self._csr = None
+
+    def _matrix(self):
+        """All vectors as CSR arrays (indptr, indices, weights), cached until the next write."""
+        if self._csr is None:
+            lengths = [len(indices) for indices, _ in self.vectors]
+            indptr = np.zeros(len(self.vectors) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            indices = np.concatenate([v[0] for v in self.vectors]) if self.vectors else np.zeros(0, dtype=np.int32)
+            weights = np.concatenate([v[1] for v in self.vectors]) if self.vectors else np.zeros(0, dtype=np.float32)
+            self._csr = (indptr, indices, weights)
+        return self._csr
+
+    def _build_neighbors(self):
+        """
+        Every row's neighbors from the products of all pairs of vectors, a
+        block of rows at a time. Common terms are few, so their columns are
+        multiplied as a dense matrix; every other term adds its weight to
+        the rows listed in its postings, which are short. Either way the
+        work stays close to the number of nonzero products.
+        """
+        indptr, indices, weights = self._matrix()
+        total = len(self.ids)
+        if not total:
+            return
+        rows = np.repeat(np.arange(total), np.diff(indptr))
+        df = np.bincount(indices, minlength=len(self.idf))
+
+        common = np.flatnonzero(df > total // BUILD_DENSE_FRACTION)
+        column = np.full(len(self.idf), -1, dtype=np.int64)
+        column[common] = np.arange(len(common))
+        is_common = column[indices] >= 0
+        dense = np.zeros((total, len(common)), dtype=np.float32)
+        dense[rows[is_common], column[indices[is_common]]] = weights[is_common]
+
+        rare = ~is_common
+        rare_rows, rare_terms, rare_weights = rows[rare], indices[rare], weights[rare]
+        rare_indptr = np.zeros(total + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rare_rows, minlength=total), out=rare_indptr[1:])
+        order = np.argsort(rare_terms, kind='stable')
+        posting_rows, posting_weights = rare_rows[order], rare_weights[order]
+        term_ptr = np.zeros(len(self.idf) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rare_terms, minlength=len(self.idf)), out=term_ptr[1:])
+        # Postings each row's rare terms expand to, cumulative over rows
+        expanded = np.zeros(total + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rare_rows, weights=df[rare_terms], minlength=total).astype(np.int64), out=expanded[1:])
+
+        start = 0
+        while start < total:
+            end = int(np.searchsorted(expanded, expanded[start] + BUILD_BLOCK_POSTINGS, side='right')) - 1
+            end = max(start + 1, min(end, start + BUILD_BLOCK_SIZE))
+            scores = dense[start:end] @ dense.T
+
+            entries = slice(rare_indptr[start], rare_indptr[end])
+            terms = rare_terms[entries]
+            counts = df[terms]
+            if counts.size:
+                ends = np.cumsum(counts)
+                # Position in the postings of every (entry, posting) pair
+                postings = np.repeat(term_ptr[terms] - ends + counts, counts) + np.arange(ends[-1])
+                local = np.repeat(rare_rows[entries] - start, counts)
+                scores += np.bincount(
+                    local * total + posting_rows[postings],
+                    weights=np.repeat(rare_weights[entries], counts) * posting_weights[postings],
+                    minlength=(end - start) * total,
+                ).reshape(end - start, total).astype(np.float32)
+
+            for offset, row in enumerate(range(start, end)):
+                self._set_neighbors(row, scores[offset])
+            start = end
+
+    def _multiply(self, csr, dense):
+        """CSR matrix (rows x terms) times dense (terms x k) -> rows x k."""
+        indptr, indices, weights = csr
+        if dense.shape[0] < len(self.idf):
+            dense = np.vstack([dense, np.zeros((len(self.idf) - dense.shape[0], dense.shape[1]), dtype=np.float32)])
+        products = dense[indices] * weights[:, None]
+        sums = np.zeros((len(indptr) - 1, dense.shape[1]), dtype=np.float32)
+        nonempty = indptr[:-1] < indptr[1:]
+        if products.size:
+            sums[nonempty] = np.add.reduceat(products, indptr[:-1][nonempty], axis=0)
+        return sums
+
+    def _similarities(self, row):
+        indices, weights = self.vectors[row]
+        dense = np.zeros((len(self.idf), 1), dtype=np.float32)
+        dense[indices, 0] = weights
+        return self._multiply(self._matrix(), dense)[:, 0]
+
+    def _set_neighbors(self, row, scores):
+        scores = scores.copy()
+        scores[row] = -1  # never its own neighbor
+        count = min(self.max_neighbors, len(scores) - 1)
+        self.neighbor_ids[row] = -1
+        self.neighbor_scores[row] = 0
+        if count <= 0:
+            return
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        best = best[scores[best] > 0]
+        self.neighbor_ids[row, :len(best)] = self.ids[best]
+        self.neighbor_scores[row, :len(best)] = scores[best]
+
+    # Incremental updates
+
+    def upsert(self, position_id, title, description):
+        """Add or re-vectorize one position and patch the affected neighbor lists."""
+        with self._lock:
+            vector = self._vectorize(_term_counts(title, description))
+            row = self.rows.get(position_id)
+            if row is None:
+                self._append(position_id, title, vector)
+                row = self.rows[position_id]
+            else:
+                self.titles[row] = title
+                self.vectors[row] = vector
+                self._csr = None
+            scores = self._similarities(row)
+            self._set_neighbors(row, scores)
+
+            # Rows that held this position may now rank it below an unlisted
+            # position, so they are recomputed; other rows only need it
+            # inserted if it beats their weakest neighbor.
+            held = (self.neighbor_ids == position_id).any(axis=1)
+            weakest = np.where(self.neighbor_ids[:, -1] < 0, 0, self.neighbor_scores[:, -1])
+            for other in np.flatnonzero(held):
+                if other != row:
+                    self._set_neighbors(other, self._similarities(other))
+            for other in np.flatnonzero(~held & (scores > weakest)):
+                if other != row:
+                    self._insert_neighbor(other, position_id, scores[other])
+
+    def _insert_neighbor(self, row, position_id, score):
+        slot = int(np.searchsorted(-self.neighbor_scores[row], -score, side='right'))
+        filled = int((self.neighbor_ids[row] >= 0).sum())
+        slot = min(slot, filled)
+        self.neighbor_ids[row, slot + 1:] = self.neighbor_ids[row, slot:-1].copy()
+        self.neighbor_scores[row, slot + 1:] = self.neighbor_scores[row, slot:-1].copy()
+        self.neighbor_ids[row, slot] = position_id
+        self.neighbor_scores[row, slot] = score
+
+    def remove(self, position_id):
+        """Drop a position (closed or deleted) and recompute lists that held it."""
+        with self._lock:
+            row = self.rows.pop(position_id, None)
+            if row is None:
+                return
+            keep = np.arange(len(self.ids)) != row
+            self.ids = self.ids[keep]
+            del self.titles[row]
+            del self.vectors[row]
+            self.neighbor_ids = self.neighbor_ids[keep]
+            self.neighbor_scores = self.neighbor_scores[keep]
+            self.rows = {pid: (r if r < row else r - 1) for pid, r in self.rows.items()}
+            self._csr = None
+            for other in np.flatnonzero((self.neighbor_ids == position_id).any(axis=1)):
+                self._set_neighbors(other, self._similarities(other))
+
+    # Lookups
+
+    def similar(self, position_id, limit):
+        """Up to limit (id, title, score) tuples most similar to the position."""
+        row = self.rows.get(position_id)
+        if row is None:
+            return []
+        ids = self.neighbor_ids[row, :limit]
+        scores = self.neighbor_scores[row, :limit]
+        return [
+            (int(pid), self.titles[self.rows[pid]], float(score))
+            for pid, score in zip(ids.tolist(), scores) if pid >= 0
+        ]
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.max_age
+
+
+def _new_index():
+    return PositionSimilarityIndex(max_age=current_app.config.get('SIMILARITY_INDEX_MAX_AGE', 900))
+
+
+def _get_index():
+    """The app's index, created on first use in each worker process."""
+    index = current_app.extensions.get('position_similarity')
+    if index is None:
+        index = _new_index()
+        current_app.extensions['position_similarity'] = index
+    return index
+
+
+def _open_positions(position_ids=None):
+    query = select(Position.id, Position.title, Position.description).where(accepting_applications())
+    if position_ids is not None:
+        query = query.where(Position.id.in_(position_ids))
+    return db.session.execute(query).all()
+
+
+def build_similarity_index():
+    """
+    Build a new index of the open positions and swap it in for the app's.
+    The old one keeps serving lookups meanwhile; positions written during
+    the build are patched into the new one once it is in place.
+    """
+    old = _get_index()
+    if old.pending is None:
+        old.pending = set()
+    index = _new_index()
+    index.build(_open_positions())
+    current_app.extensions['position_similarity'] = index
+    pending, old.pending = old.pending, None
+    refresh_similar_positions(pending)
+    return index
+
+
+def _rebuild_in_background(index):
+    if index.pending is not None:
+        return  # already rebuilding
+    index.pending = set()
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                build_similarity_index()
+            except Exception:
+                index.pending = None
+                app.logger.exception('Rebuilding the position similarity index failed')
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='similarity-rebuild', daemon=True).start()
+
+
+def get_similar_positions(position_id, limit=5):
+    index = _get_index()
+    if index.built_at is None:
+        index = build_similarity_index()
+    elif index.is_stale():
+        # Served from the stale index until the new one is built
+        _rebuild_in_background(index)
+    return [
+        {'id': pid, 'title': title, 'score': round(score, 4)}
+        for pid, title, score in index.similar(position_id, min(limit, index.max_neighbors))
+    ]
+
+
+def refresh_similar_positions(position_ids):
+    """Patch the index after the given positions were written and committed."""
+    index = _get_index()
+    position_ids = set(position_ids)
+    if index.pending is not None:
+        index.pending |= position_ids
+    if index.built_at is None or not position_ids:
+        return
+    open_positions = _open_positions(position_ids)
+    for position_id, title, description in open_positions:
+        index.upsert(position_id, title, description)
+    for position_id in position_ids - {row.id for row in open_positions}:
+        index.remove(position_id)
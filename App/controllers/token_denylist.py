@@ -0,0 +1,191 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from App.models import RevokedToken
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+
+__all__ = [
+    'BloomFilter',
+    'TokenDenylist',
+    'revoke_token',
+    'is_token_revoked',
+    'sync_token_denylist',
+]
+
+# Revoked tokens are grouped by expiry so a whole bucket drops at once
+DENYLIST_BUCKET_SECONDS = 300
+# How stale a worker's copy of other workers' revocations may get
+DENYLIST_SYNC_SECONDS = 10
+# Each sync rereads revocations this far behind the newest it has seen,
+# covering transactions that committed late and clock skew between hosts
+DENYLIST_SYNC_OVERLAP = timedelta(seconds=30)
+DENYLIST_CAPACITY = 10000
+BLOOM_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """
+    A bit array that answers "certainly absent" or "maybe present" for
+    strings, with about error_rate false positives while it holds at most
+    capacity of them.
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest,
+        # lazily so a lookup stops at the first clear bit
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenDenylist:
+    """
+    A worker's in-memory copy of the revoked token ids: exact sets per
+    expiry bucket, fronted by a Bloom filter so the common case, a token
+    that was never revoked, is answered without touching them. Buckets
+    whose tokens have all expired are dropped and the filter rebuilt from
+    what is left; it is also rebuilt larger when it fills up.
+    """
+
+    def __init__(self, bucket_seconds=DENYLIST_BUCKET_SECONDS, capacity=DENYLIST_CAPACITY):
+        self.bucket_seconds = bucket_seconds
+        self.min_capacity = capacity
+        self._buckets = {}  # expiry bucket (None: never expires) -> set of jti
+        self._count = 0
+        self._bloom = BloomFilter(capacity)
+        self._lock = threading.Lock()
+        self.watermark = None  # newest revoked_at synced
+        self.synced_at = None
+
+    def _bucket(self, expires):
+        return None if expires is None else int(expires // self.bucket_seconds)
+
+    def add(self, jti, expires):
+        """Deny a token id until its expiry (a Unix time, or None)."""
+        with self._lock:
+            jtis = self._buckets.setdefault(self._bucket(expires), set())
+            if jti in jtis:
+                return
+            jtis.add(jti)
+            self._count += 1
+            if self._count > self._bloom.capacity:
+                self._rebuild()
+            else:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti, expires):
+        if jti not in self._bloom:
+            return False
+        return jti in self._buckets.get(self._bucket(expires), ())
+
+    def drop_expired(self, now):
+        with self._lock:
+            expired = [
+                bucket for bucket in self._buckets
+                if bucket is not None and (bucket + 1) * self.bucket_seconds <= now
+            ]
+            if not expired:
+                return
+            for bucket in expired:
+                self._count -= len(self._buckets.pop(bucket))
+            self._rebuild()
+
+    def _rebuild(self):
+        bloom = BloomFilter(max(self.min_capacity, self._count * 2))
+        for jtis in self._buckets.values():
+            for jti in jtis:
+                bloom.add(jti)
+        self._bloom = bloom
+
+    def __len__(self):
+        return self._count
+
+
+def _epoch(expires_at):
+    return None if expires_at is None else expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _get_denylist():
+    denylist = current_app.extensions.get('token_denylist')
+    if denylist is None:
+        denylist = TokenDenylist(
+            bucket_seconds=current_app.config.get('DENYLIST_BUCKET_SECONDS', DENYLIST_BUCKET_SECONDS),
+            capacity=current_app.config.get('DENYLIST_CAPACITY', DENYLIST_CAPACITY),
+        )
+        current_app.extensions['token_denylist'] = denylist
+    return denylist
+
+
+def sync_token_denylist(denylist=None):
+    """
+    Add the revocations recorded since the denylist's last sync (all of
+    them the first time), then drop its expired buckets. Returns the number
+    of rows read.
+    """
+    if denylist is None:
+        denylist = _get_denylist()
+    query = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+    if denylist.watermark is not None:
+        query = query.where(RevokedToken.revoked_at >= denylist.watermark - DENYLIST_SYNC_OVERLAP)
+    rows = db.session.execute(query).all()
+    for jti, expires_at, revoked_at in rows:
+        denylist.add(jti, _epoch(expires_at))
+        if denylist.watermark is None or revoked_at > denylist.watermark:
+            denylist.watermark = revoked_at
+    denylist.drop_expired(time.time())
+    denylist.synced_at = time.monotonic()
+    return len(rows)
+
+
+def is_token_revoked(jwt_data):
+    """
+    Whether a decoded token was revoked: an in-memory check, syncing with
+    other workers' revocations at most every DENYLIST_SYNC_SECONDS.
+    """
+    denylist = _get_denylist()
+    interval = current_app.config.get('DENYLIST_SYNC_SECONDS', DENYLIST_SYNC_SECONDS)
+    if denylist.synced_at is None or time.monotonic() - denylist.synced_at >= interval:
+        sync_token_denylist(denylist)
+    return denylist.is_revoked(jwt_data['jti'], jwt_data.get('exp'))
+
+
+def revoke_token(jwt_data):
+    """
+    Revoke a decoded token until it expires: at once in this worker, and in
+    the others at their next sync. Also purges rows of tokens that have
+    expired since, which no check can match any more.
+    """
+    expires = jwt_data.get('exp')
+    expires_at = None if expires is None else datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None)
+    now = utcnow()
+    db.session.execute(
+        dialect_insert(RevokedToken)
+        .values(jti=jwt_data['jti'], expires_at=expires_at, revoked_at=now)
+        .on_conflict_do_nothing(index_elements=['jti'])
+    )
+    db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+    db.session.commit()
+    _get_denylist().add(jwt_data['jti'], expires)
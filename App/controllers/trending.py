@@ -0,0 +1,229 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from App.models import Position, PositionActivity
+from App.database import db, dialect_insert
+from .position_deadline import accepting_applications, utcnow
+
+__all__ = [
+    'PositionActivityTracker',
+    'record_position_view',
+    'record_position_application',
+    'flush_position_activity',
+    'get_trending_positions',
+]
+
+EPOCH = datetime(1970, 1, 1)
+# An application says more about interest than a page view
+APPLICATION_WEIGHT = 10
+TRENDING_SIZE = 50
+
+
+class PositionActivityTracker:
+    """
+    Per-worker write-behind counters of position views and applications.
+
+    Events only bump in-memory counters keyed by (position, bucket); they
+    are written once per flush_interval, by a background thread or the
+    first event or read after it, as one batched upsert that adds to the
+    stored bucket, so a crashed worker loses at most one interval of its
+    own events. Trending is the sum of the buckets inside
+    a sliding window, recomputed at each flush and kept as a top-`size`
+    list so the endpoint reads memory only.
+    """
+
+    def __init__(self, flush_interval=30, window=86400, bucket_seconds=300, size=TRENDING_SIZE):
+        self.flush_interval = flush_interval
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.flushed_at = time.monotonic()
+        self.ranked_at = None
+        self.trending = []
+        self._views = Counter()
+        self._applications = Counter()
+        self._lock = threading.Lock()
+
+    def bucket_of(self, moment):
+        seconds = int((moment - EPOCH).total_seconds())
+        return EPOCH + timedelta(seconds=seconds - seconds % self.bucket_seconds)
+
+    def window_start(self, now):
+        return self.bucket_of(now - timedelta(seconds=self.window))
+
+    def record(self, position_id, views=0, applications=0, now=None):
+        key = (position_id, self.bucket_of(now or utcnow()))
+        with self._lock:
+            if views:
+                self._views[key] += views
+            if applications:
+                self._applications[key] += applications
+
+    def due(self):
+        return time.monotonic() - self.flushed_at >= self.flush_interval
+
+    def take_pending(self):
+        """Swap out the pending counters and return them as upsert rows."""
+        with self._lock:
+            views, applications = self._views, self._applications
+            self._views, self._applications = Counter(), Counter()
+            self.flushed_at = time.monotonic()
+        return [
+            {'position_id': key[0], 'bucket': key[1], 'views': views[key], 'applications': applications[key]}
+            for key in views.keys() | applications.keys()
+        ]
+
+    def restore(self, rows):
+        """Put back rows whose flush failed so the next flush retries them."""
+        with self._lock:
+            for row in rows:
+                key = (row['position_id'], row['bucket'])
+                self._views[key] += row['views']
+                self._applications[key] += row['applications']
+
+    def rank(self, rows):
+        """Keep the top positions of (id, title, company_id, views, applications) window totals."""
+        hours = self.window / 3600
+        best = heapq.nlargest(
+            self.size, rows,
+            key=lambda row: (row.views + APPLICATION_WEIGHT * row.applications, -row.id)
+        )
+        self.trending = [{
+            'id': row.id,
+            'title': row.title,
+            'company_id': row.company_id,
+            'views': int(row.views),
+            'applications': int(row.applications),
+            'applications_per_hour': round(row.applications / hours, 4) if hours else 0.0,
+            'score': int(row.views + APPLICATION_WEIGHT * row.applications),
+        } for row in best]
+        self.ranked_at = time.monotonic()
+
+    def ranking_is_stale(self):
+        return self.ranked_at is None or time.monotonic() - self.ranked_at >= self.flush_interval
+
+
+def _get_tracker():
+    """The app's tracker, created on first use in each worker process."""
+    tracker = current_app.extensions.get('position_activity')
+    if tracker is None:
+        tracker = PositionActivityTracker(
+            flush_interval=current_app.config.get('TRENDING_FLUSH_INTERVAL', 30),
+            window=current_app.config.get('TRENDING_WINDOW', 86400),
+            bucket_seconds=current_app.config.get('TRENDING_BUCKET_SECONDS', 300),
+        )
+        current_app.extensions['position_activity'] = tracker
+        if current_app.config.get('TRENDING_FLUSH_IN_BACKGROUND', not current_app.testing):
+            _flush_periodically(tracker)
+    return tracker
+
+
+def _flush_periodically(tracker):
+    """
+    Flush every flush_interval on a daemon thread, so quiet workers write
+    their counts too. Stops once the app drops the tracker.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        while True:
+            time.sleep(tracker.flush_interval)
+            if app.extensions.get('position_activity') is not tracker:
+                return
+            with app.app_context():
+                try:
+                    if tracker.due():
+                        flush_position_activity()
+                except Exception:
+                    app.logger.exception('Flushing position activity failed')
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=run, name='trending-flush', daemon=True).start()
+
+
+def _record(position_id, views=0, applications=0):
+    tracker = _get_tracker()
+    tracker.record(position_id, views=views, applications=applications)
+    if tracker.due():
+        flush_position_activity()
+
+
+def record_position_view(position_id):
+    """Count a view in memory; flushed with the worker's next batch."""
+    _record(position_id, views=1)
+
+
+def record_position_application(position_id):
+    """Count an application in memory; flushed with the worker's next batch."""
+    _record(position_id, applications=1)
+
+
+def flush_position_activity():
+    """
+    Write this worker's pending counts as one batched upsert, drop buckets
+    that left the window and re-rank trending positions from the window.
+    Runs on a connection of its own, so a flush from inside a request
+    leaves the request's session alone. Returns the number of bucket rows
+    written.
+    """
+    tracker = _get_tracker()
+    rows = tracker.take_pending()
+    now = utcnow()
+    since = tracker.window_start(now)
+    try:
+        with db.engine.begin() as connection:
+            if rows:
+                # Positions deleted since their events were counted are skipped
+                existing = set(connection.scalars(select(Position.id).where(
+                    Position.id.in_({row['position_id'] for row in rows}), Position.deleted_at.is_(None)
+                )))
+                rows = [row for row in rows if row['position_id'] in existing]
+            if rows:
+                stmt = dialect_insert(PositionActivity)
+                connection.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=['position_id', 'bucket'],
+                        set_={
+                            'views': PositionActivity.views + stmt.excluded.views,
+                            'applications': PositionActivity.applications + stmt.excluded.applications,
+                        }
+                    ),
+                    rows
+                )
+            connection.execute(delete(PositionActivity).where(PositionActivity.bucket < since))
+    except Exception:
+        current_app.logger.exception('Flushing position activity failed; keeping it for the next flush')
+        tracker.restore(rows)
+        return 0
+
+    # Served by ix_position_activity_bucket, then the position primary key.
+    # Core statements skip the soft-delete filter, hence deleted_at here
+    with db.engine.connect() as connection:
+        tracker.rank(connection.execute(
+            select(
+                Position.id,
+                Position.title,
+                Position.company_id,
+                func.sum(PositionActivity.views).label('views'),
+                func.sum(PositionActivity.applications).label('applications'),
+            )
+            .join(Position, Position.id == PositionActivity.position_id)
+            .where(PositionActivity.bucket >= since, accepting_applications(), Position.deleted_at.is_(None))
+            .group_by(Position.id, Position.title, Position.company_id)
+        ).all())
+    return len(rows)
+
+
+def get_trending_positions(limit=10):
+    """Open positions with the most views and applications in the window, from memory."""
+    tracker = _get_tracker()
+    if tracker.ranking_is_stale():
+        flush_position_activity()
+    return tracker.trending[:limit]
@@ -0,0 +1,305 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import select
+
+from App.models import Company, Position
+from App.database import db
+from .position_deadline import accepting_applications
+
+__all__ = [
+    'TypeaheadIndex',
+    'build_typeahead_index',
+    'get_typeahead_matches',
+    'refresh_typeahead_positions',
+    'refresh_typeahead_companies',
+]
+
+WORD_START = re.compile(r"(?:^|(?<=\s))\S")
+# Prefixes matching more entries than this have their matches ranked
+# ahead of time, so no keystroke scans more than about this many
+MAX_SCANNED_ENTRIES = 1000
+# Matches kept per ranked prefix, the most a search returns for one
+RANKED_MATCHES = 25
+
+
+def _normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def _keys(label):
+    """Every suffix of the label starting at a word, so prefixes match any word."""
+    text = _normalize(label)
+    return {text[match.start():] for match in WORD_START.finditer(text)}
+
+
+class TypeaheadIndex:
+    """
+    Prefix index over open position titles and company names.
+
+    Entries are (key, kind, id) tuples in one sorted list, so a prefix is
+    a bisect plus a scan of the entries it matches; matches are ranked by
+    openings (companies by the openings of their open positions). Short
+    prefixes match too many entries to scan per keystroke, so the top
+    matches of every prefix matching more than MAX_SCANNED_ENTRIES are
+    ranked at build time. Writes insert and remove entries in place and
+    drop the rankings they may change, which are redone on their next
+    lookup; the index is rebuilt, in the background, once older than
+    max_age.
+    """
+
+    def __init__(self, max_age=900):
+        self.max_age = max_age
+        self.built_at = None
+        self.pending = None  # (kind, id) written while a new index is being built
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.entries = []
+        self.ranked = {}  # prefix -> top (kind, id) matches, None until reranked
+        self.positions = {}  # id -> (title, openings, company_id)
+        self.companies = {}  # id -> name
+        self.company_openings = Counter()
+
+    def build(self, positions, companies):
+        """Rebuild from (id, title, openings, company_id) and (id, name) rows."""
+        with self._lock:
+            self._reset()
+            entries = []
+            for position_id, title, openings, company_id in positions:
+                self._track_position(position_id, title, openings, company_id)
+                entries += [(key, 'position', position_id) for key in _keys(title)]
+            for company_id, name in companies:
+                self.companies[company_id] = name
+                entries += [(key, 'company', company_id) for key in _keys(name)]
+            entries.sort()
+            self.entries = entries
+            self._rank_long_prefixes()
+            self.built_at = time.monotonic()
+
+    def _range(self, prefix, lo=0, hi=None):
+        """Bounds of the entries whose key starts with prefix."""
+        hi = len(self.entries) if hi is None else hi
+        start = bisect_left(self.entries, (prefix,), lo, hi)
+        # Every key with the prefix sorts before the prefix with its last character bumped
+        end = bisect_left(self.entries, (prefix[:-1] + chr(ord(prefix[-1]) + 1),), start, hi)
+        return start, end
+
+    def _rank_long_prefixes(self):
+        """Rank the prefixes matching more than MAX_SCANNED_ENTRIES entries."""
+        # A prefix matches a subrange of its parent's, so only the children
+        # of prefixes over the bound can be over it themselves
+        stack = [('', 0, len(self.entries))]
+        while stack:
+            prefix, lo, hi = stack.pop()
+            i = lo
+            while i < hi:
+                key = self.entries[i][0]
+                if len(key) <= len(prefix):
+                    i += 1
+                    continue
+                child = key[:len(prefix) + 1]
+                start, end = self._range(child, i, hi)
+                if end - start > MAX_SCANNED_ENTRIES:
+                    self.ranked[child] = self._rank(start, end)
+                    stack.append((child, start, end))
+                i = end
+
+    def _rank(self, start, end, limit=RANKED_MATCHES):
+        matches = {(kind, item_id) for _, kind, item_id in self.entries[start:end]}
+        return heapq.nlargest(limit, matches, key=lambda match: (self._weight(*match), -match[1]))
+
+    def _unrank(self, label):
+        """Drop the rankings of the prefixes a label's keys fall under."""
+        for key in _keys(label):
+            for length in range(1, len(key) + 1):
+                if key[:length] not in self.ranked:
+                    break
+                self.ranked[key[:length]] = None
+
+    def _track_position(self, position_id, title, openings, company_id):
+        self.positions[position_id] = (title, openings or 0, company_id)
+        self.company_openings[company_id] += openings or 0
+        if company_id in self.companies:
+            # The company's weight changed with it
+            self._unrank(self.companies[company_id])
+
+    def _insert(self, kind, item_id, label):
+        for key in _keys(label):
+            insort(self.entries, (key, kind, item_id))
+        self._unrank(label)
+
+    def _delete(self, kind, item_id, label):
+        for key in _keys(label):
+            i = bisect_left(self.entries, (key, kind, item_id))
+            if i < len(self.entries) and self.entries[i] == (key, kind, item_id):
+                del self.entries[i]
+        self._unrank(label)
+
+    def upsert_position(self, position_id, title, openings, company_id):
+        with self._lock:
+            self.remove_position(position_id)
+            self._track_position(position_id, title, openings, company_id)
+            self._insert('position', position_id, title)
+
+    def remove_position(self, position_id):
+        with self._lock:
+            current = self.positions.pop(position_id, None)
+            if current is None:
+                return
+            title, openings, company_id = current
+            self.company_openings[company_id] -= openings
+            self._delete('position', position_id, title)
+            if company_id in self.companies:
+                self._unrank(self.companies[company_id])
+
+    def upsert_company(self, company_id, name):
+        with self._lock:
+            self.remove_company(company_id)
+            self.companies[company_id] = name
+            self._insert('company', company_id, name)
+
+    def remove_company(self, company_id):
+        with self._lock:
+            name = self.companies.pop(company_id, None)
+            if name is not None:
+                self._delete('company', company_id, name)
+
+    def search(self, prefix, limit=10):
+        """Top matches for the prefix as dicts, highest weight first (at most RANKED_MATCHES)."""
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, RANKED_MATCHES)
+        with self._lock:
+            if prefix in self.ranked:
+                best = self.ranked[prefix]
+                if best is None:
+                    best = self.ranked[prefix] = self._rank(*self._range(prefix))
+                best = best[:limit]
+            else:
+                best = self._rank(*self._range(prefix), limit=limit)
+            return [self._describe(kind, item_id) for kind, item_id in best]
+
+    def _weight(self, kind, item_id):
+        if kind == 'position':
+            return self.positions[item_id][1]
+        return self.company_openings[item_id]
+
+    def _describe(self, kind, item_id):
+        label = self.positions[item_id][0] if kind == 'position' else self.companies[item_id]
+        return {'type': kind, 'id': item_id, 'label': label, 'weight': self._weight(kind, item_id)}
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.max_age
+
+
+def _new_index():
+    return TypeaheadIndex(max_age=current_app.config.get('TYPEAHEAD_INDEX_MAX_AGE', 900))
+
+
+def _get_index():
+    """The app's index, created on first use in each worker process."""
+    index = current_app.extensions.get('typeahead')
+    if index is None:
+        index = _new_index()
+        current_app.extensions['typeahead'] = index
+    return index
+
+
+def _open_positions(position_ids=None):
+    query = select(Position.id, Position.title, Position.number_of_positions, Position.company_id).where(accepting_applications())
+    if position_ids is not None:
+        query = query.where(Position.id.in_(position_ids))
+    return db.session.execute(query).all()
+
+
+def _companies(company_ids=None):
+    query = select(Company.id, Company.name)
+    if company_ids is not None:
+        query = query.where(Company.id.in_(company_ids))
+    return db.session.execute(query).all()
+
+
+def build_typeahead_index():
+    """
+    Build a new index of the open positions and companies and swap it in
+    for the app's. The old one keeps serving searches meanwhile; positions
+    and companies written during the build are patched into the new one
+    once it is in place.
+    """
+    old = _get_index()
+    if old.pending is None:
+        old.pending = set()
+    index = _new_index()
+    index.build(_open_positions(), _companies())
+    current_app.extensions['typeahead'] = index
+    pending, old.pending = old.pending, None
+    refresh_typeahead_positions([item_id for kind, item_id in pending if kind == 'position'])
+    refresh_typeahead_companies([item_id for kind, item_id in pending if kind == 'company'])
+    return index
+
+
+def _rebuild_in_background(index):
+    if index.pending is not None:
+        return  # already rebuilding
+    index.pending = set()
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                build_typeahead_index()
+            except Exception:
+                index.pending = None
+                app.logger.exception('Rebuilding the typeahead index failed')
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='typeahead-rebuild', daemon=True).start()
+
+
+def get_typeahead_matches(prefix, limit=10):
+    index = _get_index()
+    if index.built_at is None:
+        index = build_typeahead_index()
+    elif index.is_stale():
+        # Served from the stale index until the new one is built
+        _rebuild_in_background(index)
+    return index.search(prefix, limit)
+
+
+def refresh_typeahead_positions(position_ids):
+    """Patch the index after the given positions were written and committed."""
+    index = _get_index()
+    position_ids = set(position_ids)
+    if index.pending is not None:
+        index.pending |= {('position', position_id) for position_id in position_ids}
+    if index.built_at is None or not position_ids:
+        return
+    open_positions = _open_positions(position_ids)
+    for row in open_positions:
+        index.upsert_position(*row)
+    for position_id in position_ids - {row.id for row in open_positions}:
+        index.remove_position(position_id)
+
+
+def refresh_typeahead_companies(company_ids):
+    """Patch the index after the given companies were written and committed."""
+    index = _get_index()
+    company_ids = set(company_ids)
+    if index.pending is not None:
+        index.pending |= {('company', company_id) for company_id in company_ids}
+    if index.built_at is None or not company_ids:
+        return
+    companies = _companies(company_ids)
+    for company_id, name in companies:
+        index.upsert_company(company_id, name)
+    for company_id in company_ids - {row.id for row in companies}:
+        index.remove_company(company_id)
@@ -1,5 +1,9 @@
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import with_polymorphic
+
 from App.models import User, Student, Employer, Staff
 from App.database import db
+from .recommendation import mark_student_recommendations_stale
 
 def create_user(username, password, user_type, company_id=None, student_data=None):
     """
@@ -30,6 +34,9 @@ def create_user(username, password, user_type, company_id=None, student_data=Non
 
     try:
         db.session.add(newuser)
+        if user_type == "student":
+            db.session.flush()
+            mark_student_recommendations_stale(newuser.id)
         db.session.commit()
         return newuser, None
     except Exception as e:
@@ -40,9 +47,12 @@ def create_user(username, password, user_type, company_id=None, student_data=Non
         return None, f"Failed to create user: {error_msg}"
 
 
+# Built once: each login only binds the username, and the compiled SQL
+# comes from the engine's statement cache
+_USER_BY_USERNAME = select(User).where(User.username == bindparam('username'))
+
 def get_user_by_username(username):
-    result = db.session.execute(db.select(User).filter_by(username=username))
-    return result.scalar_one_or_none()
+    return db.session.execute(_USER_BY_USERNAME, {'username': username}).scalar_one_or_none()
 
 def get_user(id):
     return db.session.get(User, id)
@@ -50,6 +60,24 @@ def get_user(id):
 def get_all_users():
     return db.session.scalars(db.select(User)).all()
 
+USER_PAGE_SIZE = 100
+
+
+def get_users_page(after=0, limit=USER_PAGE_SIZE):
+    """
+    Users with ids above `after`, in id order, and the cursor for the next
+    page (None on the last). One query per page, joining every subclass
+    table so get_json() needs no further loads; the keyset seek keeps deep
+    pages as cheap as the first.
+    """
+    users = with_polymorphic(User, [Student, Employer, Staff])
+    page = db.session.scalars(
+        db.select(users).where(users.id > after).order_by(users.id).limit(limit + 1)
+    ).all()
+    if len(page) > limit:
+        return page[:limit], page[limit - 1].id
+    return page, None
+
 def get_all_users_json():
     users = get_all_users()
     if not users:
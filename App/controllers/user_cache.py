@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from App.models import User
+from App.database import db
+
+__all__ = [
+    'UserCache',
+    'get_cached_user',
+    'invalidate_cached_users',
+]
+
+USER_CACHE_SIZE = 1024
+# Bounds how long another worker's change to a user goes unseen here
+USER_CACHE_TTL = 60
+
+
+class UserCache:
+    """
+    Per-worker LRU of detached user snapshots (column values only), each
+    kept for at most ttl seconds. Snapshots are never attached to a
+    session themselves; requests get a merged copy of one.
+    """
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # user id -> (expires, snapshot)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, snapshot):
+        with self._lock:
+            self._entries[user_id] = (self.clock() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _get_cache():
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = UserCache(
+            maxsize=current_app.config.get('USER_CACHE_SIZE', USER_CACHE_SIZE),
+            ttl=current_app.config.get('USER_CACHE_TTL', USER_CACHE_TTL),
+        )
+        current_app.extensions['user_cache'] = cache
+    return cache
+
+
+def _snapshot(user):
+    """A detached copy of the user's columns, subclass ones included."""
+    mapper = inspect(user).mapper
+    snapshot = mapper.class_manager.new_instance()
+    for prop in mapper.column_attrs:
+        set_committed_value(snapshot, prop.key, getattr(user, prop.key))
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def get_cached_user(user_id):
+    """
+    The user with this id, as its subclass, or None. Served without a query
+    from the session if it already holds the user, else from the worker's
+    cache; only a miss loads it (the user and subclass rows).
+    """
+    session = db.session
+    user = session.identity_map.get(inspect(User).identity_key_from_primary_key([user_id]))
+    if user is not None:
+        return user
+    if not current_app.config.get('USER_CACHE_TTL', USER_CACHE_TTL):
+        return session.get(User, user_id)
+    cache = _get_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is not None:
+        # Attaches a copy holding the cached values, without loading
+        return session.merge(snapshot, load=False)
+    user = session.get(User, user_id)
+    if user is not None:
+        cache.put(user_id, _snapshot(user))
+    return user
+
+
+def invalidate_cached_users(*user_ids):
+    """Drop users from this worker's cache, e.g. after changing them with bulk statements."""
+    if has_app_context():
+        cache = current_app.extensions.get('user_cache')
+        if cache is not None:
+            cache.invalidate(user_ids)
+
+
+@event.listens_for(User, 'after_update', propagate=True)
+@event.listens_for(User, 'after_delete', propagate=True)
+def _user_changed(mapper, connection, target):
+    invalidate_cached_users(target.id)
+    # Again once committed, in case a concurrent request cached the old row meanwhile
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        invalidate_cached_users(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('changed_users', None)
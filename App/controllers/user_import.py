@@ -0,0 +1,150 @@
+import csv
+from datetime import date
+from itertools import islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from App.models import Company, Employer, Staff, Student, User
+from App.database import db
+from App.passwords import bulk_password_hasher
+from .recommendation import mark_students_recommendations_stale
+
+__all__ = [
+    'parse_user_import',
+    'import_users',
+]
+
+# Rows hashed, inserted and committed together
+IMPORT_BATCH_SIZE = 1000
+
+USER_TYPES = {'student': Student, 'employer': Employer, 'staff': Staff}
+STUDENT_FIELDS = ('email', 'dob', 'gender', 'degree', 'phone', 'gpa', 'resume')
+
+
+def parse_user_import(lines):
+    """
+    Rows of a user CSV (an open file or any iterable of lines), read lazily.
+    The header has username, password and type, plus company_id for
+    employers and staff and optionally the student profile columns.
+    """
+    return csv.DictReader(lines)
+
+
+def _normalize_row(row):
+    username = (row.get('username') or '').strip()
+    password = row.get('password') or ''
+    user_type = (row.get('type') or '').strip().lower()
+    if not username or not password:
+        raise ValueError('username and password are required')
+    if len(username) > User.username.type.length:
+        raise ValueError(f'username is longer than {User.username.type.length} characters')
+    if user_type not in USER_TYPES:
+        raise ValueError(f"type must be one of {', '.join(USER_TYPES)}")
+    values = {'username': username, 'role': user_type}
+    if user_type == 'student':
+        for field in STUDENT_FIELDS:
+            values[field] = (row.get(field) or '').strip() or None
+        if values['dob'] is not None:
+            values['dob'] = date.fromisoformat(values['dob'])
+        if values['gpa'] is not None:
+            values['gpa'] = float(values['gpa'])
+    else:
+        company_id = (row.get('company_id') or '').strip()
+        if not company_id:
+            raise ValueError(f'company_id is required for {user_type}')
+        values['company_id'] = int(company_id)
+    return USER_TYPES[user_type], values, password
+
+
+def _existing_usernames(usernames):
+    return set(db.session.scalars(select(User.username).where(User.username.in_(usernames))))
+
+
+def _insert(rows):
+    """
+    Insert (model, values) rows, a multi-row INSERT per table: the user
+    rows, then their subclass rows under the ids they were given.
+    """
+    student_ids = []
+    for model in USER_TYPES.values():
+        values = [row_values for row_model, row_values in rows if row_model is model]
+        if not values:
+            continue
+        ids = db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), values).all()
+        if model is Student:
+            student_ids += ids
+    if student_ids:
+        mark_students_recommendations_stale(student_ids)
+    db.session.commit()
+
+
+def _import_batch(batch, seen, hash_many, report):
+    pending = []
+    for line, row in batch:
+        try:
+            model, values, password = _normalize_row(row)
+        except ValueError as e:
+            report['invalid'].append({'line': line, 'error': str(e)})
+            continue
+        if values['username'] in seen:
+            report['duplicates'].append(values['username'])
+            continue
+        seen.add(values['username'])
+        pending.append((line, model, values, password))
+    if not pending:
+        return
+
+    existing = _existing_usernames([values['username'] for _, _, values, _ in pending])
+    company_ids = {values['company_id'] for _, _, values, _ in pending if 'company_id' in values}
+    companies = set(db.session.scalars(select(Company.id).where(Company.id.in_(company_ids)))) if company_ids else set()
+    rows, passwords = [], []
+    for line, model, values, password in pending:
+        if values['username'] in existing:
+            report['duplicates'].append(values['username'])
+        elif 'company_id' in values and values['company_id'] not in companies:
+            report['invalid'].append({'line': line, 'error': f"company {values['company_id']} does not exist"})
+        else:
+            rows.append((line, model, values))
+            passwords.append(password)
+    # Only rows that will be inserted are hashed, the bulk of the work
+    for (_, _, values), password_hash in zip(rows, hash_many(passwords)):
+        values['password'] = password_hash
+
+    try:
+        _insert([(model, values) for _, model, values in rows])
+    except IntegrityError:
+        # Someone took one of the usernames since the check; skip them and retry once
+        db.session.rollback()
+        existing = _existing_usernames([values['username'] for _, _, values in rows])
+        report['duplicates'] += [values['username'] for _, _, values in rows if values['username'] in existing]
+        rows = [row for row in rows if row[2]['username'] not in existing]
+        try:
+            _insert([(model, values) for _, model, values in rows])
+        except IntegrityError as e:
+            # Still conflicting (a company deleted meanwhile, say): report
+            # the batch's rows and go on with the next batch
+            db.session.rollback()
+            report['invalid'] += [{'line': line, 'error': f"not imported: {e.orig}"} for line, _, _ in rows]
+            return
+    report['created'] += len(rows)
+
+
+def import_users(rows, batch_size=IMPORT_BATCH_SIZE, workers=None):
+    """
+    Create students, employers and staff from parsed CSV rows, batch_size
+    at a time: passwords are hashed across a process pool (workers
+    processes, one per core by default), then each batch is inserted with
+    one multi-row INSERT per table and committed. Usernames that are taken,
+    or repeated in the file, are skipped and reported, as are invalid rows.
+    Returns {'created': n, 'duplicates': [username], 'invalid': [{'line', 'error'}]}.
+    """
+    report = {'created': 0, 'duplicates': [], 'invalid': []}
+    seen = set()
+    # Line numbers as in the file, after the header
+    numbered = enumerate(rows, start=2)
+    with bulk_password_hasher(workers) as hash_many:
+        while batch := list(islice(numbered, batch_size)):
+            _import_batch(batch, seen, hash_many, report)
+    report['invalid'].sort(key=lambda row: row['line'])
+    return report
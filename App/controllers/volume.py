@@ -0,0 +1,137 @@
+from collections import Counter
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+
+from App.models import Application, ApplicationVolume
+from App.database import db, dialect_insert
+from .position_deadline import utcnow
+
+__all__ = [
+    'VOLUME_GRANULARITIES',
+    'record_application_volume',
+    'get_application_volume',
+    'compact_application_volume',
+    'backfill_application_volume',
+]
+
+VOLUME_GRANULARITIES = ('hour', 'day')
+# Hour buckets older than this are compacted into day buckets
+HOURLY_RETENTION_DAYS = 14
+VOLUME_BATCH_SIZE = 1000
+
+
+def _truncate(moment, granularity):
+    if granularity == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _retention_cutoff(now=None):
+    """Start of the oldest day whose hour buckets are kept."""
+    days = current_app.config.get('VOLUME_HOURLY_RETENTION_DAYS', HOURLY_RETENTION_DAYS)
+    return _truncate((now or utcnow()) - timedelta(days=days), 'day')
+
+
+def _add(rows):
+    """Add counts to (position_id, granularity, bucket) rows, creating missing ones."""
+    stmt = dialect_insert(ApplicationVolume)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['position_id', 'granularity', 'bucket'],
+            set_={'count': ApplicationVolume.count + stmt.excluded.count}
+        ),
+        rows
+    )
+
+
+def record_application_volume(application):
+    """Count a new application in its hour bucket. Committed with the caller's transaction."""
+    created_at = application.created_at or utcnow()
+    _add([{'position_id': application.position_id, 'granularity': 'hour', 'bucket': _truncate(created_at, 'hour'), 'count': 1}])
+
+
+def get_application_volume(position_id, granularity='hour', start=None, end=None):
+    """
+    A position's application counts as [(bucket start, count)], oldest
+    first. Hours older than the retention are only available per day;
+    day series include the recent hour buckets rolled up.
+    """
+    query = select(ApplicationVolume.granularity, ApplicationVolume.bucket, ApplicationVolume.count).where(
+        ApplicationVolume.position_id == position_id
+    )
+    if granularity == 'hour':
+        query = query.where(ApplicationVolume.granularity == 'hour')
+    if start is not None:
+        query = query.where(ApplicationVolume.bucket >= _truncate(start, granularity))
+    if end is not None:
+        query = query.where(ApplicationVolume.bucket <= end)
+
+    series = Counter()
+    for _, bucket, count in db.session.execute(query):
+        series[_truncate(bucket, granularity)] += count
+    return sorted(series.items())
+
+
+def compact_application_volume(now=None, batch_size=VOLUME_BATCH_SIZE):
+    """
+    Fold hour buckets older than the retention into day buckets and
+    delete them, in one transaction. Returns the hour buckets compacted.
+    """
+    cutoff = _retention_cutoff(now)
+    days = Counter()
+    # Served by ix_application_volume_granularity_bucket
+    rows = db.session.execute(
+        select(ApplicationVolume.position_id, ApplicationVolume.bucket, ApplicationVolume.count)
+        .where(ApplicationVolume.granularity == 'hour', ApplicationVolume.bucket < cutoff)
+        .execution_options(yield_per=batch_size)
+    )
+    compacted = 0
+    for position_id, bucket, count in rows:
+        days[(position_id, _truncate(bucket, 'day'))] += count
+        compacted += 1
+    if not compacted:
+        return 0
+
+    day_rows = [
+        {'position_id': position_id, 'granularity': 'day', 'bucket': day, 'count': count}
+        for (position_id, day), count in days.items()
+    ]
+    for start in range(0, len(day_rows), batch_size):
+        _add(day_rows[start:start + batch_size])
+    db.session.execute(
+        delete(ApplicationVolume)
+        .where(ApplicationVolume.granularity == 'hour', ApplicationVolume.bucket < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return compacted
+
+
+def backfill_application_volume(now=None, batch_size=VOLUME_BATCH_SIZE):
+    """
+    Rebuild every bucket from application created_at values in one
+    streaming pass: hour buckets within the retention, day buckets before
+    it. Returns the number of buckets written.
+    """
+    cutoff = _retention_cutoff(now)
+    buckets = Counter()
+    rows = db.session.execute(
+        select(Application.position_id, Application.created_at)
+        .where(Application.created_at.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for position_id, created_at in rows:
+        granularity = 'hour' if created_at >= cutoff else 'day'
+        buckets[(position_id, granularity, _truncate(created_at, granularity))] += 1
+
+    db.session.execute(delete(ApplicationVolume))
+    volume_rows = [
+        {'position_id': position_id, 'granularity': granularity, 'bucket': bucket, 'count': count}
+        for (position_id, granularity, bucket), count in buckets.items()
+    ]
+    for start in range(0, len(volume_rows), batch_size):
+        db.session.execute(insert(ApplicationVolume), volume_rows[start:start + batch_size])
+    db.session.commit()
+    return len(volume_rows)
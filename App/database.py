@@ -1,14 +1,51 @@
+import os
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 
 db = SQLAlchemy()
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless foreign keys are switched on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 def get_migrate(app):
     return Migrate(app, db)
 
 def create_db():
     db.create_all()
-    
+    stamp_db_head()
+
+def stamp_db_head():
+    """
+    Record the newest migration as applied: create_all builds the current
+    schema, so `flask db upgrade` has only later revisions to run on it.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    with db.engine.begin() as connection:
+        MigrationContext.configure(connection).stamp(ScriptDirectory(MIGRATIONS_DIR), 'head')
+
 def init_db(app):
-    db.init_app(app)
\ No newline at end of file
+    db.init_app(app)
+
+def dialect_insert(model):
+    """
+    INSERT construct for the bound database's dialect, so callers can use
+    on_conflict_do_update / on_conflict_do_nothing for upserts.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -3,6 +3,7 @@ import click
 from flask import Flask, render_template
 from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 
 from App.database import init_db
@@ -23,9 +24,19 @@ def add_views(app):
         app.register_blueprint(view)
 
 
+def add_proxy_fix(app):
+    # Behind TRUSTED_PROXIES reverse proxies (Render runs one), take the
+    # client address and scheme from the X-Forwarded-* headers they add,
+    # so remote_addr is the client's rather than the proxy's
+    proxies = int(app.config.get('TRUSTED_PROXIES', 0))
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+
 def create_app(overrides={}):
     app = Flask(__name__, static_url_path='/static')
     load_config(app, overrides)
+    add_proxy_fix(app)
     CORS(app)
     add_auth_context(app)
     photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
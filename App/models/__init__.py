@@ -6,3 +6,11 @@ from .position import *
 from .application import *
 from .application_state import *
 from .company import *
+from .recommendation import *
+from .position_activity import *
+from .company_deletion import *
+from .funnel import *
+from .volume import *
+from .decision_latency import *
+from .revoked_token import *
+from .export_tombstone import *
@@ -1,14 +1,19 @@
 from App.database import db
 from App.models.application_state import (ApplicationState, ApplicationStatus, PendingState, ShortlistedState, AcceptedState, RejectedState, WithdrawnState)
 
-from sqlalchemy import Enum, UniqueConstraint
+from sqlalchemy import Enum, Index, UniqueConstraint
 
 __all__ = ['Application']
 
 class Application(db.Model):
     __tablename__ = 'application'
     __table_args__ = (
+        # Also serves lookups by student_id alone (leftmost column)
         UniqueConstraint('student_id', 'position_id', name='uq_student_position'),
+        Index('ix_application_position_status', 'position_id', 'status'),
+        Index('ix_application_status', 'status'),
+        # Incremental analytics builds and exports read rows changed since a watermark
+        Index('ix_application_updated_at', 'updated_at'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
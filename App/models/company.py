@@ -1,13 +1,21 @@
 from App.database import db
 
-__all__ = ['Company']
+__all__ = ['Company', 'COMPANY_EXPANSIONS']
+
+# Nested collections a company's JSON can embed
+COMPANY_EXPANSIONS = ('staff', 'employers', 'positions')
 
 class Company(db.Model):
     __tablename__ = 'company'
+    __table_args__ = (
+        # Incremental exports read rows changed since a watermark
+        db.Index('ix_company_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
     staff = db.relationship("Staff", back_populates="company", cascade="all, delete-orphan")
     employers = db.relationship("Employer", back_populates="company", cascade="all, delete-orphan")
@@ -16,11 +24,13 @@ class Company(db.Model):
     def __repr__(self):
         return f"<Company {self.name}>"
 
-    def get_json(self):
-        return {
+    def get_json(self, expand=('staff', 'employers')):
+        """Company JSON embedding the named collections of COMPANY_EXPANSIONS."""
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'staff': [s.get_json() for s in self.staff],
-            'employers': [e.get_json() for e in self.employers]
         }
+        for name in expand:
+            data[name] = [item.get_json() for item in getattr(self, name)]
+        return data
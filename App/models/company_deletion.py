@@ -0,0 +1,50 @@
+import enum
+
+from sqlalchemy import Enum
+
+from App.database import db
+
+__all__ = ['CompanyDeletion', 'DeletionStatus']
+
+class DeletionStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class CompanyDeletion(db.Model):
+    """Progress of a background company deletion, kept after the company is gone."""
+    __tablename__ = 'company_deletion'
+
+    # No foreign key: the company row is deleted by the job itself
+    company_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(Enum(DeletionStatus, native_enum=False), nullable=False, default=DeletionStatus.PENDING)
+    stage = db.Column(db.String(20), nullable=True)
+    positions_total = db.Column(db.Integer, nullable=False, default=0)
+    positions_deleted = db.Column(db.Integer, nullable=False, default=0)
+    applications_deleted = db.Column(db.Integer, nullable=False, default=0)
+    users_deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    requested_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # UTC time of the worker's last committed batch
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CompanyDeletion {self.company_id}: {self.status.value}>"
+
+    def get_json(self):
+        return {
+            'company_id': self.company_id,
+            'status': self.status.value,
+            'stage': self.stage,
+            'positions_total': self.positions_total,
+            'positions_deleted': self.positions_deleted,
+            'applications_deleted': self.applications_deleted,
+            'users_deleted': self.users_deleted,
+            'error': self.error,
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,24 @@
+from sqlalchemy import Enum
+
+from App.database import db
+from App.models.application_state import ApplicationStatus
+
+__all__ = ['DecisionLatency']
+
+class DecisionLatency(db.Model):
+    """
+    Sketch of the seconds from application to a status transition, per
+    (company, decision day, position, new status). Sketches merge, so any
+    range of days and positions is answered by merging its rows.
+    """
+    __tablename__ = 'decision_latency'
+
+    # Key order makes a company's latencies over a date range one index range
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(Enum(ApplicationStatus, native_enum=False), primary_key=True)
+    sketch = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<DecisionLatency {self.company_id}/{self.position_id} {self.day} {self.status.value}>"
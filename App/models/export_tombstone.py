@@ -0,0 +1,20 @@
+from App.database import db
+
+__all__ = ['ExportTombstone']
+
+class ExportTombstone(db.Model):
+    """A hard-deleted row of an exported table, so export deltas can carry the deletion."""
+    __tablename__ = 'export_tombstone'
+    __table_args__ = (
+        # Each delta reads a table's deletions since its watermark
+        db.Index('ix_export_tombstone_table_deleted_at', 'table_name', 'deleted_at'),
+        # Exports drop tombstones past their retention
+        db.Index('ix_export_tombstone_deleted_at', 'deleted_at'),
+    )
+
+    table_name = db.Column(db.String(32), primary_key=True)
+    row_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ExportTombstone {self.table_name} {self.row_id}>"
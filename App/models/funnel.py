@@ -0,0 +1,25 @@
+from sqlalchemy import Enum
+
+from App.database import db
+from App.models.application_state import ApplicationStatus
+
+__all__ = ['ApplicationFunnel']
+
+class ApplicationFunnel(db.Model):
+    """
+    Applications per (company, intake day, position, status), kept up to
+    date by the application controllers. `entered` counts applications
+    that ever moved into the status; `current` those in it now.
+    """
+    __tablename__ = 'application_funnel'
+
+    # Key order makes a company's funnel over a date range one index range
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(Enum(ApplicationStatus, native_enum=False), primary_key=True)
+    entered = db.Column(db.Integer, nullable=False, default=0)
+    current = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ApplicationFunnel {self.company_id}/{self.position_id} {self.day} {self.status.value}: {self.current}>"
@@ -1,5 +1,6 @@
 from App.database import db
-from sqlalchemy import Enum
+from sqlalchemy import Enum, event, exists
+from sqlalchemy.orm import Session, with_loader_criteria
 import enum
 
 class PositionStatus(enum.Enum):
@@ -8,24 +9,55 @@ class PositionStatus(enum.Enum):
 
 class Position(db.Model):
     __tablename__ = 'position'
+    __table_args__ = (
+        # Open-position listings filter on status, optionally narrowed by company
+        db.Index('ix_position_status_company', 'status', 'company_id'),
+        # Partial index of open positions only, per company
+        db.Index(
+            'ix_position_open_company', 'company_id',
+            postgresql_where=db.text("status = 'OPEN'"),
+            sqlite_where=db.text("status = 'OPEN'")
+        ),
+        # Drives the deadline sweeper: open positions ordered by deadline
+        db.Index('ix_position_status_deadline', 'status', 'deadline'),
+        # Feed-imported positions are keyed by the employer's own ID
+        db.UniqueConstraint('created_by', 'external_id', name='uq_position_employer_external_id'),
+        # Soft-deleted positions awaiting the purge
+        db.Index(
+            'ix_position_deleted_at', 'deleted_at',
+            postgresql_where=db.text("deleted_at IS NOT NULL"),
+            sqlite_where=db.text("deleted_at IS NOT NULL")
+        ),
+        # Incremental exports read rows changed since a watermark
+        db.Index('ix_position_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     number_of_positions = db.Column(db.Integer, default=1)
     description = db.Column(db.Text, nullable=True)
     status = db.Column(Enum(PositionStatus, native_enum=False), nullable=False, default=PositionStatus.OPEN)
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
-    created_by = db.Column(db.Integer, db.ForeignKey('employer.id'), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False, index=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('employer.id'), nullable=False, index=True)
+    external_id = db.Column(db.String(255), nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)
+    # Naive UTC; the position closes automatically once it passes
+    deadline = db.Column(db.DateTime, nullable=True)
+    # Set by delete_position; the row is removed later by the purge
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # Set in the INSERT itself so databases migrated without a column default fill it too
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
     company = db.relationship("Company", back_populates="positions")
     employer = db.relationship("Employer", back_populates="positions")
 
-    def __init__(self, title, company_id, created_by, number, description=None):
+    def __init__(self, title, company_id, created_by, number, description=None, deadline=None):
         self.title = title
         self.company_id = company_id
         self.created_by = created_by
         self.status = PositionStatus.OPEN
         self.number_of_positions = number
         self.description = description
+        self.deadline = deadline
 
     def __repr__(self):
         return f"<Position {self.title}>"
@@ -38,5 +70,36 @@ class Position(db.Model):
             "number_of_positions": self.number_of_positions,
             "status": self.status.value,
             "company_id": self.company_id,
-            "created_by": self.created_by
+            "created_by": self.created_by,
+            "external_id": self.external_id,
+            "deadline": self.deadline.isoformat() if self.deadline else None
         }
+
+
+# Aliased so it never correlates with a position table in the outer query
+deleted_position = Position.__table__.alias('deleted_position')
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_positions(execute_state):
+    """
+    Leave soft-deleted positions, and applications to them, out of every
+    ORM query unless it runs with execution_options(include_deleted=True).
+    """
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get('include_deleted', False)
+    ):
+        return
+    from App.models.application import Application
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(Position, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(
+            Application,
+            # A core table, so the subquery itself is not filtered
+            lambda cls: ~exists().where(deleted_position.c.id == cls.position_id, deleted_position.c.deleted_at.isnot(None)),
+            include_aliases=True
+        ),
+    )
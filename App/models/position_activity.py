@@ -0,0 +1,19 @@
+from App.database import db
+
+__all__ = ['PositionActivity']
+
+class PositionActivity(db.Model):
+    """Views and applications of a position per time bucket, flushed from worker memory."""
+    __tablename__ = 'position_activity'
+    __table_args__ = (
+        # Trending reads and pruning are a range over recent buckets
+        db.Index('ix_position_activity_bucket', 'bucket'),
+    )
+
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    applications = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<PositionActivity {self.position_id} @ {self.bucket}: {self.views} views, {self.applications} applications>"
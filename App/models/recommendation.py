@@ -0,0 +1,34 @@
+from App.database import db
+
+__all__ = ['PositionRecommendation', 'RecommendationRefresh', 'RecommendationPositionRefresh']
+
+class PositionRecommendation(db.Model):
+    """A student's precomputed top-K open positions, ordered by rank."""
+    __tablename__ = 'position_recommendation'
+
+    # (student_id, rank) is the primary key, so a student's list is one index range
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<PositionRecommendation {self.student_id} #{self.rank}: {self.position_id}>"
+
+
+class RecommendationRefresh(db.Model):
+    """Queue of students whose recommendations are stale."""
+    __tablename__ = 'recommendation_refresh'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id', ondelete='CASCADE'), primary_key=True)
+    # Moved forward when the student is queued again, so a refresh that
+    # started earlier leaves the row queued
+    queued_at = db.Column(db.DateTime, nullable=False)
+
+
+class RecommendationPositionRefresh(db.Model):
+    """Queue of positions whose changes may reorder students' recommendations."""
+    __tablename__ = 'recommendation_position_refresh'
+
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), primary_key=True)
+    queued_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,20 @@
+from App.database import db
+
+__all__ = ['RevokedToken']
+
+class RevokedToken(db.Model):
+    """An access token revoked before it expired, e.g. by logging out."""
+    __tablename__ = 'revoked_token'
+    __table_args__ = (
+        # Workers sync their denylists from the latest revocations
+        db.Index('ix_revoked_token_revoked_at', 'revoked_at'),
+        # Revoking purges the entries of tokens that have expired since
+        db.Index('ix_revoked_token_expires_at', 'expires_at'),
+    )
+
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # None for tokens that never expire
+    revoked_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
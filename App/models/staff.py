@@ -4,12 +4,13 @@ from App.models.user import User
 class Staff(User):
     __tablename__ = 'staff'
     id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False, index=True)
 
     company = db.relationship("Company", back_populates="staff")
 
     __mapper_args__ = {
-        'polymorphic_identity': 'staff'
+        'polymorphic_identity': 'staff',
+        'polymorphic_load': 'inline',
     }
 
     def __init__(self, username, password, company_id):
@@ -3,6 +3,10 @@ from App.models.user import User
 
 class Student(User):
     __tablename__ = 'student'
+    __table_args__ = (
+        # Incremental exports read profiles changed since a watermark
+        db.Index('ix_student_updated_at', 'updated_at'),
+    )
     id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     email = db.Column(db.String(256))
     dob = db.Column(db.Date)
@@ -11,9 +15,12 @@ class Student(User):
     phone = db.Column(db.String(256))
     gpa = db.Column(db.Float)
     resume = db.Column(db.String(256))
+    # Bumped by profile edits; user-table changes (e.g. password) don't touch it
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
 
     __mapper_args__ = {
-        'polymorphic_identity': 'student'
+        'polymorphic_identity': 'student',
+        'polymorphic_load': 'inline',
     }
 
     def __init__(self, username, password):
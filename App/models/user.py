@@ -1,5 +1,5 @@
-from werkzeug.security import check_password_hash, generate_password_hash
 from App.database import db
+from App.passwords import hash_password, verify_password
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -29,9 +29,9 @@ class User(db.Model):
         }
 
     def set_password(self, password):
-        """Create hashed password."""
-        self.password = generate_password_hash(password)
+        """Create hashed password (in the hashing pool, see App.passwords)."""
+        self.password = hash_password(password)
 
     def check_password(self, password):
-        """Check hashed password."""
-        return check_password_hash(self.password, password)
+        """Check hashed password (in the hashing pool, see App.passwords)."""
+        return verify_password(self.password, password)
@@ -0,0 +1,20 @@
+from App.database import db
+
+__all__ = ['ApplicationVolume']
+
+class ApplicationVolume(db.Model):
+    """Applications received by a position per hour or day bucket."""
+    __tablename__ = 'application_volume'
+    __table_args__ = (
+        # Compaction reads the oldest hour buckets across positions
+        db.Index('ix_application_volume_granularity_bucket', 'granularity', 'bucket'),
+    )
+
+    # A position's series is one range of the primary key
+    position_id = db.Column(db.Integer, db.ForeignKey('position.id', ondelete='CASCADE'), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ApplicationVolume {self.position_id} {self.granularity} {self.bucket}: {self.count}>"
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import repeat
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+__all__ = [
+    'hash_password',
+    'verify_password',
+    'password_needs_rehash',
+    'shutdown_password_pool',
+    'bulk_password_hasher',
+]
+
+# Werkzeug's own default, which existing hashes were made with
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_POOL_SIZE = 2
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _config(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _method():
+    return _config('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+
+
+def _get_pool():
+    """
+    The worker's hashing pool, or None to hash inline. Hashing is pure CPU,
+    so in a gevent worker it would stall every other greenlet; in the pool
+    it runs in separate processes while the calling greenlet waits on the
+    result cooperatively. Spawned, not forked, so children don't inherit
+    the worker's monkey-patched state or open sockets.
+    """
+    global _pool, _pool_pid
+    size = _config('PASSWORD_HASH_POOL_SIZE', 0 if has_app_context() and current_app.testing else DEFAULT_POOL_SIZE)
+    if not size:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(fn, *args):
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args).result()
+
+
+def hash_password(password):
+    """Hash with PASSWORD_HASH_METHOD (a werkzeug method string, e.g. 'pbkdf2:sha256:600000')."""
+    return _run(generate_password_hash, password, _method())
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _full_method(method):
+    """The method as werkzeug records it in hashes, with omitted parameters filled in."""
+    return _run(generate_password_hash, '', method, 1).split('$', 1)[0]
+
+
+def password_needs_rehash(password_hash):
+    """Whether the hash was made with a method or cost other than the configured one."""
+    return password_hash.split('$', 1)[0] != _full_method(_method())
+
+
+def shutdown_password_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@contextmanager
+def bulk_password_hasher(workers=None):
+    """
+    Yields hash_many(passwords) -> hashes in order, hashing with
+    PASSWORD_HASH_METHOD across a pool of its own with one process per
+    core by default (workers <= 1 hashes inline). For bulk imports from the
+    CLI; the web workers' pool stays small.
+    """
+    method = _method()
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers <= 1:
+        yield lambda passwords: [generate_password_hash(password, method) for password in passwords]
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        def hash_many(passwords):
+            # A few chunks per process amortise the round trips and still balance the load
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(pool.map(generate_password_hash, passwords, repeat(method), chunksize=chunksize))
+        yield hash_many
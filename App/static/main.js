@@ -1,22 +1,54 @@
 
-async function getUserData(){
-    const response = await fetch('/api/users');
-    return response.json();
+// Pages of /api/users are fetched as the end of the table scrolls into view,
+// so only the rows being looked at are ever loaded
+let nextPage = '/api/users?limit=200';
+let loading = false;
+
+async function getUserPage(url){
+    const response = await fetch(url);
+    const link = response.headers.get('Link') || '';
+    const next = link.match(/<([^>]+)>;\s*rel="next"/);
+    return {users: await response.json(), next: next ? next[1] : null};
 }
 
 function loadTable(users){
-    const table = document.querySelector('#result');
+    // One DOM insertion per page; textContent keeps usernames from being parsed as HTML
+    const rows = document.createDocumentFragment();
     for(let user of users){
-        table.innerHTML += `<tr>
-            <td>${user.id}</td>
-            <td>${user.username}</td>
-        </tr>`;
+        const row = document.createElement('tr');
+        for(let value of [user.id, user.username]){
+            const cell = document.createElement('td');
+            cell.textContent = value;
+            row.appendChild(cell);
+        }
+        rows.appendChild(row);
+    }
+    document.querySelector('#result').appendChild(rows);
+}
+
+async function loadNextPage(){
+    if(loading || !nextPage) return;
+    loading = true;
+    try {
+        const page = await getUserPage(nextPage);
+        loadTable(page.users);
+        nextPage = page.next;
+    } finally {
+        loading = false;
+    }
+    // Keep going while the table is still too short to scroll
+    const sentinel = document.querySelector('#more');
+    if(nextPage && sentinel.getBoundingClientRect().top < window.innerHeight){
+        loadNextPage();
     }
 }
 
-async function main(){
-    const users = await getUserData();
-    loadTable(users);
+function main(){
+    const sentinel = document.querySelector('#more');
+    new IntersectionObserver(entries => {
+        if(entries.some(entry => entry.isIntersecting)) loadNextPage();
+    }).observe(sentinel);
+    loadNextPage();
 }
 
-main();
\ No newline at end of file
+main();
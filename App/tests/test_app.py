@@ -1,16 +1,23 @@
-import os, tempfile, pytest, logging, unittest
+import os, tempfile, pytest, logging, threading, time, unittest
+from unittest import mock
+import numpy as np
+from datetime import date, datetime, timedelta
+from flask import current_app
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from App.main import create_app
 from App.database import db, create_db
-from App.models import User, Employer, Position, Application, Staff, Student, Company
+from App.passwords import shutdown_password_pool
+from App.controllers import similarity, typeahead
+from App.controllers.login_throttle import BUSY_RETRY
+from App.models import User, Employer, Position, Application, Staff, Student, Company, PositionActivity, ApplicationVolume
+from App.models import RecommendationRefresh, RecommendationPositionRefresh, CompanyDeletion, DeletionStatus
 from App.models.position import PositionStatus
 from App.models.application_state import (
     ApplicationStatus, PendingState, AcceptedState, RejectedState, ShortlistedState, WithdrawnState
 )
 from App.controllers import (
     create_user,
-    get_all_users_json,
     login,
     get_user,
     get_user_by_username,
@@ -25,9 +32,48 @@ from App.controllers import (
     reject_application,
     create_company,
     get_company,
+    update_position_status,
     get_all_companies,
     update_company,
     delete_company,
+    sync_positions,
+    close_expired_positions,
+    get_next_deadline,
+    get_open_positions,
+    utcnow,
+    get_recommendations,
+    refresh_recommendations,
+    refresh_stale_recommendations,
+    mark_student_recommendations_stale,
+    PositionSimilarityIndex,
+    TypeaheadIndex,
+    PositionActivityTracker,
+    PositionFacetIndex,
+    build_position_facets,
+    flush_position_activity,
+    record_position_view,
+    build_catalog_snapshot,
+    delete_position,
+    purge_deleted_positions,
+    run_company_deletion,
+    get_applications_by_student,
+    create_application,
+    get_company_funnel,
+    rebuild_funnel_rollups,
+    get_application_volume,
+    compact_application_volume,
+    backfill_application_volume,
+    LatencySketch,
+    get_decision_latency,
+    build_analytics_store,
+    query_applications,
+    export_columnar,
+    LoginThrottle,
+    UserCache,
+    parse_user_import,
+    import_users,
+    TokenDenylist,
+    sync_token_denylist,
 )
 
 
@@ -310,6 +356,297 @@ class ApplicationStateUnitTests(unittest.TestCase):
         assert new_state is state  # Returns self - cannot withdraw accepted
 
 
+class PositionSimilarityIndexUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PositionSimilarityIndex(max_neighbors=3)
+        self.index.build([
+            (1, "Python Backend Intern", "Build Flask APIs in Python"),
+            (2, "Backend Developer Intern", "Python services and SQL databases"),
+            (3, "Mechanical Design Intern", "CAD drawings for mechanical parts"),
+            (4, "Mechanical Engineering Intern", "Assist with mechanical testing"),
+        ])
+
+    def test_most_similar_first(self):
+        assert [pid for pid, _, _ in self.index.similar(1, 3)][0] == 2
+        assert [pid for pid, _, _ in self.index.similar(3, 3)][0] == 4
+
+    def test_never_similar_to_itself(self):
+        for position_id in range(1, 5):
+            assert position_id not in [pid for pid, _, _ in self.index.similar(position_id, 3)]
+
+    def test_scores_are_descending_cosines(self):
+        scores = [score for _, _, score in self.index.similar(1, 3)]
+        assert scores == sorted(scores, reverse=True)
+        assert all(0 < score <= 1 for score in scores)
+
+    def test_upsert_patches_neighbor_lists(self):
+        self.index.upsert(5, "Python Flask Backend Intern", "Python Flask APIs")
+        assert [pid for pid, _, _ in self.index.similar(5, 1)] == [1]
+        assert 5 in [pid for pid, _, _ in self.index.similar(1, 3)]
+
+    def test_remove_drops_position_from_neighbor_lists(self):
+        self.index.remove(2)
+        assert self.index.similar(2, 3) == []
+        assert 2 not in [pid for pid, _, _ in self.index.similar(1, 3)]
+
+    def test_build_splits_terms_and_blocks_without_changing_scores(self):
+        positions = [(pid, f"Intern {pid % 3}", f"python sql word{pid % 5} word{pid % 7}") for pid in range(1, 40)]
+        self.index.build(positions)
+        # Every term dense with one row per block, then every term through its postings
+        for fraction, block_size in ((10 ** 6, 1), (1, 7)):
+            other = PositionSimilarityIndex(max_neighbors=3)
+            with mock.patch.object(similarity, 'BUILD_DENSE_FRACTION', fraction), \
+                    mock.patch.object(similarity, 'BUILD_BLOCK_SIZE', block_size):
+                other.build(positions)
+            assert np.allclose(other.neighbor_scores, self.index.neighbor_scores, atol=1e-6)
+
+
+class TypeaheadIndexUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TypeaheadIndex()
+        self.index.build(
+            [(1, "Software Engineer Intern", 2, 1), (2, "Software Tester", 5, 1), (3, "Data Engineer", 1, 2)],
+            [(1, "Softworks Ltd"), (2, "DataCorp")]
+        )
+
+    def test_matches_rank_by_openings(self):
+        matches = self.index.search("soft")
+        assert [(m['type'], m['id']) for m in matches] == [('company', 1), ('position', 2), ('position', 1)]
+        assert matches[0]['weight'] == 7
+
+    def test_matches_any_word_case_insensitively(self):
+        assert {m['id'] for m in self.index.search("ENGINEER") if m['type'] == 'position'} == {1, 3}
+
+    def test_limit_and_empty_prefix(self):
+        assert len(self.index.search("s", limit=2)) == 2
+        assert self.index.search("   ") == []
+
+    def test_patches(self):
+        self.index.upsert_position(2, "QA Analyst", 5, 1)
+        assert 2 not in [m['id'] for m in self.index.search("software tester")]
+        assert [m['id'] for m in self.index.search("qa")] == [2]
+        self.index.remove_position(1)
+        self.index.upsert_company(2, "Datalytics")
+        assert {m['label'] for m in self.index.search("data")} == {"Data Engineer", "Datalytics"}
+        assert self.index.search("softworks")[0]['weight'] == 5
+
+    def test_short_prefixes_rank_every_match(self):
+        positions = [(i, f"Analyst {i:03}", 1, 1) for i in range(1, 60)] + [(99, "Anvil Designer", 9, 2)]
+        with mock.patch.object(typeahead, 'MAX_SCANNED_ENTRIES', 10):
+            self.index.build(positions, [])
+        assert "a" in self.index.ranked and "an" in self.index.ranked
+        # Sorts last, but has the most openings
+        assert self.index.search("an")[0]['id'] == 99
+        # Writes rerank the prefixes they fall under
+        self.index.upsert_position(42, "Analyst 042", 20, 1)
+        self.index.remove_position(99)
+        assert [m['id'] for m in self.index.search("an", limit=2)] == [42, 1]
+
+
+class PositionActivityTrackerUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = PositionActivityTracker(flush_interval=60, window=3600, bucket_seconds=300)
+
+    def test_events_aggregate_per_position_and_bucket(self):
+        start = datetime(2026, 1, 1, 9, 0)
+        self.tracker.record(1, views=1, now=start)
+        self.tracker.record(1, views=1, now=start + timedelta(minutes=4))
+        self.tracker.record(1, applications=1, now=start + timedelta(minutes=5))
+        self.tracker.record(2, views=1, now=start + timedelta(minutes=1))
+        rows = sorted(self.tracker.take_pending(), key=lambda r: (r['position_id'], r['bucket']))
+        assert rows == [
+            {'position_id': 1, 'bucket': start, 'views': 2, 'applications': 0},
+            {'position_id': 1, 'bucket': start + timedelta(minutes=5), 'views': 0, 'applications': 1},
+            {'position_id': 2, 'bucket': start, 'views': 1, 'applications': 0},
+        ]
+        assert self.tracker.take_pending() == []
+
+    def test_flush_is_due_once_per_interval(self):
+        assert not self.tracker.due()
+        self.tracker.flushed_at -= 60
+        assert self.tracker.due()
+        self.tracker.take_pending()
+        assert not self.tracker.due()
+
+    def test_window_starts_on_a_bucket_boundary(self):
+        assert self.tracker.window_start(datetime(2026, 1, 1, 9, 7, 30)) == datetime(2026, 1, 1, 8, 5)
+
+
+class PositionFacetIndexUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PositionFacetIndex()
+        self.index.build([
+            (1, {'id': 1}, {'company': '1', 'openings': '1', 'status': 'open'}),
+            (2, {'id': 2}, {'company': '1', 'openings': '2-5', 'status': 'open'}),
+            (3, {'id': 3}, {'company': '2', 'openings': '2-5', 'status': 'closed'}),
+            (4, {'id': 4}, {'company': '2', 'openings': '2-5', 'status': 'open'}),
+        ])
+
+    def test_filters_intersect_across_facets_and_union_within(self):
+        total, positions, _ = self.index.search({'openings': ['2-5'], 'status': ['open']})
+        assert total == 2
+        assert [p['id'] for p in positions] == [2, 4]
+        total, _, _ = self.index.search({'company': ['1', '2'], 'status': ['closed']})
+        assert total == 1
+
+    def test_counts_apply_the_other_facets(self):
+        _, _, counts = self.index.search({'status': ['open']})
+        assert counts['company'] == {'1': 2, '2': 1}
+        assert counts['openings'] == {'1': 1, '2-5': 2}
+        # A facet's own filter doesn't narrow its counts
+        assert counts['status'] == {'open': 3, 'closed': 1}
+
+    def test_pages_follow_position_order(self):
+        _, positions, _ = self.index.search({}, limit=2, offset=1)
+        assert [p['id'] for p in positions] == [2, 3]
+
+    def test_writes_move_bits(self):
+        self.index.upsert(1, {'id': 1}, {'company': '2', 'openings': '0', 'status': 'closed'})
+        self.index.remove(3)
+        self.index.upsert(5, {'id': 5}, {'company': '3', 'openings': '1', 'status': 'open'})
+        _, positions, counts = self.index.search({})
+        assert [p['id'] for p in positions] == [1, 2, 4, 5]
+        assert counts['company'] == {'1': 1, '2': 2, '3': 1}
+        assert counts['status'] == {'open': 3, 'closed': 1}
+
+    def test_positions_close_as_their_deadline_passes(self):
+        deadline = datetime(2030, 1, 1)
+        self.index.upsert(5, {'id': 5}, {'company': '3', 'openings': '1', 'status': 'open'}, deadline)
+        self.index.upsert(6, {'id': 6}, {'company': '3', 'openings': '1', 'status': 'open'}, deadline)
+        # An extended deadline outdates the first
+        self.index.upsert(6, {'id': 6}, {'company': '3', 'openings': '1', 'status': 'open'}, deadline + timedelta(days=1))
+        total, _, _ = self.index.search({'company': ['3'], 'status': ['open']}, now=deadline - timedelta(seconds=1))
+        assert total == 2
+        total, positions, counts = self.index.search({'company': ['3'], 'status': ['open']}, now=deadline)
+        assert [p['id'] for p in positions] == [6]
+        assert counts['status'] == {'open': 1, 'closed': 1}
+
+    def test_deep_pages_skip_to_their_offset(self):
+        for position_id in range(5, 3000):
+            self.index.upsert(position_id, {'id': position_id}, {'company': '3', 'openings': '1', 'status': 'open'})
+        _, positions, _ = self.index.search({'status': ['open']}, limit=3, offset=2500)
+        assert [p['id'] for p in positions] == [2502, 2503, 2504]
+        assert self.index.search({'status': ['open']}, offset=5000)[1] == []
+
+
+class LatencySketchUnitTests(unittest.TestCase):
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        sketch = LatencySketch(relative_accuracy=0.01)
+        for seconds in range(1, 10001):
+            sketch.add(seconds)
+        for q, expected in ((0.5, 5000), (0.9, 9000), (0.99, 9900)):
+            assert abs(sketch.quantile(q) - expected) <= 0.01 * expected + 1
+
+    def test_merge_equals_sketch_of_all_values(self):
+        left, right, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for seconds in (0.2, 30, 3600, 86400):
+            left.add(seconds)
+            both.add(seconds)
+        for seconds in (45, 7200):
+            right.add(seconds)
+            both.add(seconds)
+        merged = left.merge(right)
+        assert merged.bins == both.bins
+        assert (merged.count, merged.zero_count, merged.min, merged.max) == (6, 1, 0.2, 86400)
+
+    def test_bytes_round_trip(self):
+        sketch = LatencySketch()
+        for seconds in (0, 5, 5, 600, 1e6):
+            sketch.add(seconds)
+        restored = LatencySketch.from_bytes(sketch.to_bytes())
+        assert restored.bins == sketch.bins
+        assert [restored.quantile(q) for q in (0, 0.5, 1)] == [sketch.quantile(q) for q in (0, 0.5, 1)]
+        assert LatencySketch().quantile(0.5) is None
+
+
+class LoginThrottleUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'throttle.sqlite')
+        self.throttle = LoginThrottle(path, username_burst=2, username_rate=0.5, ip_burst=3, ip_rate=1.0)
+        # A second worker sharing the file
+        self.other = LoginThrottle(path, username_burst=2, username_rate=0.5, ip_burst=3, ip_rate=1.0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_username_bucket_is_shared_and_refills(self):
+        assert self.throttle.acquire("bob", "10.0.0.1", now=100) == 0
+        assert self.other.acquire("bob", "10.0.0.2", now=100) == 0
+        assert self.throttle.acquire("bob", "10.0.0.3", now=100) == 2
+        # Refused again from memory until the bucket has a token
+        assert self.throttle.acquire("bob", "10.0.0.3", now=101) == 1
+        assert self.throttle.acquire("bob", "10.0.0.3", now=102) == 0
+
+    def test_ip_bucket_covers_every_username(self):
+        for username in ("a", "b", "c"):
+            assert self.throttle.acquire(username, "10.0.0.9", now=100) == 0
+        assert self.other.acquire("d", "10.0.0.9", now=100) == 1
+        assert self.other.acquire("d", "10.0.0.8", now=100) == 0
+
+    def test_locked_file_refuses_briefly_instead_of_raising(self):
+        assert self.throttle.acquire("erin", "10.0.0.1", now=100) == 0
+        holder = self.other._connect()
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            assert self.throttle.acquire("erin", "10.0.0.1", now=101) == BUSY_RETRY
+        finally:
+            holder.execute("ROLLBACK")
+        assert self.throttle.acquire("erin", "10.0.0.1", now=101) == 0
+
+
+class UserCacheUnitTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = UserCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.put(1, "alice")
+        self.now = 9
+        assert self.cache.get(1) == "alice"
+        self.now = 10
+        assert self.cache.get(1) is None
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put(1, "alice")
+        self.cache.put(2, "bob")
+        self.cache.get(1)
+        self.cache.put(3, "carol")
+        assert (self.cache.get(1), self.cache.get(2), self.cache.get(3)) == ("alice", None, "carol")
+        self.cache.invalidate([1, 3])
+        assert len(self.cache) == 0
+
+
+class TokenDenylistUnitTests(unittest.TestCase):
+
+    def test_revoked_ids_are_found_and_others_are_not(self):
+        denylist = TokenDenylist(bucket_seconds=60, capacity=100)
+        for i in range(500):
+            denylist.add(f"revoked-{i}", 1000 + i)
+        # Filled past capacity, the filter was rebuilt larger and still has no false negatives
+        assert all(denylist.is_revoked(f"revoked-{i}", 1000 + i) for i in range(500))
+        assert not any(denylist.is_revoked(f"valid-{i}", 1000 + i) for i in range(500))
+
+    def test_buckets_drop_once_all_their_tokens_expired(self):
+        denylist = TokenDenylist(bucket_seconds=60)
+        denylist.add("soon", 90)
+        denylist.add("later", 150)
+        denylist.add("never", None)
+        denylist.drop_expired(119)
+        assert len(denylist) == 3
+        denylist.drop_expired(120)
+        assert len(denylist) == 2
+        assert not denylist.is_revoked("soon", 90)
+        assert denylist.is_revoked("later", 150) and denylist.is_revoked("never", None)
+
+
 '''
     Integration Tests
 '''
@@ -565,6 +902,31 @@ class UserIntegrationTests(unittest.TestCase):
         token = login("john", "wrongpass")
         assert token is None
 
+    def test_login_rehashes_with_the_configured_method(self):
+        student, _ = create_user("john", "johnpass", "student")
+        assert student.password.startswith("scrypt:")
+        current_app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        try:
+            assert login("john", "wrongpass") is None
+            assert get_user(student.id).password.startswith("scrypt:")
+            assert login("john", "johnpass") is not None
+            rehashed = get_user(student.id).password
+            assert rehashed.startswith("pbkdf2:sha256:1000$")
+            assert login("john", "johnpass") is not None
+            assert get_user(student.id).password == rehashed
+        finally:
+            current_app.config.pop('PASSWORD_HASH_METHOD')
+
+    def test_passwords_hash_in_a_process_pool(self):
+        current_app.config['PASSWORD_HASH_POOL_SIZE'] = 1
+        try:
+            student, _ = create_user("john", "johnpass", "student")
+            assert login("john", "johnpass") is not None
+            assert login("john", "wrongpass") is None
+        finally:
+            current_app.config.pop('PASSWORD_HASH_POOL_SIZE')
+            shutdown_password_pool()
+
     def test_get_user_returns_correct_subclass(self):
         # Create a company first for staff and employer
         company = create_company("Test Company", "A test company")
@@ -1314,7 +1676,7 @@ def test_employer_can_create_position_via_api(empty_db):
 def test_student_cannot_create_position(empty_db):
     client = empty_db
 
-    company = create_company("Role Co", "For role restriction test")
+    create_company("Role Co", "For role restriction test")
     student, _ = create_user("create_student", "pass", "student")
     assert student is not None
 
@@ -1390,6 +1752,1027 @@ def test_get_company_positions_returns_only_that_companys_positions(empty_db):
     assert all(p["company_id"] == company1.id for p in data)
 
 
+def test_sync_positions_inserts_updates_and_closes(empty_db):
+    company = create_company("Feed Co", "Posts positions from a feed")
+    employer, _ = create_user("feed_emp", "pass", "employer", company_id=company.id)
+
+    rows = [{"external_id": f"EXT-{i}", "title": f"Role {i}", "number": 2} for i in range(3)]
+    result = sync_positions(employer.id, rows)
+    assert result == {"created": 3, "updated": 0, "closed": 0, "unchanged": 0}
+
+    rows[0]["title"] = "Renamed Role"
+    result = sync_positions(employer.id, rows[:2])
+    assert result == {"created": 0, "updated": 1, "closed": 1, "unchanged": 1}
+
+    positions = {p.external_id: p for p in get_positions_by_employer(employer.id)}
+    assert positions["EXT-0"].title == "Renamed Role"
+    assert positions["EXT-2"].status == PositionStatus.CLOSED
+
+    # A closed position that reappears in the feed is reopened
+    result = sync_positions(employer.id, rows)
+    assert result == {"created": 0, "updated": 1, "closed": 0, "unchanged": 2}
+    db.session.expire_all()
+    assert positions["EXT-2"].status == PositionStatus.OPEN
+
+
+def test_resync_of_unchanged_feed_issues_no_writes(empty_db):
+    from sqlalchemy import event
+
+    company = create_company("Feed Co", "Posts positions from a feed")
+    employer, _ = create_user("feed_emp", "pass", "employer", company_id=company.id)
+    rows = [{"external_id": str(i), "title": f"Role {i}", "description": "Same"} for i in range(600)]
+    assert sync_positions(employer.id, rows)["created"] == 600
+
+    writes = []
+    def record_writes(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record_writes)
+    try:
+        result = sync_positions(employer.id, rows)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_writes)
+
+    assert result == {"created": 0, "updated": 0, "closed": 0, "unchanged": 600}
+    assert writes == []
+
+
+def test_resync_leaves_filled_and_expired_positions_closed(empty_db):
+    from sqlalchemy import event
+
+    company = create_company("Feed Co", "Posts positions from a feed")
+    employer, _ = create_user("feed_emp", "pass", "employer", company_id=company.id)
+    student, _ = create_user("feed_student", "pass", "student")
+    rows = [{"external_id": "FILLED", "title": "One Seat", "number": 1},
+            {"external_id": "EXPIRED", "title": "Past Deadline", "number": 2}]
+    sync_positions(employer.id, rows)
+    positions = {p.external_id: p for p in get_positions_by_employer(employer.id)}
+    accept_application(add_student_to_shortlist(student.id, positions["FILLED"].id).id)
+    positions["EXPIRED"].deadline = utcnow() - timedelta(hours=1)
+    db.session.commit()
+    close_expired_positions()
+
+    writes = []
+    def record_writes(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record_writes)
+    try:
+        result = sync_positions(employer.id, rows)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_writes)
+    assert result == {"created": 0, "updated": 0, "closed": 0, "unchanged": 2}
+    assert writes == []
+
+    # An edited row keeps the accepted seat taken and the deadline in force
+    rows[0]["number"], rows[1]["title"] = 3, "Renamed"
+    assert sync_positions(employer.id, rows)["updated"] == 2
+    db.session.expire_all()
+    assert (positions["FILLED"].number_of_positions, positions["FILLED"].status) == (2, PositionStatus.OPEN)
+    assert positions["EXPIRED"].status == PositionStatus.CLOSED
+
+
+def test_sync_positions_api_accepts_csv(empty_db):
+    client = empty_db
+    company = create_company("Feed Co", "Posts positions from a feed")
+    create_user("feed_emp", "pass", "employer", company_id=company.id)
+    token = login("feed_emp", "pass")
+
+    feed = "external_id,title,number,description\nA1,Data Intern,3,Analytics\nA2,QA Intern,,\n"
+    res = client.post(
+        "/api/positions/sync",
+        data=feed,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+    )
+    assert res.status_code == 200
+    assert res.get_json()["created"] == 2
+
+    res = client.post(
+        "/api/positions/sync",
+        json=[{"title": "No external id"}],
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert res.status_code == 400
+
+
+def test_accepting_last_seat_closes_position(empty_db):
+    company = create_company("Seat Co", "One seat only")
+    employer, _ = create_user("seat_emp", "pass", "employer", company_id=company.id)
+    student, _ = create_user("seat_student", "pass", "student")
+    position = open_position(user_id=employer.id, title="Only Seat", number_of_positions=1)
+    application = add_student_to_shortlist(student.id, position.id)
+
+    accept_application(application.id)
+
+    assert position.number_of_positions == 0
+    assert position.status == PositionStatus.CLOSED
+    assert position not in get_open_positions()
+
+
+def test_deadline_sweeper_closes_expired_positions(empty_db):
+    from datetime import timedelta
+
+    company = create_company("Deadline Co", "Has deadlines")
+    employer, _ = create_user("deadline_emp", "pass", "employer", company_id=company.id)
+    now = utcnow()
+    expired = [
+        open_position(user_id=employer.id, title=f"Expired {i}", deadline=now - timedelta(hours=i + 1))
+        for i in range(5)
+    ]
+    upcoming = open_position(user_id=employer.id, title="Upcoming", deadline=now + timedelta(days=1))
+    no_deadline = open_position(user_id=employer.id, title="Evergreen")
+
+    # Expired positions are hidden before the sweeper runs
+    assert set(get_open_positions()) == {upcoming, no_deadline}
+
+    assert close_expired_positions(batch_size=2) == 5
+    assert all(p.status == PositionStatus.CLOSED for p in expired)
+    assert upcoming.status == PositionStatus.OPEN
+    assert get_next_deadline() == upcoming.deadline
+    assert close_expired_positions() == 0
+
+
+def test_create_position_with_deadline_via_api(empty_db):
+    client = empty_db
+    company = create_company("Deadline Co", "Has deadlines")
+    create_user("deadline_emp", "pass", "employer", company_id=company.id)
+    token = login("deadline_emp", "pass")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    res = client.post("/api/positions", json={"title": "Timed", "number": 1, "deadline": "2030-01-31T17:00:00+00:00"}, headers=headers)
+    assert res.status_code == 201
+    assert res.get_json()["deadline"] == "2030-01-31T17:00:00"
+
+    res = client.post("/api/positions", json={"title": "Timed", "number": 1, "deadline": "next week"}, headers=headers)
+    assert res.status_code == 400
+
+
+def _create_student(username, degree, gpa):
+    from datetime import date
+    student, _ = create_user(username, "pass", "student", student_data={
+        'email': f'{username}@example.com',
+        'dob': date(2001, 1, 1),
+        'gender': 'Female',
+        'degree': degree,
+        'phone': '555-0000',
+        'gpa': gpa,
+        'resume': '/uploads/resume.pdf'
+    })
+    return student
+
+
+def test_recommendations_rank_positions_by_past_outcomes(empty_db):
+    company = create_company("Rec Co", "Recommends positions")
+    employer, _ = create_user("rec_emp", "pass", "employer", company_id=company.id)
+    software = open_position(user_id=employer.id, title="Software Intern", number_of_positions=3)
+    mechanical = open_position(user_id=employer.id, title="Mechanical Intern", number_of_positions=3)
+
+    for i, (degree, position) in enumerate([("Computer Science", software), ("Mechanical Engineering", mechanical)]):
+        past = _create_student(f"past{i}", degree, 3.6)
+        shortlist_application(add_student_to_shortlist(past.id, position.id).id)
+
+    cs_student = _create_student("cs_student", "Computer Science", 3.5)
+    me_student = _create_student("me_student", "Mechanical Engineering", 3.5)
+
+    assert refresh_stale_recommendations() > 0
+    assert [p.id for p, _ in get_recommendations(cs_student.id)][0] == software.id
+    assert [p.id for p, _ in get_recommendations(me_student.id)][0] == mechanical.id
+    # Nothing left to do once the queue is drained
+    assert refresh_stale_recommendations() == 0
+
+    # Closing a position queues the students holding it and drops it on refresh
+    update_position_status(software.id, PositionStatus.CLOSED)
+    refresh_stale_recommendations()
+    assert software.id not in [p.id for p, _ in get_recommendations(cs_student.id)]
+
+    # A passed deadline hides a position before the sweeper closes it
+    db.session.get(Position, mechanical.id).deadline = utcnow() - timedelta(minutes=1)
+    db.session.commit()
+    assert mechanical.id not in [p.id for p, _ in get_recommendations(me_student.id)]
+
+
+def test_recommendation_queues_are_cheap_to_fill_and_drained_as_read(empty_db):
+    company = create_company("Queue Co", "Recommends positions")
+    employer, _ = create_user("queue_emp", "pass", "employer", company_id=company.id)
+    student = _create_student("queue_student", "Biology", 3.0)
+    open_position(user_id=employer.id, title="First Intern")
+    refresh_stale_recommendations()
+
+    # Writes queue just the position; the refresh works out the students
+    position = open_position(user_id=employer.id, title="Second Intern")
+    update_position_status(position.id, PositionStatus.CLOSED)
+    update_position_status(position.id, PositionStatus.OPEN)
+    assert db.session.scalars(db.select(RecommendationPositionRefresh.position_id)).all() == [position.id]
+    assert db.session.scalars(db.select(RecommendationRefresh.student_id)).all() == []
+    assert refresh_stale_recommendations() == 1
+    assert position.id in [p.id for p, _ in get_recommendations(student.id)]
+    assert db.session.scalars(db.select(RecommendationPositionRefresh.position_id)).all() == []
+
+    # A student queued after a refresh started stays queued for the next one
+    mark_student_recommendations_stale(student.id)
+    db.session.commit()
+    with mock.patch('App.controllers.recommendation.utcnow', return_value=utcnow() - timedelta(minutes=1)):
+        refresh_recommendations([student.id])
+    assert db.session.scalars(db.select(RecommendationRefresh.student_id)).all() == [student.id]
+    assert refresh_stale_recommendations() == 1
+
+    # A queued student that is gone is drained, not read again on every pass
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        connection.execute(db.insert(RecommendationRefresh), {'student_id': student.id + 1000, 'queued_at': utcnow()})
+        connection.commit()
+        connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+    assert refresh_stale_recommendations() == 0
+    assert db.session.scalars(db.select(RecommendationRefresh.student_id)).all() == []
+
+
+def test_recommendations_endpoint_is_student_only(empty_db):
+    client = empty_db
+    company = create_company("Rec Co", "Recommends positions")
+    employer, _ = create_user("rec_emp", "pass", "employer", company_id=company.id)
+    position = open_position(user_id=employer.id, title="Any Intern")
+    _create_student("rec_student", "Biology", 3.0)
+    refresh_stale_recommendations()
+
+    res = client.get("/api/recommendations", headers={"Authorization": f"Bearer {login('rec_student', 'pass')}"})
+    assert res.status_code == 200
+    assert [p["id"] for p in res.get_json()] == [position.id]
+
+    res = client.get("/api/recommendations", headers={"Authorization": f"Bearer {login('rec_emp', 'pass')}"})
+    assert res.status_code == 403
+
+
+def test_position_details_include_similar_positions(empty_db):
+    client = empty_db
+    company = create_company("Similar Co", "Has similar positions")
+    employer, _ = create_user("similar_emp", "pass", "employer", company_id=company.id)
+    backend = open_position(user_id=employer.id, title="Backend Intern", description="Python and Flask APIs")
+    python = open_position(user_id=employer.id, title="Python Developer Intern", description="Flask backend services")
+    open_position(user_id=employer.id, title="Accounting Intern", description="Ledgers and audits")
+
+    res = client.get(f"/api/positions/{backend.id}")
+    assert "similar_positions" not in res.get_json()
+
+    res = client.get(f"/api/positions/{backend.id}?similar=5")
+    assert [p["id"] for p in res.get_json()["similar_positions"]][0] == python.id
+
+    # Writes patch the worker's index without a rebuild
+    newcomer = open_position(user_id=employer.id, title="Backend Python Intern", description="Flask APIs in Python")
+    update_position_status(python.id, PositionStatus.CLOSED)
+    res = client.get(f"/api/positions/{backend.id}?similar=5")
+    similar_ids = [p["id"] for p in res.get_json()["similar_positions"]]
+    assert similar_ids[0] == newcomer.id
+    assert python.id not in similar_ids
+
+
+def test_failing_position_hook_keeps_the_committed_write(empty_db):
+    company = create_company("Hook Co", "Has hooks")
+    employer, _ = create_user("hook_emp", "pass", "employer", company_id=company.id)
+    with mock.patch('App.controllers.position_events.refresh_typeahead_positions', side_effect=RuntimeError('boom')), \
+            mock.patch('App.controllers.position_events.refresh_position_facets') as refresh_facets:
+        position = open_position(user_id=employer.id, title="Hooked Intern")
+        assert position is not None
+        assert update_position_status(position.id, PositionStatus.CLOSED) is not None
+    # Later hooks still ran
+    assert refresh_facets.call_count == 2
+    position_id = position.id
+    db.session.expunge_all()
+    assert db.session.get(Position, position_id).status == PositionStatus.CLOSED
+
+
+def test_stale_similarity_index_is_served_while_rebuilt(empty_db):
+    client = empty_db
+    company = create_company("Rebuild Co", "Has similar positions")
+    employer, _ = create_user("rebuild_emp", "pass", "employer", company_id=company.id)
+    backend = open_position(user_id=employer.id, title="Backend Intern", description="Python and Flask APIs")
+    python = open_position(user_id=employer.id, title="Python Developer Intern", description="Flask backend services")
+    client.get(f"/api/positions/{backend.id}?similar=5")
+    stale = current_app.extensions['position_similarity']
+    stale.max_age = 0
+
+    res = client.get(f"/api/positions/{backend.id}?similar=5")
+    assert [p["id"] for p in res.get_json()["similar_positions"]] == [python.id]
+    for thread in threading.enumerate():
+        if thread.name == 'similarity-rebuild':
+            thread.join()
+    rebuilt = current_app.extensions['position_similarity']
+    assert rebuilt is not stale and stale.pending is None
+    assert [pid for pid, _, _ in rebuilt.similar(backend.id, 5)] == [python.id]
+
+
+def test_typeahead_endpoint_follows_writes(empty_db):
+    client = empty_db
+    company = create_company("Typeahead Co", "Searchable")
+    employer, _ = create_user("typeahead_emp", "pass", "employer", company_id=company.id)
+    position = open_position(user_id=employer.id, title="Cloud Intern", number_of_positions=3)
+
+    res = client.get("/api/typeahead?prefix=clo")
+    assert res.status_code == 200
+    assert [(m["type"], m["id"]) for m in res.get_json()] == [("position", position.id)]
+
+    # Writes after the index is built are patched in
+    update_position_status(position.id, PositionStatus.CLOSED)
+    update_company(company.id, name="Cloudy Co")
+    res = client.get("/api/typeahead?prefix=clo")
+    assert [(m["type"], m["label"]) for m in res.get_json()] == [("company", "Cloudy Co")]
+
+
+def test_trending_positions_are_flushed_in_batches(empty_db):
+    client = empty_db
+    client.application.config['TRENDING_FLUSH_INTERVAL'] = 3600
+    company = create_company("Trending Co", "Popular positions")
+    employer, _ = create_user("trending_emp", "pass", "employer", company_id=company.id)
+    viewed = open_position(user_id=employer.id, title="Viewed Intern")
+    applied = open_position(user_id=employer.id, title="Applied Intern")
+    _create_student("trending_student", "Biology", 3.0)
+
+    for _ in range(3):
+        client.get(f"/api/positions/{viewed.id}")
+    client.get(f"/api/positions/{applied.id}")
+    client.post(f"/api/positions/{applied.id}/apply", headers={"Authorization": f"Bearer {login('trending_student', 'pass')}"})
+    # Nothing is written until the worker flushes
+    assert PositionActivity.query.count() == 0
+
+    assert flush_position_activity() == 2
+    assert {(a.position_id, a.views, a.applications) for a in PositionActivity.query.all()} == {
+        (viewed.id, 3, 0), (applied.id, 1, 1)
+    }
+
+    res = client.get("/api/positions/trending")
+    assert res.status_code == 200
+    trending = res.get_json()
+    assert [p["id"] for p in trending] == [applied.id, viewed.id]
+    assert trending[0]["applications"] == 1
+
+    # Later flushes add to the stored buckets
+    client.get(f"/api/positions/{viewed.id}")
+    flush_position_activity()
+    assert sum(a.views for a in PositionActivity.query.filter_by(position_id=viewed.id)) == 4
+
+
+def test_trending_flushes_on_a_timer_and_its_own_connection(empty_db):
+    client = empty_db
+    company = create_company("Timed Co", "Flushed while idle")
+    employer, _ = create_user("timed_emp", "pass", "employer", company_id=company.id)
+    position = open_position(user_id=employer.id, title="Timed Intern")
+
+    # A flush inside a request neither commits nor rolls back its session
+    record_position_view(position.id)
+    company.description = "Uncommitted"
+    assert flush_position_activity() == 1
+    assert company in db.session.dirty
+    db.session.rollback()
+    assert get_company(company.id).description == "Flushed while idle"
+
+    client.application.config.update(TRENDING_FLUSH_IN_BACKGROUND=True, TRENDING_FLUSH_INTERVAL=0.05)
+    client.application.extensions.pop('position_activity')
+    try:
+        record_position_view(position.id)
+        for _ in range(100):
+            db.session.expire_all()
+            if PositionActivity.query.one().views == 2:
+                break
+            time.sleep(0.05)
+        assert PositionActivity.query.one().views == 2
+    finally:
+        client.application.extensions.pop('position_activity')
+
+
+def test_catalog_snapshot_follows_position_writes(empty_db, tmp_path):
+    import gzip, json
+    client = empty_db
+    client.application.config.update(CATALOG_SNAPSHOT_ENABLED=True, CATALOG_SNAPSHOT_DIR=str(tmp_path), CATALOG_SNAPSHOT_DELAY=0)
+    company = create_company("Snapshot Co", "Static catalog")
+    employer, _ = create_user("snapshot_emp", "pass", "employer", company_id=company.id)
+    first = open_position(user_id=employer.id, title="First Intern")
+
+    catalog = json.loads((tmp_path / "positions.json").read_bytes())
+    assert catalog["positions"] == client.get("/api/positions").get_json()
+    assert gzip.decompress((tmp_path / "positions.json.gz").read_bytes()) == (tmp_path / "positions.json").read_bytes()
+    assert [p["id"] for p in json.loads((tmp_path / "companies" / f"{company.id}.json").read_bytes())["positions"]] == [first.id]
+
+    # Each write publishes a new content-addressed version next to the stable file
+    second = open_position(user_id=employer.id, title="Second Intern")
+    update_position_status(first.id, PositionStatus.CLOSED)
+    latest = json.loads((tmp_path / "positions.json").read_bytes())
+    assert [p["id"] for p in latest["positions"]] == [second.id]
+    assert latest["sequence"] > catalog["sequence"]
+    assert len(list(tmp_path.glob("positions.*.json"))) == 2
+    assert not list(tmp_path.glob(".tmp-*"))
+
+    # A render that read the data earlier never replaces a later one
+    with mock.patch('App.controllers.catalog_snapshot._sequence', return_value=catalog["sequence"]):
+        update_position_status(first.id, PositionStatus.OPEN)
+    assert json.loads((tmp_path / "positions.json").read_bytes()) == latest
+
+    # Rebuilds drop the lists of deleted companies
+    delete_company(company.id)
+    assert build_catalog_snapshot() == 1
+    assert not list((tmp_path / "companies").glob("*.json"))
+    assert json.loads((tmp_path / "positions.json").read_bytes())["positions"] == []
+
+
+def test_catalog_snapshot_renders_a_burst_of_writes_once(empty_db, tmp_path):
+    client = empty_db
+    client.application.config.update(CATALOG_SNAPSHOT_ENABLED=True, CATALOG_SNAPSHOT_DIR=str(tmp_path), CATALOG_SNAPSHOT_DELAY=0.2)
+    company = create_company("Burst Co", "Static catalog")
+    employer, _ = create_user("burst_emp", "pass", "employer", company_id=company.id)
+    with mock.patch('App.controllers.catalog_snapshot._publish_catalog') as publish:
+        for i in range(3):
+            open_position(user_id=employer.id, title=f"Burst Intern {i}")
+        assert not publish.called
+        for thread in threading.enumerate():
+            if thread.name == 'catalog-snapshot':
+                thread.join()
+    assert publish.call_count == 1
+
+
+def test_deleted_positions_are_hidden_then_purged(empty_db):
+    client = empty_db
+    company = create_company("Delete Co", "Deletes positions")
+    employer, _ = create_user("delete_emp", "pass", "employer", company_id=company.id)
+    kept = open_position(user_id=employer.id, title="Kept Intern")
+    doomed = open_position(user_id=employer.id, title="Doomed Intern")
+    student = _create_student("delete_student", "Biology", 3.0)
+    create_application(student.id, kept.id)
+    create_application(student.id, doomed.id)
+    doomed_id = doomed.id
+
+    headers = {"Authorization": f"Bearer {login('delete_emp', 'pass')}"}
+    res = client.delete(f"/api/positions/{doomed_id}", headers=headers)
+    assert res.status_code == 200
+
+    # Hidden from every query at once, applications included
+    assert client.get(f"/api/positions/{doomed_id}").status_code == 404
+    assert [p["id"] for p in client.get("/api/positions/all").get_json()] == [kept.id]
+    assert [a.position_id for a in get_applications_by_student(student.id)] == [kept.id]
+    assert Application.query.count() == 1
+    assert client.delete(f"/api/positions/{doomed_id}", headers=headers).status_code == 404
+
+    # The rows stay until the purge, which cascades in the database
+    hidden = db.session.execute(db.select(Position.id).execution_options(include_deleted=True)).scalars().all()
+    assert doomed_id in hidden
+    assert purge_deleted_positions(batch_size=1) == 1
+    assert db.session.execute(
+        db.select(db.func.count()).select_from(Application.__table__)
+    ).scalar() == 1
+    assert purge_deleted_positions() == 0
+
+
+def test_browse_positions_with_facet_counts(empty_db):
+    client = empty_db
+    acme = create_company("Facet Acme", "First")
+    globex = create_company("Facet Globex", "Second")
+    acme_emp, _ = create_user("facet_acme", "pass", "employer", company_id=acme.id)
+    globex_emp, _ = create_user("facet_globex", "pass", "employer", company_id=globex.id)
+    single = open_position(user_id=acme_emp.id, title="Single Seat", number_of_positions=1)
+    several = open_position(user_id=acme_emp.id, title="Several Seats", number_of_positions=4)
+    other = open_position(user_id=globex_emp.id, title="Other Seats", number_of_positions=3)
+
+    res = client.get(f"/api/positions/browse?openings=2-5&company={acme.id}")
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data["total"] == 1
+    assert [p["id"] for p in data["positions"]] == [several.id]
+    assert data["facets"]["company"] == {str(acme.id): 1, str(globex.id): 1}
+    assert data["facets"]["openings"] == {"1": 1, "2-5": 1}
+
+    # Writes update the bitmaps in place
+    update_position_status(other.id, PositionStatus.CLOSED)
+    delete_position(single.id)
+    data = client.get("/api/positions/browse?status=open").get_json()
+    assert [p["id"] for p in data["positions"]] == [several.id]
+    assert data["facets"]["status"] == {"open": 1, "closed": 1}
+
+
+def test_stale_facet_index_is_served_while_rebuilt_once(empty_db):
+    client = empty_db
+    company = create_company("Facet Rebuild Co", "Browsed")
+    employer, _ = create_user("facet_rebuild_emp", "pass", "employer", company_id=company.id)
+    first = open_position(user_id=employer.id, title="First Seat")
+    assert client.get("/api/positions/browse").get_json()["total"] == 1
+    stale = current_app.extensions['position_facets']
+    stale.max_age = 0
+
+    # Requests finding the index stale are answered from it and start one rebuild
+    with mock.patch('threading.Thread.start') as start:
+        for _ in range(2):
+            assert client.get("/api/positions/browse").get_json()["total"] == 1
+    assert start.call_count == 1
+
+    # Writes during the rebuild are patched into the new index
+    update_position_status(first.id, PositionStatus.CLOSED)
+    assert stale.pending == {first.id}
+    build_position_facets()
+    rebuilt = current_app.extensions['position_facets']
+    assert rebuilt is not stale and stale.pending is None
+    assert client.get("/api/positions/browse?status=closed").get_json()["total"] == 1
+
+
+def test_companies_expand_nested_collections_in_constant_queries(empty_db):
+    from sqlalchemy import event
+    client = empty_db
+    for i in range(5):
+        company = create_company(f"Expand Co {i}", "Expandable")
+        create_user(f"expand_staff{i}", "pass", "staff", company_id=company.id)
+        employer, _ = create_user(f"expand_emp{i}", "pass", "employer", company_id=company.id)
+        open_position(user_id=employer.id, title=f"Expand Intern {i}")
+    db.session.expire_all()
+
+    res = client.get("/api/companies")
+    assert res.status_code == 200
+    assert all("staff" not in c and "employers" not in c for c in res.get_json())
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        res = client.get("/api/companies?expand=staff,employers,positions")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    companies = res.get_json()
+    assert [len(c["staff"]) + len(c["employers"]) + len(c["positions"]) for c in companies] == [3] * 5
+    # The companies plus one query per expanded collection
+    assert len(statements) == 4
+
+    assert client.get("/api/companies?expand=secrets").status_code == 400
+    res = client.get(f"/api/company/{companies[0]['id']}?expand=staff")
+    assert set(res.get_json()) == {"id", "name", "description", "staff"}
+
+
+def test_company_responses_are_conditional(empty_db):
+    client = empty_db
+    company = create_company("Cached Co", "Cacheable")
+
+    res = client.get(f"/api/company/{company.id}")
+    assert res.headers["ETag"]
+    assert "public" in res.headers["Cache-Control"]
+    res = client.get(f"/api/company/{company.id}", headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
 
+    # A different expansion is a different representation
+    expanded = client.get(f"/api/company/{company.id}?expand=employers")
+    assert expanded.headers["ETag"] != res.headers["ETag"]
+    # Embedded users stay out of shared caches
+    assert "private" in expanded.headers["Cache-Control"]
+    assert "public" not in expanded.headers["Cache-Control"]
+    assert "public" in client.get(f"/api/company/{company.id}?expand=positions").headers["Cache-Control"]
+    assert "private" in client.get("/api/companies?expand=staff").headers["Cache-Control"]
 
 
+def test_company_deletion_runs_as_a_tracked_job(empty_db):
+    client = empty_db
+    client.application.config['COMPANY_DELETION_IN_BACKGROUND'] = False
+    company = create_company("Doomed Co", "Being deleted")
+    other = create_company("Surviving Co", "Stays")
+    staff, _ = create_user("doomed_staff", "pass", "staff", company_id=company.id)
+    create_user("surviving_staff", "pass", "staff", company_id=other.id)
+    employer, _ = create_user("doomed_emp", "pass", "employer", company_id=company.id)
+    positions = [open_position(user_id=employer.id, title=f"Doomed Intern {i}") for i in range(3)]
+    student = _create_student("doomed_student", "Biology", 3.0)
+    for position in positions:
+        create_application(student.id, position.id)
+    delete_position(positions[0].id)
+    company_id = company.id
+
+    headers = {"Authorization": f"Bearer {login('surviving_staff', 'pass')}"}
+    res = client.delete(f"/api/company/{company_id}", headers=headers)
+    assert res.status_code == 202
+    assert res.headers["Location"].endswith(f"/api/company/{company_id}/deletion")
+
+    progress = client.get(f"/api/company/{company_id}/deletion", headers=headers).get_json()
+    assert progress["status"] == "done"
+    assert (progress["positions_total"], progress["positions_deleted"]) == (3, 3)
+    assert progress["applications_deleted"] == 3
+    assert progress["users_deleted"] == 2
+    assert get_company(company_id) is None
+    assert get_user(student.id) is not None
+    assert Application.query.count() == 0
+    assert client.delete(f"/api/company/{company_id}", headers=headers).status_code == 404
+
+
+def test_company_deletion_is_claimed_once_and_resumed_when_stale(empty_db):
+    client = empty_db
+    company = create_company("Contested Co", "Deleted twice at once")
+    create_user("contested_staff", "pass", "staff", company_id=create_company("Bystander Co", "Stays").id)
+    company_id = company.id
+    headers = {"Authorization": f"Bearer {login('contested_staff', 'pass')}"}
+
+    # The first request's worker holds the job; a second request gets the same job
+    with mock.patch('threading.Thread.start') as start:
+        first = client.delete(f"/api/company/{company_id}", headers=headers)
+        second = client.delete(f"/api/company/{company_id}", headers=headers)
+    assert (first.status_code, second.status_code) == (202, 202)
+    assert second.get_json()["status"] == "pending"
+    assert start.call_count == 1
+    assert run_company_deletion(company_id).status == DeletionStatus.PENDING
+    assert get_company(company_id) is not None
+
+    # A worker that stopped heartbeating loses the job to the next request
+    job = db.session.get(CompanyDeletion, company_id)
+    job.status, job.heartbeat_at = DeletionStatus.RUNNING, utcnow() - timedelta(hours=1)
+    db.session.commit()
+    assert run_company_deletion(company_id).status == DeletionStatus.DONE
+    assert get_company(company_id) is None
+
+
+def test_company_funnel_follows_application_transitions(empty_db):
+    client = empty_db
+    company = create_company("Funnel Co", "Hiring")
+    staff, _ = create_user("funnel_staff", "pass", "staff", company_id=company.id)
+    employer, _ = create_user("funnel_emp", "pass", "employer", company_id=company.id)
+    create_user("outsider_staff", "pass", "staff", company_id=create_company("Other Co", "Elsewhere").id)
+    position = open_position(user_id=employer.id, title="Funnel Intern", number_of_positions=5)
+    applications = [create_application(_create_student(f"funnel_student{i}", "Biology", 3.0).id, position.id) for i in range(4)]
+    for application in applications[:3]:
+        shortlist_application(application.id)
+    accept_application(applications[0].id)
+    reject_application(applications[1].id)
+    withdraw_application(applications[3].id)
+
+    headers = {"Authorization": f"Bearer {login('funnel_staff', 'pass')}"}
+    res = client.get(f"/api/company/{company.id}/funnel?cycle=day", headers=headers)
+    assert res.status_code == 200
+    [cycle] = res.get_json()["cycles"]
+    assert cycle["cycle"] == utcnow().date().isoformat()
+    totals = cycle["totals"]
+    assert (totals["applied"], totals["shortlisted"], totals["accepted"], totals["withdrawn"]) == (4, 3, 1, 1)
+    assert totals["shortlist_rate"] == 0.75
+    assert totals["current"] == {"pending": 0, "shortlisted": 1, "accepted": 1, "rejected": 1, "withdrawn": 1}
+    assert cycle["positions"][str(position.id)] == totals
+
+    # A rebuild only sees current statuses: the rejected shortlist is lost
+    rebuild_funnel_rollups()
+    rebuilt = get_company_funnel(company.id)["cycles"][0]["totals"]
+    assert rebuilt["current"] == totals["current"]
+    assert (rebuilt["applied"], rebuilt["shortlisted"], rebuilt["accepted"]) == (4, 2, 1)
+
+    res = client.get(f"/api/company/{company.id}/funnel", headers={"Authorization": f"Bearer {login('outsider_staff', 'pass')}"})
+    assert res.status_code == 403
+    assert client.get(f"/api/company/{company.id}/funnel?cycle=year", headers=headers).status_code == 400
+
+
+def test_application_volume_buckets_and_compaction(empty_db):
+    client = empty_db
+    company = create_company("Volume Co", "Hiring")
+    employer, _ = create_user("volume_emp", "pass", "employer", company_id=company.id)
+    create_user("volume_outsider", "pass", "employer", company_id=create_company("Elsewhere Co", "Other").id)
+    position = open_position(user_id=employer.id, title="Volume Intern", number_of_positions=5)
+    applications = [create_application(_create_student(f"volume_student{i}", "Physics", 3.0).id, position.id) for i in range(3)]
+
+    hour = utcnow().replace(minute=0, second=0, microsecond=0)
+    headers = {"Authorization": f"Bearer {login('volume_emp', 'pass')}"}
+    res = client.get(f"/api/positions/{position.id}/volume", headers=headers)
+    assert res.status_code == 200
+    assert res.get_json()["series"] == [{"bucket": hour.isoformat(), "count": 3}]
+
+    # Backdate two applications past the hourly retention and rebuild
+    old = hour - timedelta(days=30)
+    for application in applications[:2]:
+        db.session.get(Application, application.id).created_at = old
+    db.session.commit()
+    backfill_application_volume()
+    assert get_application_volume(position.id, 'hour') == [(hour, 1)]
+    day = hour.replace(hour=0)
+    assert get_application_volume(position.id, 'day') == [(old.replace(hour=0), 2), (day, 1)]
+
+    # Compacting later folds the remaining hour bucket into its day
+    assert compact_application_volume(now=hour + timedelta(days=30)) == 1
+    assert get_application_volume(position.id, 'hour') == []
+    assert get_application_volume(position.id, 'day') == [(old.replace(hour=0), 2), (day, 1)]
+    assert ApplicationVolume.query.filter_by(granularity='hour').count() == 0
+
+    res = client.get(f"/api/positions/{position.id}/volume?granularity=day&from={day.isoformat()}", headers=headers)
+    assert res.get_json()["series"] == [{"bucket": day.isoformat(), "count": 1}]
+    assert client.get(f"/api/positions/{position.id}/volume?granularity=week", headers=headers).status_code == 400
+    res = client.get(f"/api/positions/{position.id}/volume", headers={"Authorization": f"Bearer {login('volume_outsider', 'pass')}"})
+    assert res.status_code == 403
+
+
+def test_decision_latency_percentiles_from_sketches(empty_db):
+    client = empty_db
+    company = create_company("Latency Co", "Hiring")
+    create_user("latency_staff", "pass", "staff", company_id=company.id)
+    employer, _ = create_user("latency_emp", "pass", "employer", company_id=company.id)
+    create_user("latency_outsider", "pass", "staff", company_id=create_company("Far Co", "Elsewhere").id)
+    position = open_position(user_id=employer.id, title="Latency Intern", number_of_positions=5)
+    applications = [create_application(_create_student(f"latency_student{i}", "Law", 3.0).id, position.id) for i in range(3)]
+    # Made 1, 2 and 3 hours ago
+    for hours, application in enumerate(applications, start=1):
+        db.session.get(Application, application.id).created_at = utcnow() - timedelta(hours=hours)
+    db.session.commit()
+    for application in applications:
+        shortlist_application(application.id)
+    accept_application(applications[0].id)
+
+    headers = {"Authorization": f"Bearer {login('latency_staff', 'pass')}"}
+    res = client.get(f"/api/company/{company.id}/decision-latency", headers=headers)
+    assert res.status_code == 200
+    latency = res.get_json()
+    shortlisted = latency["totals"]["shortlisted"]
+    assert shortlisted["count"] == 3
+    assert abs(shortlisted["p50"] - 7200) <= 0.01 * 7200 + 1
+    assert shortlisted["p50"] <= shortlisted["p90"] <= shortlisted["p99"] <= 10800 * 1.01
+    assert latency["totals"]["accepted"]["count"] == 1
+    assert latency["positions"][str(position.id)] == latency["totals"]
+
+    yesterday = (utcnow() - timedelta(days=1)).date().isoformat()
+    assert get_decision_latency(company.id, end=date.fromisoformat(yesterday))["totals"] == {}
+    res = client.get(f"/api/company/{company.id}/decision-latency", headers={"Authorization": f"Bearer {login('latency_outsider', 'pass')}"})
+    assert res.status_code == 403
+    assert client.get(f"/api/company/{company.id}/decision-latency?from=soon", headers=headers).status_code == 400
+
+
+def test_analytics_store_builds_incrementally(empty_db):
+    client = empty_db
+    company = create_company("Analytics Co", "Hiring")
+    create_user("analytics_staff", "pass", "staff", company_id=company.id)
+    employer, _ = create_user("analytics_emp", "pass", "employer", company_id=company.id)
+    position = open_position(user_id=employer.id, title="Analytics Intern", number_of_positions=5)
+    students = [
+        _create_student("analytics_bio1", "Biology", 3.0),
+        _create_student("analytics_bio2", "Biology", 3.8),
+        _create_student("analytics_cs", "Computer Science", 3.4),
+    ]
+    applications = [create_application(student.id, position.id) for student in students]
+    for hours, application in enumerate(applications, start=1):
+        db.session.get(Application, application.id).updated_at = utcnow() - timedelta(hours=hours)
+    db.session.commit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        client.application.config['ANALYTICS_DIR'] = directory
+        assert query_applications() is None
+        assert build_analytics_store() == {'rows': 3, 'changed': 3, 'full': True}
+
+        shortlist_application(applications[1].id)
+        accept_application(applications[1].id)
+        summary = build_analytics_store()
+        # Only the accepted row and the one at the watermark are read again
+        assert summary == {'rows': 3, 'changed': 2, 'full': False}
+
+        rows = query_applications(group_by=['degree'])['rows']
+        assert rows == [
+            {'degree': 'Biology', 'count': 2, 'accepted': 1, 'acceptance_rate': 0.5,
+             'gpa_mean': 3.4, 'gpa_p25': 3.0, 'gpa_p50': 3.0, 'gpa_p75': 3.0},
+            {'degree': 'Computer Science', 'count': 1, 'accepted': 0, 'acceptance_rate': 0.0,
+             'gpa_mean': 3.4, 'gpa_p25': 3.4, 'gpa_p50': 3.4, 'gpa_p75': 3.4},
+        ]
+        [row] = query_applications(filters={'status': ['accepted']})['rows']
+        assert row['count'] == 1 and row['gpa_mean'] == 3.8
+
+        headers = {"Authorization": f"Bearer {login('analytics_staff', 'pass')}"}
+        res = client.get("/api/analytics/applications?group_by=cohort,status&degree=Biology", headers=headers)
+        assert res.status_code == 200
+        cohort = utcnow().strftime('%Y-%m')
+        # Groups come in code order, and pending was seen first
+        assert [(r['cohort'], r['status'], r['count']) for r in res.get_json()['rows']] == [
+            (cohort, 'pending', 1), (cohort, 'accepted', 1)
+        ]
+        assert client.get("/api/analytics/applications?group_by=salary", headers=headers).status_code == 400
+
+
+def test_columnar_export_streams_row_groups_and_deltas(empty_db):
+    pq = pytest.importorskip("pyarrow.parquet")
+    company = create_company("Export Co", "Hiring")
+    employer, _ = create_user("export_emp", "pass", "employer", company_id=company.id)
+    position = open_position(user_id=employer.id, title="Export Intern", number_of_positions=5)
+    applications = [create_application(_create_student(f"export_student{i}", "History", 3.1).id, position.id) for i in range(5)]
+    for hours, application in enumerate(applications, start=1):
+        db.session.get(Application, application.id).updated_at = utcnow() - timedelta(hours=hours)
+    db.session.commit()
+
+    with tempfile.TemporaryDirectory() as directory:
+        assert export_columnar(directory, row_group_size=2) == {'application': 5, 'position': 1, 'company': 1, 'student': 5}
+        [full] = os.listdir(os.path.join(directory, 'application'))
+        parquet = pq.ParquetFile(os.path.join(directory, 'application', full))
+        assert parquet.metadata.num_row_groups == 3
+        exported = parquet.read()
+        assert exported.column('status').to_pylist() == ['pending'] * 5
+        assert 'password' not in pq.read_table(os.path.join(directory, 'student')).column_names
+
+        shortlist_application(applications[2].id)
+        written = export_columnar(directory, tables=['application'])
+        # The shortlisted row, and the one at the watermark again
+        assert written == {'application': 2}
+        delta = [name for name in os.listdir(os.path.join(directory, 'application')) if name.endswith('-delta.parquet')]
+        changed = pq.read_table(os.path.join(directory, 'application', delta[0])).to_pydict()
+        assert sorted(zip(changed['id'], changed['status'])) == [(applications[0].id, 'pending'), (applications[2].id, 'shortlisted')]
+
+        # Purged rows reach the next delta as ids, the cascaded applications included
+        position_id, application_ids = position.id, sorted(application.id for application in applications)
+        delete_position(position_id)
+        assert purge_deleted_positions() == 1
+        export_columnar(directory, tables=['application', 'position'])
+        [deleted] = [name for name in os.listdir(os.path.join(directory, 'application')) if name.endswith('-deleted.parquet')]
+        assert sorted(pq.read_table(os.path.join(directory, 'application', deleted)).column('id').to_pylist()) == application_ids
+        [deleted] = [name for name in os.listdir(os.path.join(directory, 'position')) if name.endswith('-deleted.parquet')]
+        assert pq.read_table(os.path.join(directory, 'position', deleted)).column('id').to_pylist() == [position_id]
+
+        with pytest.raises(ValueError):
+            export_columnar(directory, tables=['user'])
+
+
+def test_signup_issues_a_working_token(empty_db):
+    client = empty_db
+    res = client.post("/api/signup", json={"username": "fresh", "password": "freshpass", "type": "student",
+                                            "email": "fresh@example.com", "dob": "2002-02-02", "gender": "Male",
+                                            "degree": "Art", "phone": "555-0101", "gpa": 3.2, "resume": "cv.pdf"})
+    assert res.status_code == 201
+    token = res.get_json()["access_token"]
+    res = client.get("/api/identify", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    assert "fresh" in res.get_json()["message"]
+
+
+def test_login_throttle_answers_429_before_checking_passwords(empty_db):
+    client = empty_db
+    create_user("target", "targetpass", "student")
+    with tempfile.TemporaryDirectory() as directory:
+        client.application.config.update(
+            LOGIN_THROTTLE_ENABLED=True, LOGIN_THROTTLE_PATH=os.path.join(directory, 'throttle.sqlite'),
+            LOGIN_THROTTLE_USERNAME_BURST=2,
+        )
+        client.application.extensions.pop('login_throttle', None)
+        for _ in range(2):
+            assert client.post("/api/login", json={"username": "target", "password": "guess"}).status_code == 401
+        res = client.post("/api/login", json={"username": "target", "password": "targetpass"})
+        assert res.status_code == 429
+        assert int(res.headers["Retry-After"]) >= 1
+        res = client.post("/login", data={"username": "target", "password": "targetpass"})
+        assert res.status_code == 429
+        assert client.post("/api/login", json={"username": "someone", "password": "x"}).status_code == 401
+        client.application.extensions.pop('login_throttle')
+
+
+def test_login_throttle_keys_on_the_client_behind_a_trusted_proxy(empty_db):
+    from flask.globals import _cv_app
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///test.db', 'TRUSTED_PROXIES': 1,
+            'LOGIN_THROTTLE_ENABLED': True, 'LOGIN_THROTTLE_PATH': os.path.join(directory, 'throttle.sqlite'),
+            'LOGIN_THROTTLE_IP_BURST': 1,
+        })
+        context = _cv_app.get()
+        try:
+            client = app.test_client()
+            login_from = lambda ip, username: client.post(
+                "/api/login", json={"username": username, "password": "x"},
+                headers={"X-Forwarded-For": ip}, environ_base={"REMOTE_ADDR": "10.0.0.1"}
+            ).status_code
+            assert login_from("203.0.113.1", "first") == 401
+            assert login_from("203.0.113.1", "second") == 429
+            # Another client through the same proxy has its own bucket
+            assert login_from("203.0.113.2", "third") == 401
+        finally:
+            context.pop()
+
+
+def test_authenticated_requests_resolve_users_without_queries(empty_db):
+    from sqlalchemy import event
+    client = empty_db
+    company_id = create_company("Claims Co", "Tokens with claims").id
+    create_user("claims_staff", "pass", "staff", company_id=company_id)
+    headers = {"Authorization": f"Bearer {login('claims_staff', 'pass')}"}
+    assert client.get("/api/identify", headers=headers).status_code == 200
+    # Later requests start from an empty session, as in a deployed worker
+    db.session.expunge_all()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/api/identify", headers=headers).get_json()["message"].startswith("username: claims_staff")
+        db.session.expunge_all()
+        assert client.get(f"/api/company/{company_id}/decision-latency", headers=headers).status_code == 200
+        assert client.get(f"/api/company/{company_id + 1}/funnel", headers=headers).status_code == 403
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert not any("user" in statement or "staff" in statement for statement in statements)
+
+    # Changing the user drops the cached copy
+    update_user(get_user_by_username("claims_staff").id, "renamed_staff")
+    db.session.expunge_all()
+    assert "renamed_staff" in client.get("/api/identify", headers=headers).get_json()["message"]
+
+
+def test_templates_resolve_the_signed_in_user_lazily(empty_db, capsys):
+    from sqlalchemy import event
+    client = empty_db
+    create_user("page_reader", "pass", "student")
+    token = login("page_reader", "pass")
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        res = client.get("/")
+        assert res.status_code == 200 and b"Welcome" not in res.data
+        res = client.get("/", headers={"Authorization": "Bearer not-a-token"})
+        assert res.status_code == 200 and b"Welcome" not in res.data
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert capsys.readouterr().out == ""
+
+    res = client.get("/", headers={"Authorization": f"Bearer {token}"})
+    assert b"Welcome page_reader" in res.data
+
+
+def test_import_users_in_batches_and_reports_duplicates(empty_db):
+    company = create_company("Import Co", "Bulk accounts")
+    create_user("taken", "pass", "student")
+    rows = parse_user_import([
+        "username,password,type,company_id,email,dob,gpa",
+        "new_student,pw1,student,,new@example.com,2001-05-06,3.4",
+        "taken,pw2,student,,,,",
+        "new_employer,pw3,employer,%d,,," % company.id,
+        "new_student,pw4,student,,,,",
+        "orphan_staff,pw5,staff,%d,,," % (company.id + 1),
+        "new_staff,pw6,staff,%d,,," % company.id,
+        "no_password,,student,,,,",
+    ])
+    result = import_users(rows, batch_size=2, workers=1)
+    assert result["created"] == 3
+    assert result["duplicates"] == ["taken", "new_student"]
+    assert [row["line"] for row in result["invalid"]] == [6, 8]
+
+    student = get_user_by_username("new_student")
+    assert isinstance(student, Student) and student.gpa == 3.4 and student.dob == date(2001, 5, 6)
+    assert isinstance(get_user_by_username("new_staff"), Staff)
+    assert get_user_by_username("new_employer").company_id == company.id
+    assert login("new_student", "pw1") is not None
+
+
+def test_import_reports_a_batch_that_conflicts_twice_and_goes_on(empty_db):
+    from sqlalchemy.exc import IntegrityError
+    from App.controllers import user_import
+    insert, calls = user_import._insert, []
+
+    def conflicting_first_batch(rows):
+        calls.append(rows)
+        if len(calls) <= 2:
+            raise IntegrityError("INSERT", {}, Exception("FOREIGN KEY constraint failed"))
+        insert(rows)
+
+    rows = parse_user_import(["username,password,type", "first,pw1,student", "second,pw2,student", "third,pw3,student"])
+    with mock.patch.object(user_import, '_insert', conflicting_first_batch):
+        result = import_users(rows, batch_size=2, workers=1)
+    assert result["created"] == 1
+    assert [row["line"] for row in result["invalid"]] == [2, 3]
+    assert get_user_by_username("first") is None
+    assert get_user_by_username("third") is not None
+
+
+def test_user_listings_page_with_one_query_each(empty_db):
+    import re
+    from sqlalchemy import event
+    client = empty_db
+    company_id = create_company("Listing Co", "Paged users").id
+    create_user("list_staff", "pass", "staff", company_id=company_id)
+    create_user("list_employer", "pass", "employer", company_id=company_id)
+    for i in range(3):
+        create_user(f"list_student{i}", "pass", "student")
+    db.session.expunge_all()
+
+    pages, url = [], "/api/users?limit=2"
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        while url:
+            res = client.get(url)
+            pages.append(res.get_json())
+            next_link = re.match(r'<([^>]+)>; rel="next"', res.headers.get("Link", ""))
+            url = next_link and next_link.group(1)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert len(statements) == 3
+    users = [user for page in pages for user in page]
+    assert [user["username"] for user in users][:2] == ["list_staff", "list_employer"]
+    assert users[0]["company_id"] == company_id and "email" in users[-1]
+
+    res = client.get("/users?limit=4")
+    assert b"list_student1" in res.data and b"list_student2" not in res.data
+    assert b"/users?after=" in res.data
+
+
+def test_logout_revokes_the_token_in_every_worker(empty_db):
+    from flask_jwt_extended import decode_token
+    client = empty_db
+    create_user("leaky", "leakypass", "student")
+    token = login("leaky", "leakypass")
+    headers = {"Authorization": f"Bearer {token}"}
+    other_worker = TokenDenylist()
+    sync_token_denylist(other_worker)
+    assert client.get("/api/identify", headers=headers).status_code == 200
+
+    assert client.get("/api/logout", headers=headers).status_code == 200
+    assert client.get("/api/identify", headers=headers).status_code == 401
+    # Logging out again with the revoked token still clears the cookie
+    assert client.get("/api/logout", headers=headers).status_code == 200
+
+    assert sync_token_denylist(other_worker) == 1
+    claims = decode_token(token)
+    assert other_worker.is_revoked(claims["jti"], claims["exp"])
+    assert client.get("/api/identify", headers={"Authorization": f"Bearer {login('leaky', 'leakypass')}"}).status_code == 200
@@ -0,0 +1,62 @@
+import pytest
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import text
+
+from App.main import create_app
+from App.database import db, create_db, get_migrate, MIGRATIONS_DIR
+from App.controllers import create_user, create_company, open_position, create_application
+
+
+'''
+    Migration tests
+
+    Migrations run against a populated database, as they do in a
+    deployment, and must not lose rows.
+'''
+
+@pytest.fixture(autouse=True, scope="function")
+def empty_db():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///test.db'})
+    get_migrate(app)
+
+    with app.app_context():
+        create_db()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+        db.session.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        db.session.commit()
+
+
+def _counts():
+    return {
+        table: db.session.execute(text(f'SELECT count(*) FROM "{table}"')).scalar()
+        for table in ('user', 'company', 'position', 'application')
+    }
+
+
+def test_upgrade_keeps_rows_of_a_populated_database():
+    company = create_company("Migrated Co", "Has history")
+    employer, _ = create_user("migrated_emp", "pass", "employer", company_id=company.id)
+    student, _ = create_user("migrated_student", "pass", "student")
+    position = open_position(user_id=employer.id, title="Migrated Intern")
+    create_application(student.id, position.id)
+    before = _counts()
+    db.session.remove()
+
+    # Back to the first revision and up again, through every table rebuild
+    downgrade(revision='a1c3e5f7b901')
+    assert _counts() == before
+    db.session.remove()
+    upgrade(revision='head')
+    assert _counts() == before
+
+
+def test_created_database_is_stamped_at_the_newest_revision():
+    with db.engine.connect() as connection:
+        assert MigrationContext.configure(connection).get_current_revision() == \
+            ScriptDirectory(MIGRATIONS_DIR).get_current_head()
+    # Nothing left to run, where every revision would fail on existing tables
+    upgrade(revision='head')
@@ -0,0 +1,304 @@
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from flask import current_app
+from sqlalchemy import event, text, update
+
+from App.main import create_app
+from App.database import db, create_db
+from App.models import Application, User
+from App.models.position import PositionStatus
+from App.controllers import (
+    create_user,
+    create_company,
+    open_position,
+    create_application,
+    get_user_by_username,
+    get_positions_by_employer,
+    get_positions_by_company,
+    get_open_positions,
+    get_applications,
+    get_applications_by_student,
+    get_applications_by_position,
+    get_application,
+    staff_can_access_application,
+    apply_for_position,
+    login,
+    close_expired_positions,
+    get_next_deadline,
+    get_recommendations,
+    refresh_stale_recommendations,
+    record_position_view,
+    flush_position_activity,
+    delete_position,
+    purge_deleted_positions,
+    get_company_funnel,
+    get_application_volume,
+    get_decision_latency,
+    build_analytics_store,
+    export_columnar,
+    utcnow,
+    compact_application_volume,
+    shortlist_application,
+    get_users_page,
+    revoke_token,
+    sync_token_denylist,
+    TokenDenylist,
+)
+
+
+'''
+    Query plan regression tests
+
+    Every statement a controller issues is captured and run through
+    EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (Postgres). A statement that
+    reads a table without an index fails the test.
+'''
+
+@pytest.fixture(autouse=True, scope="function")
+def empty_db():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///test.db'})
+
+    with app.app_context():
+        create_db()
+        yield app.test_client()
+        db.drop_all()
+
+
+@pytest.fixture
+def seeded():
+    companies = [create_company(f"Company {i}", "Seeded company") for i in range(3)]
+    employers, staff, students, positions = [], [], [], []
+    for i, company in enumerate(companies):
+        employer, _ = create_user(f"employer{i}", "pass", "employer", company_id=company.id)
+        member, _ = create_user(f"staff{i}", "pass", "staff", company_id=company.id)
+        employers.append(employer)
+        staff.append(member)
+        for j in range(20):
+            position = open_position(user_id=employer.id, title=f"Position {i}-{j}", number_of_positions=2)
+            # Like a production catalog, most positions are historical
+            if j % 5:
+                position.status = PositionStatus.CLOSED
+            positions.append(position)
+    db.session.commit()
+    for i in range(5):
+        student, _ = create_user(f"student{i}", "pass", "student", student_data={
+            'email': f'student{i}@example.com',
+            'dob': date(2001, 1, 1),
+            'gender': 'Female',
+            'degree': 'Computer Science',
+            'phone': '555-0000',
+            'gpa': 3.0,
+            'resume': '/uploads/resume.pdf'
+        })
+        students.append(student)
+    for student in students:
+        for position in positions[::3]:
+            create_application(student.id, position.id)
+    # Give the planner real statistics, as a production database would have
+    db.session.execute(text("ANALYZE"))
+    return {'employers': employers, 'staff': staff, 'students': students, 'positions': positions}
+
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def full_scans(statement, parameters):
+    """Return the plan lines of a statement that read a whole table."""
+    with db.engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+            return [row[0] for row in rows if "Seq Scan" in row[0]]
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        # SQLite reports "SCAN <table>" for a table scan and
+        # "SEARCH <table> USING ..." when an index or the rowid is used.
+        return [row[3] for row in rows if re.match(r"SCAN \w+( AS \w+)?$", row[3])]
+
+
+def assert_indexed(statements):
+    assert statements, "no statements were captured"
+    for statement, parameters in statements:
+        scans = full_scans(statement, parameters)
+        assert not scans, f"full table scan {scans} in:\n{statement}"
+
+
+def test_position_lookups_use_indexes(seeded):
+    employer = seeded['employers'][0]
+    with capture_statements() as statements:
+        get_positions_by_employer(employer.id)
+        get_positions_by_company(employer.company_id)
+        get_open_positions()
+    assert_indexed(statements)
+
+
+def test_application_lookups_use_indexes(seeded):
+    student = seeded['students'][0]
+    position = seeded['positions'][0]
+    with capture_statements() as statements:
+        get_applications_by_student(student.id)
+        get_applications_by_position(position.id)
+        get_applications(student)
+    assert_indexed(statements)
+
+
+def test_staff_application_listing_uses_indexes(seeded):
+    member = seeded['staff'][0]
+    with capture_statements() as statements:
+        applications = get_applications(member)
+        for application in applications:
+            db.session.expire(application)
+            staff_can_access_application(member, get_application(application.id))
+    assert_indexed(statements)
+
+
+def test_application_writes_use_indexes(seeded):
+    student = seeded['students'][0]
+    position = seeded['positions'][1]
+    with capture_statements() as statements:
+        apply_for_position(student.id, position.id)
+        create_application(seeded['students'][1].id, seeded['positions'][2].id)
+    assert_indexed(statements)
+
+
+def test_user_pages_are_keyset_seeks(seeded):
+    with capture_statements() as statements:
+        users, after = get_users_page(limit=4)
+        get_users_page(after=after, limit=4)
+    assert len(statements) == 2
+    assert_indexed(statements)
+
+
+def test_user_lookups_use_indexes(seeded):
+    with capture_statements() as statements:
+        get_user_by_username("student0")
+        login("staff0", "pass")
+    assert_indexed(statements)
+
+
+def test_user_loads_join_their_subclass_table(seeded):
+    member_id = seeded['staff'][0].id
+    db.session.expunge_all()
+    with capture_statements() as statements:
+        assert get_user_by_username("student0").gpa == 3.0
+        assert db.session.get(User, member_id).company_id is not None
+    assert len(statements) == 2
+    assert_indexed(statements)
+
+
+def test_deadline_sweeper_uses_indexes(seeded):
+    with capture_statements() as statements:
+        close_expired_positions()
+        get_next_deadline()
+    assert_indexed(statements)
+
+
+def test_recommendations_are_a_single_indexed_read(seeded):
+    student_id = seeded['students'][0].id
+    refresh_stale_recommendations()
+    with capture_statements() as statements:
+        get_recommendations(student_id)
+    assert len(statements) == 1
+    assert_indexed(statements)
+
+
+def test_trending_flush_uses_indexes(seeded):
+    for position in seeded['positions'][::2]:
+        record_position_view(position.id)
+    with capture_statements() as statements:
+        flush_position_activity()
+    assert_indexed(statements)
+
+
+def test_position_purge_uses_indexes(seeded):
+    for position in seeded['positions'][:3]:
+        delete_position(position.id)
+    with capture_statements() as statements:
+        assert purge_deleted_positions() == 3
+    assert_indexed(statements)
+
+
+def test_company_funnel_is_a_single_indexed_read(seeded):
+    student = seeded['students'][0]
+    for application in get_applications_by_student(student.id)[:3]:
+        shortlist_application(application.id)
+    company_id = seeded['employers'][0].company_id
+    with capture_statements() as statements:
+        funnel = get_company_funnel(company_id)
+    assert funnel['cycles'][0]['totals']['applied'] > 0
+    assert len(statements) == 1
+    assert_indexed(statements)
+
+
+def test_application_volume_reads_use_indexes(seeded):
+    position_id = seeded['positions'][0].id
+    with capture_statements() as statements:
+        get_application_volume(position_id, 'day')
+        compact_application_volume()
+    assert len(statements) == 2
+    assert_indexed(statements)
+
+
+def test_decision_latency_is_a_single_indexed_read(seeded):
+    student = seeded['students'][0]
+    for application in get_applications_by_student(student.id)[:3]:
+        shortlist_application(application.id)
+    company_id = seeded['employers'][0].company_id
+    with capture_statements() as statements:
+        latency = get_decision_latency(company_id, start=date.today())
+    assert latency['totals']['shortlisted']['count'] > 0
+    assert len(statements) == 1
+    assert_indexed(statements)
+
+
+def test_incremental_analytics_build_uses_indexes(seeded, tmp_path):
+    current_app.config['ANALYTICS_DIR'] = str(tmp_path)
+    db.session.execute(update(Application).values(updated_at=utcnow() - timedelta(days=1)))
+    db.session.commit()
+    build_analytics_store()
+    shortlist_application(get_applications_by_student(seeded['students'][0].id)[0].id)
+    with capture_statements() as statements:
+        build_analytics_store()
+    assert len(statements) == 1
+    assert_indexed(statements)
+
+
+def test_incremental_columnar_export_uses_indexes(seeded, tmp_path):
+    pytest.importorskip("pyarrow")
+    for table in ('application', 'position', 'company', 'student'):
+        db.session.execute(text(f"UPDATE {table} SET updated_at = :old"), {'old': utcnow() - timedelta(days=1)})
+    db.session.commit()
+    export_columnar(str(tmp_path))
+    shortlist_application(get_applications_by_student(seeded['students'][0].id)[0].id)
+    # The seeded company and student tables are a few rows, which SQLite scans whatever the indexes
+    with capture_statements() as statements:
+        written = export_columnar(str(tmp_path), tables=['application', 'position'])
+    assert written['application'] >= 1
+    # Per table, the rows changed and the rows deleted since the last export
+    assert len(statements) == 4
+    assert_indexed(statements)
+
+
+def test_denylist_syncs_use_indexes(seeded):
+    from flask_jwt_extended import decode_token
+    revoke_token(decode_token(login("student0", "pass")))
+    denylist = TokenDenylist()
+    sync_token_denylist(denylist)
+    revoke_token(decode_token(login("student1", "pass")))
+    with capture_statements() as statements:
+        # Later syncs read only the latest revocations
+        assert sync_token_denylist(denylist) == 2
+    assert_indexed(statements)
@@ -4,5 +4,6 @@ from .auth import auth_views
 from .position import position_views
 from .application import application_views
 from .company import company_views
+from .analytics import analytics_views
 
-views = [user_views, index_views, auth_views, position_views, application_views, company_views]
\ No newline at end of file
+views = [user_views, index_views, auth_views, position_views, application_views, company_views, analytics_views]
\ No newline at end of file
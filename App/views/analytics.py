@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, request
+from App.controllers import (
+    query_applications,
+    parse_deadline,
+    ANALYTICS_GROUPS,
+    require_role,
+    current_identity,
+)
+
+analytics_views = Blueprint('analytics_views', __name__)
+
+
+@analytics_views.route('/api/analytics/applications', methods=['GET'])
+@require_role('staff', 'employer')
+def application_analytics_route():
+    """
+    Application counts, acceptance rates and GPA quartiles of the user's
+    company from the analytics store. ?group_by=degree,cohort groups;
+    ?<column>=value (repeatable) filters; ?from=&to= bound the intake time.
+    """
+    group_by = [column for column in request.args.get('group_by', '').split(',') if column]
+    filters = {
+        column: request.args.getlist(column)
+        for column in ANALYTICS_GROUPS if column in request.args and column != 'company_id'
+    }
+    filters['company_id'] = [current_identity.company_id]
+    try:
+        start = parse_deadline(request.args['from']) if 'from' in request.args else None
+        end = parse_deadline(request.args['to']) if 'to' in request.args else None
+        result = query_applications(group_by=group_by, filters=filters, start=start, end=end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is None:
+        return jsonify({"error": "Analytics store not built yet"}), 503
+    return jsonify(result), 200
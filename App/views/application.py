@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify
-from flask_jwt_extended import current_user
 from App.controllers import (
     shortlist_application,
     accept_application,
@@ -8,6 +7,7 @@ from App.controllers import (
     get_application,
     get_applications,
     require_role,
+    current_identity,
     withdraw_application,
     get_position,
     staff_can_access_application,
@@ -20,7 +20,7 @@ application_views = Blueprint('application_views', __name__)
 @require_role('staff', 'student')
 def view_all_applications():
     """View all applications (staff and students)."""
-    applications = get_applications(current_user)
+    applications = get_applications(current_identity)
     return jsonify([app.get_json() for app in applications]), 200
 
 
@@ -32,11 +32,11 @@ def view_application(application_id):
     if not application:
         return jsonify({"error": "Application not found"}), 404
     # Authorization: students can only view their own, staff only their company's
-    if current_user.role == "student":
-        if application.student_id != current_user.id:
+    if current_identity.role == "student":
+        if application.student_id != current_identity.id:
             return jsonify({"error": "Unauthorized"}), 403
-    elif current_user.role == "staff":
-        if not staff_can_access_application(current_user, application):
+    elif current_identity.role == "staff":
+        if not staff_can_access_application(current_identity, application):
             return jsonify({"error": "Unauthorized"}), 403
     return jsonify(application.get_json()), 200
 
@@ -48,7 +48,7 @@ def shortlist_application_route(application_id):
     application = get_application(application_id)
     if not application:
         return jsonify({"error": "Application not found"}), 404
-    if not staff_can_access_application(current_user, application):
+    if not staff_can_access_application(current_identity, application):
         return jsonify({"error": "Unauthorized"}), 403
     result = shortlist_application(application_id)
     if isinstance(result, dict) and 'error' in result:
@@ -63,7 +63,7 @@ def accept_application_route(application_id):
     application = get_application(application_id)
     if not application:
         return jsonify({"error": "Application not found"}), 404
-    if not staff_can_access_application(current_user, application):
+    if not staff_can_access_application(current_identity, application):
         return jsonify({"error": "Unauthorized"}), 403
     result = accept_application(application_id)
     if isinstance(result, dict) and 'error' in result:
@@ -78,7 +78,7 @@ def reject_application_route(application_id):
     application = get_application(application_id)
     if not application:
         return jsonify({"error": "Application not found"}), 404
-    if not staff_can_access_application(current_user, application):
+    if not staff_can_access_application(current_identity, application):
         return jsonify({"error": "Unauthorized"}), 403
     result = reject_application(application_id)
     if isinstance(result, dict) and 'error' in result:
@@ -94,7 +94,7 @@ def withdraw_application_route(application_id):
     if not application:
         return jsonify({"error": "Application not found"}), 404
     # Authorization: students can only withdraw their own applications
-    if application.student_id != current_user.id:
+    if application.student_id != current_identity.id:
         return jsonify({"error": "Unauthorized"}), 403
     result = withdraw_application(application_id)
     if isinstance(result, dict) and 'error' in result:
@@ -110,7 +110,7 @@ def view_applications_by_position(position_id):
     if not position:
         return jsonify({"error": "Position not found"}), 404
     # Authorization: staff can only view applications for their company's positions
-    if position.employer.company_id != current_user.company_id:
+    if position.employer.company_id != current_identity.company_id:
         return jsonify({"error": "Unauthorized"}), 403
     applications = get_applications_by_position(position_id)
     return jsonify([app.get_json() for app in applications]), 200
@@ -1,10 +1,16 @@
+import math
 from datetime import datetime
-from flask import Blueprint, render_template, jsonify, request, flash, redirect
-from flask_jwt_extended import jwt_required, current_user, unset_jwt_cookies, set_access_cookies
+from flask import Blueprint, render_template, jsonify, request, flash, redirect, make_response
+from flask_jwt_extended import jwt_required, current_user, unset_jwt_cookies, set_access_cookies, verify_jwt_in_request, get_jwt
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 
 from App.controllers import (
     login,
+    issue_token,
     create_user,
+    check_login_throttle,
+    revoke_token,
 )
 
 STUDENT_REQUIRED_FIELDS = ['email', 'dob', 'gender', 'degree', 'phone', 'gpa', 'resume']
@@ -12,6 +18,22 @@ STUDENT_REQUIRED_FIELDS = ['email', 'dob', 'gender', 'degree', 'phone', 'gpa', '
 auth_views = Blueprint('auth_views', __name__, template_folder='../templates')
 
 
+def _revoke_request_token():
+    """Revoke the token the request came with, if still valid, so copies of it stop working too."""
+    try:
+        if verify_jwt_in_request(optional=True) is not None:
+            revoke_token(get_jwt())
+    except (JWTExtendedException, PyJWTError):
+        # Expired, malformed or already revoked: nothing left to revoke
+        pass
+
+
+def _throttled(response, retry_after):
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
 # Page/Action Routes
 
 @auth_views.route('/identify', methods=['GET'])
@@ -23,6 +45,11 @@ def identify_page():
 @auth_views.route('/login', methods=['POST'])
 def login_action():
     data = request.form
+    retry_after = check_login_throttle(data['username'], request.remote_addr)
+    if retry_after:
+        return _throttled(make_response(render_template(
+            'message.html', title="Too many attempts", message="Too many login attempts. Try again later."
+        )), retry_after)
     token = login(data['username'], data['password'])
     response = redirect(request.referrer)
     if not token:
@@ -78,14 +105,14 @@ def signup_action():
     if error:
         flash(f'Signup failed: {error}')
     else:
-        token = login(data['username'], data['password'])
         flash('Signup Successful')
-        set_access_cookies(response, token)
+        set_access_cookies(response, issue_token(user))
     return response
 
 
 @auth_views.route('/logout', methods=['GET'])
 def logout_action():
+    _revoke_request_token()
     response = redirect(request.referrer)
     flash("Logged Out!")
     unset_jwt_cookies(response)
@@ -96,6 +123,9 @@ def logout_action():
 @auth_views.route('/api/login', methods=['POST'])
 def user_login_api():
     data = request.json
+    retry_after = check_login_throttle(data['username'], request.remote_addr)
+    if retry_after:
+        return _throttled(jsonify(message='too many login attempts'), retry_after)
     token = login(data['username'], data['password'])
     if not token:
         return jsonify(message='bad username or password given'), 401
@@ -145,10 +175,8 @@ def signup_api():
         status_code = 409 if "already taken" in error else 400
         return jsonify(message=error), status_code
 
-    token = login(data['username'], data['password'])
-    if not token:
-        return jsonify(message='User created but login failed'), 500
-    return jsonify(access_token=token), 201
+    # The password was just hashed; verifying it again would only cost another hash
+    return jsonify(access_token=issue_token(user)), 201
 
 @auth_views.route('/api/identify', methods=['GET'])
 @jwt_required()
@@ -157,6 +185,7 @@ def identify_user():
 
 @auth_views.route('/api/logout', methods=['GET'])
 def logout_api():
+    _revoke_request_token()
     response = jsonify(message="Logged Out!")
     unset_jwt_cookies(response)
     return response
@@ -1,42 +1,88 @@
-from flask import Blueprint, jsonify, request
+from datetime import date
+
+from flask import Blueprint, current_app, jsonify, request, url_for
 from App.controllers import (
     create_company,
     get_company,
     get_all_companies,
     update_company,
-    delete_company,
-    require_role
+    start_company_deletion,
+    get_company_deletion,
+    parse_company_expand,
+    get_company_funnel,
+    FUNNEL_CYCLES,
+    get_decision_latency,
+    require_role,
+    current_identity,
 )
 
 company_views = Blueprint('company_views', __name__)
 
 
+def _expand():
+    """Collections to embed from ?expand=staff,employers,positions (none by default)."""
+    return parse_company_expand(request.args.get('expand'))
+
+
+# Expansions embedding users, whose details only the client may cache
+USER_EXPANSIONS = ('staff', 'employers')
+
+
+def _cacheable(payload, expand):
+    """
+    JSON response with an ETag and a short max-age. The expand parameter
+    is part of the URL, so each (company, expand) combination is cached
+    and revalidated separately. Shared caches may keep company-only
+    bodies; bodies embedding users are private.
+    """
+    response = jsonify(payload)
+    if any(name in USER_EXPANSIONS for name in expand):
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('COMPANY_CACHE_MAX_AGE', 60)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @company_views.route('/api/company', methods=['POST'])
 @require_role('staff')
 def create_company_route():
     data = request.json
     if not data or 'name' not in data or 'description' not in data:
         return jsonify({"error": "Missing required fields"}), 400
+    try:
+        expand = _expand()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     company = create_company(data['name'], data['description'])
     if company:
-        return jsonify(company.get_json()), 201
+        return jsonify(company.get_json(expand)), 201
     else:
         return jsonify({"error": "Failed to create company"}), 400
 
 
 @company_views.route('/api/company/<int:id>', methods=['GET'])
 def get_company_by_id(id):
-    company = get_company(id)
+    try:
+        expand = _expand()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    company = get_company(id, expand)
     if company:
-        return jsonify(company.get_json()), 200
+        return _cacheable(company.get_json(expand), expand)
     else:
         return jsonify({"error": "Company not found"}), 404
 
 
 @company_views.route('/api/companies', methods=['GET'])
 def get_all_companies_route():
-    companies = get_all_companies()
-    return jsonify([company.get_json() for company in companies]), 200
+    try:
+        expand = _expand()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    companies = get_all_companies(expand)
+    return _cacheable([company.get_json(expand) for company in companies], expand)
 
 
 @company_views.route('/api/company/<int:id>', methods=['PUT'])
@@ -45,9 +91,13 @@ def update_company_route(id):
     data = request.json
     if not data:
         return jsonify({"error": "No data provided"}), 400
+    try:
+        expand = _expand()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     company = update_company(id, name=data.get('name'), description=data.get('description'))
     if company:
-        return jsonify(company.get_json()), 200
+        return jsonify(company.get_json(expand)), 200
     else:
         return jsonify({"error": "Company not found"}), 404
 
@@ -55,8 +105,50 @@ def update_company_route(id):
 @company_views.route('/api/company/<int:id>', methods=['DELETE'])
 @require_role('staff')
 def delete_company_route(id):
-    result = delete_company(id)
-    if result:
-        return jsonify({"message": "Company deleted successfully"}), 200
-    else:
+    """Start deleting the company in the background; poll the Location for progress."""
+    job = start_company_deletion(id)
+    if not job:
         return jsonify({"error": "Company not found"}), 404
+    location = url_for('company_views.get_company_deletion_route', id=id)
+    return jsonify(job.get_json()), 202, {'Location': location}
+
+
+@company_views.route('/api/company/<int:id>/deletion', methods=['GET'])
+@require_role('staff')
+def get_company_deletion_route(id):
+    job = get_company_deletion(id)
+    if not job:
+        return jsonify({"error": "No deletion found for this company"}), 404
+    return jsonify(job.get_json()), 200
+
+
+@company_views.route('/api/company/<int:id>/funnel', methods=['GET'])
+@require_role('staff', 'employer')
+def get_company_funnel_route(id):
+    """Hiring funnel per intake cycle; ?from=&to= are ISO dates, ?cycle=day|week|month."""
+    if current_identity.company_id != id:
+        return jsonify({"error": "Forbidden"}), 403
+    cycle = request.args.get('cycle', 'month')
+    if cycle not in FUNNEL_CYCLES:
+        return jsonify({"error": f"cycle must be one of {', '.join(FUNNEL_CYCLES)}"}), 400
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid date. Use YYYY-MM-DD"}), 400
+    return jsonify(get_company_funnel(id, start=start, end=end, cycle=cycle)), 200
+
+
+@company_views.route('/api/company/<int:id>/decision-latency', methods=['GET'])
+@require_role('staff', 'employer')
+def get_decision_latency_route(id):
+    """p50/p90/p99 seconds from application to each status; ?from=&to= are ISO decision dates, ?position_id= narrows."""
+    if current_identity.company_id != id:
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid date. Use YYYY-MM-DD"}), 400
+    position_id = request.args.get('position_id', type=int)
+    return jsonify(get_decision_latency(id, start=start, end=end, position_id=position_id)), 200
@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import current_user
 from App.models.position import PositionStatus
 from App.controllers import (
     open_position,
@@ -10,9 +9,23 @@ from App.controllers import (
     get_position_json,
     update_position_status,
     update_position,
+    delete_position,
     require_role,
+    current_identity,
     apply_for_position,
     get_positions_by_company_json,
+    parse_position_feed,
+    sync_positions,
+    parse_deadline,
+    get_recommendations,
+    get_similar_positions,
+    get_typeahead_matches,
+    record_position_view,
+    get_trending_positions,
+    browse_positions,
+    FACETS,
+    get_application_volume,
+    VOLUME_GRANULARITIES,
 )
 
 position_views = Blueprint('position_views', __name__)
@@ -26,18 +39,54 @@ def get_all_positions():
 @position_views.route('/api/employer/positions', methods=['GET'])
 @require_role('employer')
 def get_employer_positions():
-    return jsonify(get_positions_by_employer_json(current_user.id)), 200
+    return jsonify(get_positions_by_employer_json(current_identity.id)), 200
 
 @position_views.route('/api/positions', methods=['GET'])
 def get_open_positions_route():
     position_list = get_open_positions_json()
     return jsonify(position_list), 200
 
+@position_views.route('/api/typeahead', methods=['GET'])
+def typeahead_route():
+    """Position titles and company names starting with the prefix, from memory."""
+    prefix = request.args.get('prefix', default='')
+    limit = request.args.get('limit', default=10, type=int)
+    return jsonify(get_typeahead_matches(prefix, limit=max(1, min(limit, 25)))), 200
+
+@position_views.route('/api/positions/browse', methods=['GET'])
+def browse_positions_route():
+    """
+    Positions filtered by company, openings band and status, with the count
+    of every facet value. Repeat a parameter to match any of its values,
+    e.g. ?company=1&company=2&openings=2-5&status=open
+    """
+    filters = {facet: request.args.getlist(facet) for facet in FACETS}
+    limit = request.args.get('limit', default=20, type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    return jsonify(browse_positions(filters, limit=max(1, min(limit, 100)), offset=max(offset, 0))), 200
+
+@position_views.route('/api/positions/trending', methods=['GET'])
+def trending_positions_route():
+    """Open positions with the most recent views and applications, from memory."""
+    limit = request.args.get('limit', default=10, type=int)
+    return jsonify(get_trending_positions(limit=max(1, min(limit, 50)))), 200
+
+@position_views.route('/api/recommendations', methods=['GET'])
+@require_role('student')
+def get_recommendations_route():
+    limit = request.args.get('limit', default=10, type=int)
+    recommendations = get_recommendations(current_identity.id, limit=max(1, min(limit, 50)))
+    return jsonify([dict(position.get_json(), score=round(score, 4)) for position, score in recommendations]), 200
+
 @position_views.route('/api/positions/<int:position_id>', methods=['GET'])
 def get_position_details(position_id):
     position_json = get_position_json(position_id)
     if not position_json:
         return jsonify({"error": "Position not found"}), 404
+    record_position_view(position_id)
+    similar = request.args.get('similar', default=0, type=int)
+    if similar > 0:
+        position_json["similar_positions"] = get_similar_positions(position_id, limit=similar)
     return jsonify(position_json), 200
 
 @position_views.route('/api/positions/<int:position_id>', methods=['PUT'])
@@ -47,7 +96,7 @@ def edit_position(position_id):
     if not position:
         return jsonify({"error": "Position not found"}), 404
 
-    if position.created_by != current_user.id:
+    if position.created_by != current_identity.id:
         return jsonify({"error": "Forbidden"}), 403
 
     data = request.json or {}
@@ -55,15 +104,23 @@ def edit_position(position_id):
     title = data.get('title')
     number = data.get('number')
     description = data.get('description')
+    deadline = data.get('deadline')
 
-    if title is None and number is None and description is None:
+    if title is None and number is None and description is None and deadline is None:
         return jsonify({"error": "No updatable fields provided"}), 400
 
+    if deadline is not None:
+        try:
+            deadline = parse_deadline(deadline)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid deadline. Use ISO 8601 format"}), 400
+
     updated = update_position(
         position_id,
         title=title,
         number_of_positions=number,
-        description=description
+        description=description,
+        deadline=deadline
     )
 
     if not updated:
@@ -78,7 +135,7 @@ def close_position(position_id):
     if not position:
         return jsonify({"error": "Position not found"}), 404
 
-    if position.created_by != current_user.id:
+    if position.created_by != current_identity.id:
         return jsonify({"error": "Forbidden"}), 403
 
     if position.status == PositionStatus.CLOSED:
@@ -90,10 +147,52 @@ def close_position(position_id):
 
     return jsonify(updated.get_json()), 200
 
+@position_views.route('/api/positions/<int:position_id>', methods=['DELETE'])
+@require_role('employer')
+def delete_position_route(position_id):
+    position = get_position(position_id)
+    if not position:
+        return jsonify({"error": "Position not found"}), 404
+
+    if position.created_by != current_identity.id:
+        return jsonify({"error": "Forbidden"}), 403
+
+    if not delete_position(position_id):
+        return jsonify({"error": "Failed to delete position"}), 400
+
+    return jsonify({"message": "Position deleted"}), 200
+
+@position_views.route('/api/positions/<int:position_id>/volume', methods=['GET'])
+@require_role('staff', 'employer')
+def position_volume_route(position_id):
+    """Applications received per bucket; ?granularity=hour|day, ?from=&to= are ISO 8601."""
+    position = get_position(position_id)
+    if not position:
+        return jsonify({"error": "Position not found"}), 404
+
+    if position.company_id != current_identity.company_id:
+        return jsonify({"error": "Forbidden"}), 403
+
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in VOLUME_GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(VOLUME_GRANULARITIES)}"}), 400
+    try:
+        start = parse_deadline(request.args['from']) if 'from' in request.args else None
+        end = parse_deadline(request.args['to']) if 'to' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid date. Use ISO 8601 format"}), 400
+
+    series = get_application_volume(position_id, granularity=granularity, start=start, end=end)
+    return jsonify({
+        "position_id": position_id,
+        "granularity": granularity,
+        "series": [{"bucket": bucket.isoformat(), "count": count} for bucket, count in series],
+    }), 200
+
 @position_views.route('/api/positions/<int:position_id>/apply', methods=['POST'])
 @require_role('student')
 def apply_for_position_route(position_id):
-    result = apply_for_position(current_user.id, position_id)
+    result = apply_for_position(current_identity.id, position_id)
 
     if isinstance(result, dict) and "error" in result:
         msg = result["error"]
@@ -114,17 +213,40 @@ def create_position_api():
         return jsonify({"error": "Missing required fields"}), 400
 
     description = data.get('description', None)
+    deadline = data.get('deadline', None)
+    if deadline is not None:
+        try:
+            deadline = parse_deadline(deadline)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid deadline. Use ISO 8601 format"}), 400
+
     position = open_position(
         title=data['title'],
-        user_id=current_user.id,
+        user_id=current_identity.id,
         number_of_positions=data['number'],
-        description=description
+        description=description,
+        deadline=deadline
     )
 
     if position:
         return jsonify(position.get_json()), 201
     return jsonify({"error": "Failed to create position"}), 400
 
+@position_views.route('/api/positions/sync', methods=['POST'])
+@require_role('employer')
+def sync_positions_api():
+    """Bulk import/sync the employer's positions from a JSON or CSV feed."""
+    is_csv = request.mimetype == 'text/csv'
+    try:
+        rows = parse_position_feed(request.get_data(), 'csv' if is_csv else 'json')
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid feed"}), 400
+
+    result = sync_positions(current_identity.id, rows)
+    if 'error' in result:
+        return jsonify(result), 400
+    return jsonify(result), 200
+
 @position_views.route('/api/positions/company/<int:company_id>', methods=['GET'])
 def get_company_positions(company_id):
     positions = get_positions_by_company_json(company_id)
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, jsonify, request, send_from_directory, flash, redirect, url_for
-from flask_jwt_extended import jwt_required, current_user as jwt_current_user
+from flask_jwt_extended import jwt_required
 
 from.index import index_views
 
@@ -7,18 +7,25 @@ from App.models import Student
 
 from App.controllers import (
     create_user,
-    get_all_users,
-    get_all_users_json,
+    get_users_page,
     jwt_required,
-    get_user
+    get_user,
+    current_identity,
 )
 
 user_views = Blueprint('user_views', __name__, template_folder='../templates')
 
+def _users_page():
+    """A page of users from ?after=<last id seen>&limit= (default 100, at most 1000)."""
+    after = max(request.args.get('after', default=0, type=int), 0)
+    limit = max(1, min(request.args.get('limit', default=100, type=int), 1000))
+    return get_users_page(after=after, limit=limit), limit
+
 @user_views.route('/users', methods=['GET'])
 def get_user_page():
-    users = get_all_users()
-    return render_template('users.html', users=users)
+    (users, next_after), limit = _users_page()
+    next_url = url_for('user_views.get_user_page', after=next_after, limit=limit) if next_after else None
+    return render_template('users.html', users=users, next_url=next_url)
 
 @user_views.route('/users', methods=['POST'])
 def create_user_action():
@@ -29,8 +36,12 @@ def create_user_action():
 
 @user_views.route('/api/users', methods=['GET'])
 def get_users_action():
-    users = get_all_users_json()
-    return jsonify(users)
+    """A page of users; the Link header's rel="next" URL has the following page."""
+    (users, next_after), limit = _users_page()
+    response = jsonify([user.get_json() for user in users])
+    if next_after:
+        response.headers['Link'] = f'<{url_for("user_views.get_users_action", after=next_after, limit=limit)}>; rel="next"'
+    return response
 
 @user_views.route('/api/users', methods=['POST'])
 def create_user_endpoint():
@@ -49,7 +60,7 @@ def static_user_page():
 @user_views.route('/api/student/<int:student_id>', methods=['GET'])
 @jwt_required()
 def get_student_details(student_id):
-    if jwt_current_user.role not in ['employer', 'staff']:
+    if current_identity.role not in ['employer', 'staff']:
         return jsonify({"error": "Forbidden"}), 403
 
     user = get_user(student_id)
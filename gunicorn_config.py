@@ -16,4 +16,20 @@ loglevel = 'info'
 
 # Where to log to
 accesslog = '-'  # '-' means log to stdout
-errorlog = '-'  # '-' means log to stderr
\ No newline at end of file
+errorlog = '-'  # '-' means log to stderr
+
+
+def post_worker_init(worker):
+    # Build the in-memory search indexes before the worker takes requests
+    from App.controllers import warm_position_indexes
+    with worker.wsgi.app_context():
+        warm_position_indexes()
+
+
+def worker_exit(server, worker):
+    # Write the worker's pending view and application counts before it goes
+    from App.controllers import flush_position_activity
+    from App.passwords import shutdown_password_pool
+    with worker.wsgi.app_context():
+        flush_position_activity()
+    shutdown_password_pool()
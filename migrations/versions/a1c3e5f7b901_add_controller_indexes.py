@@ -0,0 +1,45 @@
+"""Index the foreign keys and filter columns used by the controllers
+
+Revision ID: a1c3e5f7b901
+Revises:
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b901'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases bootstrapped with `flask init` (db.create_all) already have
+    # these indexes, hence if_not_exists.
+    op.create_index('ix_position_company_id', 'position', ['company_id'], if_not_exists=True)
+    op.create_index('ix_position_created_by', 'position', ['created_by'], if_not_exists=True)
+    op.create_index('ix_position_status_company', 'position', ['status', 'company_id'], if_not_exists=True)
+    op.create_index(
+        'ix_position_open_company', 'position', ['company_id'],
+        postgresql_where=sa.text("status = 'OPEN'"),
+        sqlite_where=sa.text("status = 'OPEN'"),
+        if_not_exists=True
+    )
+    op.create_index('ix_application_position_status', 'application', ['position_id', 'status'], if_not_exists=True)
+    op.create_index('ix_application_status', 'application', ['status'], if_not_exists=True)
+    op.create_index('ix_employer_company_id', 'employer', ['company_id'], if_not_exists=True)
+    op.create_index('ix_staff_company_id', 'staff', ['company_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_staff_company_id', table_name='staff')
+    op.drop_index('ix_employer_company_id', table_name='employer')
+    op.drop_index('ix_application_status', table_name='application')
+    op.drop_index('ix_application_position_status', table_name='application')
+    op.drop_index('ix_position_open_company', table_name='position')
+    op.drop_index('ix_position_status_company', table_name='position')
+    op.drop_index('ix_position_created_by', table_name='position')
+    op.drop_index('ix_position_company_id', table_name='position')
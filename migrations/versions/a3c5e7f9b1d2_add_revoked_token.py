@@ -0,0 +1,34 @@
+"""Add revoked_token
+
+Revision ID: a3c5e7f9b1d2
+Revises: f2b4d6e8a0bf
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e7f9b1d2'
+down_revision = 'f2b4d6e8a0bf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'revoked_token',
+        sa.Column('jti', sa.String(length=36), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index('ix_revoked_token_revoked_at', 'revoked_token', ['revoked_at'])
+    op.create_index('ix_revoked_token_expires_at', 'revoked_token', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_revoked_token_expires_at', table_name='revoked_token')
+    op.drop_index('ix_revoked_token_revoked_at', table_name='revoked_token')
+    op.drop_table('revoked_token')
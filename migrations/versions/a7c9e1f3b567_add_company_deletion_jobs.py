@@ -0,0 +1,38 @@
+"""Add company deletion jobs
+
+Revision ID: a7c9e1f3b567
+Revises: f6b8d0e2a45b
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f3b567'
+down_revision = 'f6b8d0e2a45b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'company_deletion',
+        sa.Column('company_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'DONE', 'FAILED', name='deletionstatus', native_enum=False), nullable=False),
+        sa.Column('stage', sa.String(length=20), nullable=True),
+        sa.Column('positions_total', sa.Integer(), nullable=False),
+        sa.Column('positions_deleted', sa.Integer(), nullable=False),
+        sa.Column('applications_deleted', sa.Integer(), nullable=False),
+        sa.Column('users_deleted', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('requested_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('company_id')
+    )
+
+
+def downgrade():
+    op.drop_table('company_deletion')
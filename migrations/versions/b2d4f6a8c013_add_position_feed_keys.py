@@ -0,0 +1,30 @@
+"""Add employer feed keys to position
+
+Revision ID: b2d4f6a8c013
+Revises: a1c3e5f7b901
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d4f6a8c013'
+down_revision = 'a1c3e5f7b901'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.add_column(sa.Column('external_id', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_position_employer_external_id', ['created_by', 'external_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.drop_constraint('uq_position_employer_external_id', type_='unique')
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('external_id')
@@ -0,0 +1,43 @@
+"""Queue recommendation refreshes by position, with queue times
+
+Revision ID: b4d6f8a0c2e3
+Revises: a3c5e7f9b1d2
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d6f8a0c2e3'
+down_revision = 'a3c5e7f9b1d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('recommendation_refresh', sa.Column('queued_at', sa.DateTime(), nullable=True))
+    # A bound UTC time rather than the database's now(), which may be local
+    op.execute(
+        sa.table('recommendation_refresh', sa.column('queued_at', sa.DateTime()))
+        .update()
+        .values(queued_at=datetime.now(timezone.utc).replace(tzinfo=None))
+    )
+    with op.batch_alter_table('recommendation_refresh') as batch_op:
+        batch_op.alter_column('queued_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_table(
+        'recommendation_position_refresh',
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('queued_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('position_id')
+    )
+
+
+def downgrade():
+    op.drop_table('recommendation_position_refresh')
+    with op.batch_alter_table('recommendation_refresh') as batch_op:
+        batch_op.drop_column('queued_at')
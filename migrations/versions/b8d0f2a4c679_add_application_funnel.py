@@ -0,0 +1,64 @@
+"""Add application funnel rollups
+
+Revision ID: b8d0f2a4c679
+Revises: a7c9e1f3b567
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from collections import Counter
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c679'
+down_revision = 'a7c9e1f3b567'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    funnel = op.create_table(
+        'application_funnel',
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('SHORTLISTED', 'REJECTED', 'ACCEPTED', 'PENDING', 'WITHDRAWN', name='applicationstatus', native_enum=False), nullable=False),
+        sa.Column('entered', sa.Integer(), nullable=False),
+        sa.Column('current', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['company.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('company_id', 'day', 'position_id', 'status')
+    )
+
+    # Backfill: each application entered pending and its current status
+    # (accepted ones also passed through shortlisted)
+    application = sa.table(
+        'application',
+        sa.column('position_id', sa.Integer), sa.column('created_at', sa.DateTime), sa.column('status', sa.String)
+    )
+    position = sa.table('position', sa.column('id', sa.Integer), sa.column('company_id', sa.Integer))
+    entered, current = Counter(), Counter()
+    rows = op.get_bind().execute(
+        sa.select(position.c.company_id, application.c.position_id, application.c.created_at, application.c.status)
+        .select_from(application.join(position, position.c.id == application.c.position_id))
+    )
+    for company_id, position_id, created_at, status in rows:
+        key = (company_id, (created_at or datetime.utcnow()).date(), position_id)
+        entered[key + ('PENDING',)] += 1
+        if status == 'ACCEPTED':
+            entered[key + ('SHORTLISTED',)] += 1
+        if status != 'PENDING':
+            entered[key + (status,)] += 1
+        current[key + (status,)] += 1
+    if entered:
+        op.bulk_insert(funnel, [{
+            'company_id': company_id, 'day': day, 'position_id': position_id, 'status': status,
+            'entered': count, 'current': current[(company_id, day, position_id, status)],
+        } for (company_id, day, position_id, status), count in entered.items()])
+
+
+def downgrade():
+    op.drop_table('application_funnel')
@@ -0,0 +1,28 @@
+"""Add position deadline
+
+Revision ID: c3e5a7b9d125
+Revises: b2d4f6a8c013
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b9d125'
+down_revision = 'b2d4f6a8c013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.add_column(sa.Column('deadline', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_position_status_deadline', ['status', 'deadline'])
+
+
+def downgrade():
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.drop_index('ix_position_status_deadline')
+        batch_op.drop_column('deadline')
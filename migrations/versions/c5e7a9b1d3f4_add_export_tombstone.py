@@ -0,0 +1,34 @@
+"""Add export_tombstone
+
+Revision ID: c5e7a9b1d3f4
+Revises: b4d6f8a0c2e3
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9b1d3f4'
+down_revision = 'b4d6f8a0c2e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'export_tombstone',
+        sa.Column('table_name', sa.String(length=32), nullable=False),
+        sa.Column('row_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('table_name', 'row_id')
+    )
+    op.create_index('ix_export_tombstone_table_deleted_at', 'export_tombstone', ['table_name', 'deleted_at'])
+    op.create_index('ix_export_tombstone_deleted_at', 'export_tombstone', ['deleted_at'])
+
+
+def downgrade():
+    op.drop_index('ix_export_tombstone_deleted_at', table_name='export_tombstone')
+    op.drop_index('ix_export_tombstone_table_deleted_at', table_name='export_tombstone')
+    op.drop_table('export_tombstone')
@@ -0,0 +1,35 @@
+"""Add application volume buckets
+
+Revision ID: c9e1a3b5d78b
+Revises: b8d0f2a4c679
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1a3b5d78b'
+down_revision = 'b8d0f2a4c679'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask position backfill_volume`
+    op.create_table(
+        'application_volume',
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('position_id', 'granularity', 'bucket')
+    )
+    op.create_index('ix_application_volume_granularity_bucket', 'application_volume', ['granularity', 'bucket'])
+
+
+def downgrade():
+    op.drop_index('ix_application_volume_granularity_bucket', table_name='application_volume')
+    op.drop_table('application_volume')
@@ -0,0 +1,35 @@
+"""Add decision latency sketches
+
+Revision ID: d0f2b4c6e89c
+Revises: c9e1a3b5d78b
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0f2b4c6e89c'
+down_revision = 'c9e1a3b5d78b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Past transition times aren't stored, so sketches start empty
+    op.create_table(
+        'decision_latency',
+        sa.Column('company_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('SHORTLISTED', 'REJECTED', 'ACCEPTED', 'PENDING', 'WITHDRAWN', name='applicationstatus', native_enum=False), nullable=False),
+        sa.Column('sketch', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['company.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('company_id', 'day', 'position_id', 'status')
+    )
+
+
+def downgrade():
+    op.drop_table('decision_latency')
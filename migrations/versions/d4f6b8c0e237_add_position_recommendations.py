@@ -0,0 +1,44 @@
+"""Add precomputed position recommendations
+
+Revision ID: d4f6b8c0e237
+Revises: c3e5a7b9d125
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8c0e237'
+down_revision = 'c3e5a7b9d125'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'position_recommendation',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('student_id', 'rank')
+    )
+    op.create_index('ix_position_recommendation_position_id', 'position_recommendation', ['position_id'])
+    op.create_table(
+        'recommendation_refresh',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('student_id')
+    )
+    # Compute everyone's recommendations on the next refresh
+    op.execute('INSERT INTO recommendation_refresh (student_id) SELECT id FROM student')
+
+
+def downgrade():
+    op.drop_table('recommendation_refresh')
+    op.drop_index('ix_position_recommendation_position_id', table_name='position_recommendation')
+    op.drop_table('position_recommendation')
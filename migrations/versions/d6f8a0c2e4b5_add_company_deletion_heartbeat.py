@@ -0,0 +1,26 @@
+"""Add company deletion heartbeats
+
+Revision ID: d6f8a0c2e4b5
+Revises: c5e7a9b1d3f4
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6f8a0c2e4b5'
+down_revision = 'c5e7a9b1d3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Jobs left pending or running have none, so the next request resumes them
+    op.add_column('company_deletion', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('company_deletion') as batch_op:
+        batch_op.drop_column('heartbeat_at')
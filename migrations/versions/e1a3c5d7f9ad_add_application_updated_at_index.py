@@ -0,0 +1,23 @@
+"""Add application updated_at index
+
+Revision ID: e1a3c5d7f9ad
+Revises: d0f2b4c6e89c
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a3c5d7f9ad'
+down_revision = 'd0f2b4c6e89c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_application_updated_at', 'application', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_application_updated_at', table_name='application')
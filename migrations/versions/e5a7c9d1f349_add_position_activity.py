@@ -0,0 +1,34 @@
+"""Add position activity buckets for trending positions
+
+Revision ID: e5a7c9d1f349
+Revises: d4f6b8c0e237
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9d1f349'
+down_revision = 'd4f6b8c0e237'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'position_activity',
+        sa.Column('position_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.Column('applications', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['position_id'], ['position.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('position_id', 'bucket')
+    )
+    op.create_index('ix_position_activity_bucket', 'position_activity', ['bucket'])
+
+
+def downgrade():
+    op.drop_index('ix_position_activity_bucket', table_name='position_activity')
+    op.drop_table('position_activity')
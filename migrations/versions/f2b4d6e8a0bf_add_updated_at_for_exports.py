@@ -0,0 +1,35 @@
+"""Add updated_at to position, company and student
+
+Revision ID: f2b4d6e8a0bf
+Revises: e1a3c5d7f9ad
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b4d6e8a0bf'
+down_revision = 'e1a3c5d7f9ad'
+branch_labels = None
+depends_on = None
+
+TABLES = ('position', 'company', 'student')
+
+
+def upgrade():
+    # No column default (SQLite can't add one that isn't constant); the
+    # models set updated_at in their INSERTs and UPDATEs
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at')).update().values(updated_at=sa.func.now()))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        # A plain ALTER (SQLite 3.35+): a batch copy would drop tables that
+        # rows elsewhere still reference
+        op.drop_column(table, 'updated_at')
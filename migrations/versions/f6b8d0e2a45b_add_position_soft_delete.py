@@ -0,0 +1,34 @@
+"""Add soft delete to positions
+
+Revision ID: f6b8d0e2a45b
+Revises: e5a7c9d1f349
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e2a45b'
+down_revision = 'e5a7c9d1f349'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            'ix_position_deleted_at', ['deleted_at'],
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            sqlite_where=sa.text("deleted_at IS NOT NULL")
+        )
+
+
+def downgrade():
+    # Positions still waiting for the purge would reappear
+    op.execute('DELETE FROM position WHERE deleted_at IS NOT NULL')
+    with op.batch_alter_table('position') as batch_op:
+        batch_op.drop_index('ix_position_deleted_at')
+        batch_op.drop_column('deleted_at')
@@ -1,10 +1,11 @@
-import click, pytest, sys
+import click, pytest, sys, time
 from flask.cli import with_appcontext, AppGroup
+from sqlalchemy import event, lambda_stmt, select
 
 from App.database import db, get_migrate
-from App.models import User
+from App.models import User, Application, Position
 from App.main import create_app
-from App.controllers import ( create_user, get_all_users_json, get_all_users, initialize, open_position, add_student_to_shortlist, get_shortlist_by_student, get_positions_by_employer, get_applications_by_position)
+from App.controllers import ( create_user, get_all_users_json, get_all_users, initialize, open_position, add_student_to_shortlist, get_shortlist_by_student, get_positions_by_employer, get_applications_by_position, parse_position_feed, sync_positions, DeadlineSweeper, refresh_recommendations, refresh_stale_recommendations, build_catalog_snapshot, purge_deleted_positions, run_company_deletion, rebuild_funnel_rollups, backfill_application_volume, compact_application_volume, build_analytics_store, export_columnar, parse_user_import, import_users, get_user_by_username)
 
 
 # This commands file allow you to create convenient CLI commands for testing controllers
@@ -42,6 +43,19 @@ def create_user_command(username, password, user_type):
 
 # this command will be : flask user create bob bobpass
 
+# eg : flask user import students.csv
+@user_cli.command("import", help="Creates students, employers and staff in bulk from a CSV file")
+@click.argument("users_csv", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--batch-size", default=1000, help="Rows hashed and inserted per transaction")
+@click.option("--workers", default=None, type=int, help="Password hashing processes (default: one per core)")
+def import_users_command(users_csv, batch_size, workers):
+    result = import_users(parse_user_import(users_csv), batch_size=batch_size, workers=workers)
+    for username in result['duplicates']:
+        print(f"skipped duplicate username: {username}")
+    for row in result['invalid']:
+        print(f"skipped line {row['line']}: {row['error']}")
+    print(f"{result['created']} created, {len(result['duplicates'])} duplicates, {len(result['invalid'])} invalid")
+
 @user_cli.command("list", help="Lists users in the database")
 @click.argument("format", default="string")
 def list_user_command(format):
@@ -124,6 +138,145 @@ def get_positions_by_employer_command(employer_id):
 
 app.cli.add_command(user_cli) # add the group to the cli
 
+'''
+Position Commands
+'''
+
+position_cli = AppGroup('position', help='Position object commands')
+
+# eg : flask position sync 2 positions.csv
+@position_cli.command("sync", help="Syncs an employer's positions from a JSON or CSV feed")
+@click.argument("employer_id", type=int)
+@click.argument("feed", type=click.File("r"))
+def sync_positions_command(employer_id, feed):
+    format = 'csv' if feed.name.lower().endswith('.csv') else 'json'
+    result = sync_positions(employer_id, parse_position_feed(feed.read(), format))
+    if 'error' in result:
+        print(result['error'])
+        sys.exit(1)
+    print(f"{result['created']} created, {result['updated']} updated, "
+          f"{result['closed']} closed, {result['unchanged']} unchanged")
+
+# eg : flask position sweep --once
+@position_cli.command("sweep", help="Closes positions whose deadline has passed")
+@click.option("--once", is_flag=True, help="Sweep once and exit instead of running continuously")
+@click.option("--max-sleep", default=300, help="Longest wait between sweeps, in seconds")
+def sweep_positions_command(once, max_sleep):
+    sweeper = DeadlineSweeper(max_sleep=max_sleep)
+    if once:
+        closed, _ = sweeper.sweep()
+        print(f'{closed} positions closed')
+        return
+    try:
+        sweeper.run(on_sweep=lambda closed, delay: print(f'{closed} positions closed, next sweep in {delay:.0f}s'))
+    except KeyboardInterrupt:
+        sweeper.stop()
+
+# eg : flask position snapshot
+@position_cli.command("snapshot", help="Rebuilds the static JSON snapshots of the position catalog")
+def snapshot_positions_command():
+    count = build_catalog_snapshot()
+    print(f'{count} catalog snapshots written')
+
+# Run periodically (e.g. from cron) to remove deleted positions
+@position_cli.command("purge", help="Removes soft-deleted positions and their applications")
+@click.option("--batch-size", default=500, help="Positions removed per transaction")
+def purge_positions_command(batch_size):
+    purged = purge_deleted_positions(batch_size=batch_size)
+    print(f'{purged} deleted positions purged')
+
+# Run once after upgrading, or to rebuild the series from the applications
+@position_cli.command("backfill_volume", help="Rebuilds the application volume buckets from the applications")
+def backfill_volume_command():
+    count = backfill_application_volume()
+    print(f'{count} volume buckets written')
+
+# Run daily (e.g. from cron) to keep hour buckets recent only
+@position_cli.command("compact_volume", help="Folds old hourly application volume buckets into daily ones")
+def compact_volume_command():
+    count = compact_application_volume()
+    print(f'{count} hourly buckets compacted')
+
+app.cli.add_command(position_cli)
+
+'''
+Company Commands
+'''
+
+company_cli = AppGroup('company', help='Company object commands')
+
+# Also resumes a deletion that failed or whose worker died
+@company_cli.command("delete", help="Deletes a company and everything under it")
+@click.argument("company_id", type=int)
+@click.option("--batch-size", default=500, help="Rows deleted per transaction")
+def delete_company_command(company_id, batch_size):
+    job = run_company_deletion(company_id, batch_size=batch_size)
+    if not job:
+        print(f'Company {company_id} not found')
+        sys.exit(1)
+    print(f'Company {company_id}: {job.status.value}, {job.positions_deleted} positions, '
+          f'{job.applications_deleted} applications and {job.users_deleted} users deleted')
+    if job.error:
+        print(job.error)
+        sys.exit(1)
+
+@company_cli.command("rebuild_funnel", help="Recomputes the hiring funnel rollups from the applications")
+def rebuild_funnel_command():
+    count = rebuild_funnel_rollups()
+    print(f'{count} funnel rollup rows written')
+
+app.cli.add_command(company_cli)
+
+'''
+Recommendation Commands
+'''
+
+recommendation_cli = AppGroup('recommendations', help='Position recommendation commands')
+
+# Run periodically (e.g. from cron) to apply queued changes
+@recommendation_cli.command("refresh", help="Recomputes stale student recommendations")
+@click.option("--all", "refresh_all", is_flag=True, help="Recompute every student, not just queued ones")
+def refresh_recommendations_command(refresh_all):
+    count = refresh_recommendations() if refresh_all else refresh_stale_recommendations()
+    print(f'Recommendations refreshed for {count} students')
+
+app.cli.add_command(recommendation_cli)
+
+'''
+Analytics Commands
+'''
+
+analytics_cli = AppGroup('analytics', help='Analytics store commands')
+
+# Run periodically (e.g. from cron); each run only reads applications changed since the last
+@analytics_cli.command("build", help="Updates the memory-mapped column store of applications")
+@click.option("--full", is_flag=True, help="Rebuild from scratch, picking up student edits and deletions")
+@click.option("--batch-size", default=5000, help="Rows fetched per round trip")
+def build_analytics_command(full, batch_size):
+    summary = build_analytics_store(full=full, batch_size=batch_size)
+    print(f"{summary['changed']} applications read, {summary['rows']} in the store")
+
+app.cli.add_command(analytics_cli)
+
+'''
+Export Commands
+'''
+
+export_cli = AppGroup('export', help='Data export commands')
+
+# Run periodically (e.g. nightly); each run only exports rows changed since the last
+@export_cli.command("columnar", help="Writes Parquet snapshots of applications, positions, companies and students")
+@click.option("--dir", "directory", default=None, help="Output directory (default: EXPORT_DIR or instance/export)")
+@click.option("--table", "tables", multiple=True, help="Table to export; repeat for several (default: all)")
+@click.option("--full", is_flag=True, help="Export every row instead of changes since the last export")
+@click.option("--row-group-size", default=50000, help="Rows fetched and written per row group")
+def export_columnar_command(directory, tables, full, row_group_size):
+    written = export_columnar(directory, tables=tables or None, full=full, row_group_size=row_group_size)
+    for table, rows in written.items():
+        print(f'{table}: {rows} rows')
+
+app.cli.add_command(export_cli)
+
 '''
 Test Commands
 '''
@@ -141,4 +294,49 @@ def user_tests_command(type):
         sys.exit(pytest.main(["-k", "App"]))
 
 
+def _time_lookup(lookup, iterations):
+    """Microseconds and statements per call, starting each from an empty session as a request does."""
+    statements = []
+    count = lambda *args: statements.append(None)
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            lookup()
+            db.session.expunge_all()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return elapsed / iterations * 1e6, len(statements) / iterations
+
+# eg : flask test bench-lookups --iterations 5000
+@test.command("bench-lookups", help="Times the lookups most requests make, against the current database")
+@click.option("--iterations", default=2000, help="Calls timed per lookup")
+def bench_lookups_command(iterations):
+    user = db.session.scalars(select(User).limit(1)).first()
+    application = db.session.scalars(select(Application).limit(1)).first()
+    position = db.session.scalars(select(Position).limit(1)).first()
+    if not (user and application and position):
+        print("Needs at least one user, position and application; run flask init first")
+        sys.exit(1)
+    username, user_id, application_id, position_id = user.username, user.id, application.id, position.id
+    lookups = [
+        ("login, Query.filter_by (before)", lambda: User.query.filter_by(username=username).first()),
+        ("login, get_user_by_username", lambda: get_user_by_username(username)),
+        ("login, lambda statement", lambda: db.session.execute(
+            lambda_stmt(lambda: select(User).where(User.username == username))).scalar_one_or_none()),
+        ("JWT user with subclass columns", lambda: getattr(db.session.get(User, user_id), 'company_id', None)),
+        ("application, lambda statement", lambda: db.session.scalars(
+            lambda_stmt(lambda: select(Application).where(Application.id == application_id))).first()),
+        ("application, session.get", lambda: db.session.get(Application, application_id)),
+        ("position, lambda statement", lambda: db.session.scalars(
+            lambda_stmt(lambda: select(Position).where(Position.id == position_id))).first()),
+        ("position, session.get", lambda: db.session.get(Position, position_id)),
+    ]
+    for name, lookup in lookups:
+        _time_lookup(lookup, min(iterations, 200))  # warm the statement caches
+        micros, statements = _time_lookup(lookup, iterations)
+        print(f"{name:<36} {micros:8.1f} us {statements:5.1f} statements")
+
+
 app.cli.add_command(test)